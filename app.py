@@ -1,91 +1,528 @@
 # app.py (Revised)
-from flask import Flask, render_template, jsonify, request
-from dataclasses import asdict
-import csv
-import json
+import time
+_BOOT_T0 = time.perf_counter()
+
+from flask import Flask, Response, render_template, jsonify, request, url_for
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import RequestEntityTooLarge
+import hashlib
+import os
+import threading
 from pathlib import Path
+from typing import Iterator
+
+# Import the core logic from your scripts (data generation and numpy are imported on demand)
+from parse_rcm_documents import process_encounter, process_encounter_safe, active_rules, reload_rules, shape_result, record_json, OUTPUT_PROFILES
+from result_cache import ResultCache
+from pipeline_metrics import METRICS
+from encounter_store import EncounterStore
+from compressed_io import COMPRESSIONS, compressed_name
+import json_codec
+from job_queue import JobQueue, QueueFull
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """
+    jsonify and request.json through json_codec (orjson). Responses stay compact with
+    sorted keys; non-ASCII text is sent as UTF-8 instead of \\u escapes. Debug-mode
+    pretty printing is left to Flask.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return json_codec.dumpb(obj, self.default, self.sort_keys).decode("utf-8")
 
-# Import the core logic from your scripts
-from generate_rcm_testdata import make_encounters
-from parse_rcm_documents import process_encounter
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_codec.dumpb(obj, self.default, self.sort_keys) + b"\n", mimetype=self.mimetype)
 
 # Initialize the Flask application
 app = Flask(__name__)
+if json_codec.BACKEND == "orjson":
+    app.json = CodecJSONProvider(app)  # with the stdlib codec, Flask's own provider is byte-identical
+
+# Pipeline records (facts, charge lines) are converted to JSON objects as they are serialized
+_flask_default = app.json.default
+
+def _json_default(o):
+    try:
+        return record_json(o)
+    except TypeError:
+        return _flask_default(o)
+
+app.json.default = _json_default
+
+# Seconds between checks of the rule-pack file (0 disables hot reload)
+RULES_POLL_SEC = float(os.environ.get("RCM_RULES_POLL_SEC", "5"))
+
+# Limits for /api/process_batch
+MAX_BATCH_ITEMS = int(os.environ.get("RCM_MAX_BATCH_ITEMS", "1000"))
+MAX_BATCH_BYTES = int(os.environ.get("RCM_MAX_BATCH_BYTES", str(16 * 1024 * 1024)))
+
+# Asynchronous jobs (/api/jobs): worker threads, encounters that may wait in the queue,
+# largest job body, and how long / how many finished jobs keep their results
+JOB_WORKERS = int(os.environ.get("RCM_JOB_WORKERS", "2"))
+JOB_QUEUE_CAPACITY = int(os.environ.get("RCM_JOB_QUEUE_CAPACITY", "10000"))
+MAX_JOB_BYTES = int(os.environ.get("RCM_MAX_JOB_BYTES", str(64 * 1024 * 1024)))
+JOB_RETAIN_SEC = float(os.environ.get("RCM_JOB_RETAIN_SEC", "3600"))
+MAX_FINISHED_JOBS = int(os.environ.get("RCM_MAX_FINISHED_JOBS", "100"))
+
+# Largest page the encounter listing endpoints return for ?limit=
+MAX_PAGE_SIZE = int(os.environ.get("RCM_MAX_PAGE_SIZE", "1000"))
+
+# Result cache for /api/process: in-memory LRU entries (0 disables), optional shared disk tier
+RESULT_CACHE_SIZE = int(os.environ.get("RCM_RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_DIR = os.environ.get("RCM_RESULT_CACHE_DIR") or None
+RESULT_CACHE_DISK_MB = float(os.environ.get("RCM_RESULT_CACHE_DISK_MB", "256"))  # 0 = unbounded
+
+# Processed results the /api/rollup endpoint aggregates (appends are picked up incrementally)
+ROLLUP_SOURCE = os.environ.get("RCM_ROLLUP_SOURCE", "data/rcm_parsed_output.jsonl")
+_ROLLUP = None
+_ROLLUP_LOCK = threading.Lock()
+
+RESULT_CACHE = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_DIR, int(RESULT_CACHE_DISK_MB * (1 << 20))) if RESULT_CACHE_SIZE > 0 or RESULT_CACHE_DIR else None
 
-def load_csv_data():
-    """Load encounter data from CSV file."""
-    csv_path = Path("data/patient_encounters.csv")
+JOBS = JobQueue(JOB_WORKERS, JOB_QUEUE_CAPACITY, MAX_FINISHED_JOBS, JOB_RETAIN_SEC)
+
+def _watch_rules():
+    """Poll the active rule-pack file (and its fee schedule) and hot-swap it when it changes."""
+    last_mtime = None
+    while True:
+        try:
+            pack = active_rules()
+            mtime = tuple(Path(f).stat().st_mtime_ns for f in (pack.source, *pack.dependencies))
+            if last_mtime is not None and mtime != last_mtime and reload_rules():
+                print(f"Rule pack reloaded: version {active_rules().version}")
+            last_mtime = mtime
+        except Exception as e:
+            # Keep serving with the current pack; retry on the next poll
+            print(f"Rule pack reload failed: {e}")
+        time.sleep(RULES_POLL_SEC)
+
+if RULES_POLL_SEC > 0:
+    threading.Thread(target=_watch_rules, name="rules-watcher", daemon=True).start()
+
+def load_csv_data() -> EncounterStore:
+    """Open the indexed store over the encounter CSV (generating the CSV if missing)."""
+    # A compressed copy (patient_encounters.csv.gz, .bz2 or .xz) is used if the plain file is absent
+    candidates = [Path(compressed_name("data/patient_encounters.csv", c)) for c in (None, *COMPRESSIONS)]
+    csv_path = next((p for p in candidates if p.exists()), candidates[0])
     if not csv_path.exists():
         # Generate data if it doesn't exist
         from generate_rcm_testdata import main as generate_data
         generate_data()
-    
-    encounters_csv = []
-    with csv_path.open("r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            encounters_csv.append(row)
-    return encounters_csv
+    return EncounterStore(str(csv_path))
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+STORE_OPEN_MS = None
+
+def get_store() -> EncounterStore:
+    """The encounter store, opened on first use so worker boot does not depend on data size."""
+    global _STORE, STORE_OPEN_MS
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                t0 = time.perf_counter()
+                _STORE = load_csv_data()
+                STORE_OPEN_MS = round((time.perf_counter() - t0) * 1000, 2)
+                print(f"Encounter store ready in {STORE_OPEN_MS} ms")
+    return _STORE
+
+def _json_bytes(body, status: int = 200) -> Response:
+    """A JSON response from an already-serialized body (str or bytes), sent without re-encoding."""
+    return Response(body, status=status, mimetype="application/json")
 
 def get_encounter_json(encounter_id: str):
     """Get the original JSON data for a specific encounter."""
-    csv_data = load_csv_data()
-    for row in csv_data:
-        if row["encounter_id"] == encounter_id:
-            return json.loads(row["original_json"])
-    return None
-
-# Load the demo encounter data from CSV on startup
-CSV_ENCOUNTERS = load_csv_data()
-ENCOUNTERS_DICT = {row["encounter_id"]: json.loads(row["original_json"]) for row in CSV_ENCOUNTERS}
+    return get_store().get(encounter_id)
 
 @app.route('/')
 def index():
     """Serves the main HTML page."""
     return render_template('index.html')
 
+# Query parameters of the listing endpoints -> EncounterStore.query filters
+LISTING_FILTERS = {
+    "plan": "insurance_plan",
+    "member_id": "member_id",
+    "date_from": "date_from",
+    "date_to": "date_to",
+    "visit_type": "visit_type",
+    "q": "text",
+}
+
+STREAM_CHUNK_BYTES = 64 * 1024  # un-paginated listings are sent in chunks of about this size
+
+def _frame(members, keyed: bool) -> Iterator[bytes]:
+    """A JSON array (an object if `keyed`) from already-encoded members, in chunks."""
+    buf = bytearray(b"{" if keyed else b"[")
+    first = True
+    for m in members:
+        if not first:
+            buf += b","
+        buf += m
+        first = False
+        if len(buf) >= STREAM_CHUNK_BYTES:
+            yield bytes(buf)
+            buf.clear()
+    buf += b"}\n" if keyed else b"]\n"
+    yield bytes(buf)
+
+def _member(obj) -> bytes:
+    return json_codec.dumpb(obj, None, True)  # compact, sorted keys, as jsonify sends them
+
+def _listing(columns, encode, keyed=False, projectable=True, raw=False):
+    """
+    Shared GET handling for the encounter listings. `encode` turns one record into its
+    JSON member (bytes); the members form an array, or an object when `keyed`.
+
+    Filters: ?plan=, ?member_id=, ?date_from=, ?date_to=, ?visit_type=, ?q= (text).
+    ?fields=a,b keeps only those fields. ?limit=N returns one page and, if more
+    rows match, its continuation in the X-Next-Cursor and Link headers (pass it
+    back as ?cursor=). Without ?limit the whole matching set is streamed from the
+    store as it is read, so memory does not grow with the number of rows.
+    Responses carry an ETag of the data snapshot and query; a matching
+    If-None-Match gets 304 without reading any rows.
+    """
+    store = get_store()
+    args = request.args
+    etag = hashlib.sha1(
+        f"{store.signature()}|{request.path}|{sorted(args.items(multi=True))}".encode("utf-8")).hexdigest()
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    filters = {name: args.get(param) or None for param, name in LISTING_FILTERS.items()}
+    fields = [f for f in args.get("fields", "").split(",") if f] if projectable else None
+    next_cursor = None
+    if "limit" in args or "cursor" in args:
+        try:
+            limit = int(args.get("limit", MAX_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+        try:
+            records, next_cursor = store.page(limit, args.get("cursor"), fields, columns, raw, **filters)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        resp = _json_bytes(b"".join(_frame(map(encode, records), keyed)))
+    else:
+        records = store.query(columns=columns, raw=raw, **filters)
+        if fields:
+            records = ({k: r[k] for k in fields if k in r} for r in records)
+        resp = Response(_frame(map(encode, records), keyed), mimetype="application/json")
+
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+        query = args.to_dict(flat=False)
+        query["cursor"] = [next_cursor]
+        resp.headers["Link"] = f'<{url_for(request.endpoint, _external=False, **query)}>; rel="next"'
+    return resp
+
 @app.route('/api/encounters', methods=['GET'])
 def get_encounters():
     """Provides a list of available encounters for the frontend dropdown."""
-    encounter_summaries = [
-        {
-            "id": row["encounter_id"],
-            "description": f"{row['encounter_id']}: {row['reason_for_visit']}"
-        }
-        for row in CSV_ENCOUNTERS
-    ]
-    return jsonify(encounter_summaries)
+    return _listing("row_json", lambda row: _member({
+        "id": row["encounter_id"],
+        "description": f"{row['encounter_id']}: {row['reason_for_visit']}"
+    }), projectable=False)
 
 @app.route('/api/encounters_csv', methods=['GET'])
 def get_encounters_csv():
     """Provides the CSV encounter data as JSON for table display."""
-    # Return CSV data without the original_json column for cleaner display
-    clean_data = []
-    for row in CSV_ENCOUNTERS:
-        clean_row = {k: v for k, v in row.items() if k != "original_json"}
-        clean_data.append(clean_row)
-    return jsonify(clean_data)
+    # Rows are stored without the original_json column for cleaner display
+    return _listing("row_json", _member)
+
+@app.route('/api/encounters/<encounter_id>', methods=['GET'])
+def get_encounter(encounter_id):
+    """One encounter's JSON, looked up by id (sent as stored, without decoding it)."""
+    body = get_store().get_raw(encounter_id)
+    if body is None:
+        return jsonify({"error": f"Encounter '{encounter_id}' not found"}), 404
+    return _json_bytes(body)
 
 @app.route('/api/encounters_full', methods=['GET'])
 def get_encounters_full():
-    """Provides the full JSON data for all encounters."""
-    return jsonify(ENCOUNTERS_DICT)
+    """Provides the full JSON data for all encounters, keyed by encounter_id."""
+    fields = [f for f in request.args.get("fields", "").split(",") if f]
+    key = lambda eid: json_codec.dumpb(eid) + b":"
+    if fields and "encounter_id" not in fields:
+        # Projection happens before keying, so keep the key field
+        return _listing("encounter_json", lambda enc: key(enc["encounter_id"]) + _member(
+            {k: enc[k] for k in fields if k in enc}), keyed=True, projectable=False)
+    if fields:
+        return _listing("encounter_json", lambda enc: key(enc["encounter_id"]) + _member(enc), keyed=True)
+    # No projection: splice the stored JSON of each encounter into the object as is
+    return _listing("encounter_json", lambda pair: key(pair[0]) + pair[1].encode("utf-8"),
+                    keyed=True, projectable=False, raw=True)
 
 @app.route('/api/process', methods=['POST'])
 def process_api():
-    """The core API endpoint for processing a single encounter."""
+    """
+    The core API endpoint for processing a single encounter (`?profile=slim|charges` trims the result).
+    `?async=1` queues it as a job instead (see /api/jobs).
+    """
+    if request.args.get("async") in ("1", "true"):
+        return submit_job()
     if not request.json:
         return jsonify({"error": "Invalid request: missing JSON body"}), 400
 
     encounter_data = request.json
+    profile = request.args.get("profile", "full")
+    if profile not in OUTPUT_PROFILES:
+        return jsonify({"error": f"Invalid profile '{profile}' (use one of: {', '.join(OUTPUT_PROFILES)})"}), 400
 
     try:
-        results = process_encounter(encounter_data)
-        return jsonify(results)
+        if RESULT_CACHE is None:
+            return jsonify(shape_result(process_encounter(encounter_data), profile))
+        rules = active_rules()
+        key = ResultCache.key(encounter_data, f"{rules.digest}:{profile}")
+        body = RESULT_CACHE.get(key)
+        if body is None:
+            body = jsonify(shape_result(process_encounter(encounter_data, rules), profile)).get_data()
+            RESULT_CACHE.put(key, body)
+        return _json_bytes(body)
     except Exception as e:
         # It's good practice to log the error on the server
         print(f"Error processing encounter: {e}")
         return jsonify({"error": f"An error occurred during processing: {str(e)}"}), 500
 
+def _parse_batch(body: str):
+    """Split a JSON-array or NDJSON body into [(encounter or None, error or None), ...]."""
+    if body.lstrip().startswith("["):
+        items = json_codec.loads(body)  # a malformed array fails the whole request
+        return [(enc, None) if isinstance(enc, dict) else (None, "Encounter must be a JSON object") for enc in items]
+    parsed = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            enc = json_codec.loads(line)
+        except ValueError as e:
+            parsed.append((None, f"Invalid JSON: {e}"))
+            continue
+        parsed.append((enc, None) if isinstance(enc, dict) else (None, "Encounter must be a JSON object"))
+    return parsed
+
+@app.route('/api/process_batch', methods=['POST'])
+def process_batch_api():
+    """
+    Processes many encounters in one request. The body is a JSON array or NDJSON
+    (one encounter per line); the response is NDJSON with one result per input record,
+    in order, streamed as each finishes. A record that cannot be parsed or processed
+    yields {"index": i, "encounter_id": ..., "error": ...} in its place.
+    `?profile=slim|charges` trims each result (default: full).
+    """
+    profile = request.args.get("profile", "full")
+    if profile not in OUTPUT_PROFILES:
+        return jsonify({"error": f"Invalid profile '{profile}' (use one of: {', '.join(OUTPUT_PROFILES)})"}), 400
+    request.max_content_length = MAX_BATCH_BYTES
+    try:
+        parsed = _parse_batch(request.get_data(as_text=True))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request: body is not a JSON array or NDJSON ({e})"}), 400
+    if not parsed:
+        return jsonify({"error": "Invalid request: no encounters in body"}), 400
+    if len(parsed) > MAX_BATCH_ITEMS:
+        return jsonify({"error": f"Batch too large: {len(parsed)} encounters (max {MAX_BATCH_ITEMS})"}), 413
+
+    def generate():
+        for i, (enc, err) in enumerate(parsed):
+            result = process_encounter_safe(enc) if err is None else {"encounter_id": None, "error": err}
+            if "error" in result:
+                print(f"Error processing batch record {i}: {result['error']}")
+                result = {"index": i, **result}
+            yield json_codec.dumpb(shape_result(result, profile), record_json) + b"\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Bodies over RCM_MAX_BATCH_BYTES / RCM_MAX_JOB_BYTES get the same JSON 413 as the item limits."""
+    limit = request.max_content_length
+    return jsonify({"error": f"Request body too large (max {limit} bytes)" if limit else "Request body too large"}), 413
+
+def _job_urls(job_id: str):
+    return {"status_url": f"/api/jobs/{job_id}", "events_url": f"/api/jobs/{job_id}/events",
+            "results_url": f"/api/jobs/{job_id}/results"}
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queues encounters for background processing and returns 202 with the job id at once.
+    The body is one encounter, a JSON array or NDJSON; `?profile=` trims the results.
+    Answers 429 (with Retry-After) when the queue cannot take the whole job.
+    """
+    profile = request.args.get("profile", "full")
+    if profile not in OUTPUT_PROFILES:
+        return jsonify({"error": f"Invalid profile '{profile}' (use one of: {', '.join(OUTPUT_PROFILES)})"}), 400
+    request.max_content_length = MAX_JOB_BYTES
+    body = request.get_data(as_text=True)
+    try:
+        try:
+            single = json_codec.loads(body) if body.lstrip().startswith("{") else None
+        except ValueError:
+            single = None  # NDJSON
+        parsed = [(single, None)] if isinstance(single, dict) else _parse_batch(body)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request: body is not JSON or NDJSON ({e})"}), 400
+    if not parsed:
+        return jsonify({"error": "Invalid request: no encounters in body"}), 400
+    if len(parsed) > JOBS.capacity:
+        return jsonify({"error": f"Job too large: {len(parsed)} encounters (max {JOBS.capacity})"}), 413
+
+    def process(i, enc):
+        result = process_encounter_safe(enc)
+        if "error" in result:
+            print(f"Error processing job record {i}: {result['error']}")
+            result = {"index": i, **result}
+        return shape_result(result, profile)
+
+    try:
+        job = JOBS.submit(parsed, process, lambda i, err: {"index": i, "encounter_id": None, "error": err})
+    except QueueFull as e:
+        resp = jsonify({"error": f"Job queue is full, retry later ({e})"})
+        resp.status_code = 429
+        resp.headers["Retry-After"] = "5"
+        return resp
+    resp = jsonify({**job.to_dict(), **_job_urls(job.id)})
+    resp.status_code = 202
+    resp.headers["Location"] = f"/api/jobs/{job.id}"
+    return resp
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Job progress. `?wait=N` holds the request up to N seconds (max 30) for a change."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    try:
+        wait = min(float(request.args.get("wait", 0)), 30.0)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    if wait > 0 and job.status in ("queued", "running"):
+        JOBS.wait(job, (job.completed, job.status), wait)
+    return jsonify({**job.to_dict(), **_job_urls(job.id)})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Streams job status as NDJSON, one line per change, until the job ends."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    return Response((json_codec.dumpb(status) + b"\n" for status in JOBS.watch(job)), mimetype="application/x-ndjson")
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """
+    A finished job's results as NDJSON, in submission order, with the same records as
+    /api/process_batch. 409 while the job is still queued or running.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    if job.status != "done":
+        return jsonify({"error": f"Job is {job.status}", **job.to_dict()}), 409
+    return Response((json_codec.dumpb(r, record_json) + b"\n" for r in job.results), mimetype="application/x-ndjson")
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Cancels a pending job or releases a finished one's results."""
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/rollup', methods=['GET'])
+def rollup_api():
+    """
+    Charge totals over the processed results file, e.g.
+    /api/rollup?by=insurance_plan&by=day&p=50&p=90
+    """
+    global _ROLLUP
+    from charge_rollup import DIMENSIONS, FileRollup  # numpy is only needed here
+
+    by = request.args.getlist("by") or ["insurance_plan"]
+    unknown = [d for d in by if d not in DIMENSIONS]
+    if unknown:
+        return jsonify({"error": f"Unknown dimension(s) {unknown} (use: {', '.join(DIMENSIONS)})"}), 400
+    try:
+        percentiles = [float(p) for p in request.args.getlist("p")]
+    except ValueError:
+        return jsonify({"error": "Percentiles (p) must be numbers"}), 400
+    if any(not 0 <= p <= 100 for p in percentiles):
+        return jsonify({"error": "Percentiles (p) must be between 0 and 100"}), 400
+
+    with _ROLLUP_LOCK:
+        if _ROLLUP is None:
+            _ROLLUP = FileRollup(ROLLUP_SOURCE)
+        try:
+            engine = _ROLLUP.refresh()
+        except ValueError as e:
+            _ROLLUP = None  # unreadable (e.g. mid-rewrite): start over on the next request
+            return jsonify({"error": f"Could not read {ROLLUP_SOURCE}: {e}"}), 503
+        rows = engine.rollup(by, percentiles)
+        return jsonify({"by": by, "encounters": engine.encounters, "lines": len(engine), "rows": rows})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Pipeline counters and stage latency histograms in Prometheus text format."""
+    if not METRICS.enabled:
+        return Response("# metrics disabled (RCM_METRICS=0)\n", mimetype="text/plain")
+    return Response(METRICS.prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the /api/process result cache."""
+    if RESULT_CACHE is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **RESULT_CACHE.stats()})
+
+@app.route('/api/rules', methods=['GET'])
+def rules_info():
+    """Reports the rule pack currently used for processing."""
+    rules = active_rules()
+    totals = METRICS.policy_summary()
+    policy = [
+        {"id": r.id, "buckets": list(r.buckets), "codes": list(r.codes), **totals.get(r.id, {})}
+        for r in rules.policy.rules
+    ]
+    return jsonify({"version": rules.version, "source": rules.source, "digest": rules.digest, "policy_rules": policy})
+
+@app.route('/api/rules/reload', methods=['POST'])
+def rules_reload():
+    """Reloads the rule pack now instead of waiting for the file watcher."""
+    try:
+        reloaded = reload_rules()
+    except Exception as e:
+        print(f"Error reloading rule pack: {e}")
+        return jsonify({"error": f"Rule pack could not be loaded: {str(e)}"}), 500
+    return jsonify({"reloaded": reloaded, "version": active_rules().version})
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness plus boot timings."""
+    return jsonify({
+        "status": "ok",
+        "startup_ms": STARTUP_MS,
+        "encounter_store_open_ms": STORE_OPEN_MS,
+        "encounter_store_loaded": _STORE is not None,
+        "job_queue": JOBS.stats(),
+        "json_codec": json_codec.describe(),
+    })
+
+STARTUP_MS = round((time.perf_counter() - _BOOT_T0) * 1000, 2)
+print(f"App module loaded in {STARTUP_MS} ms")
+
 if __name__ == '__main__':
     app.run(debug=True, port=8080)
@@ -0,0 +1,250 @@
+"""
+Per-stage benchmarks for the processing pipeline.
+
+    python benchmark_rcm.py                                  # fixture + 20k synthetic
+    python benchmark_rcm.py --synthetic 200000 --out bench_results.json
+    python benchmark_rcm.py --compress gzip,bz2,xz --compress-level 6
+    python benchmark_rcm.py --save-baseline                  # store as benchmarks/baseline.json
+    python benchmark_rcm.py --baseline other.json --tolerance 0.2
+
+Reports encounters/sec, mean and p50/p90/p99 latency per stage, and peak traced memory
+for an end-to-end streamed run. Output writing is also timed with each --compress codec,
+reporting its compression ratio and its cost over writing plain files.
+
+Runs are compared with benchmarks/baseline.json when it exists (or with --baseline;
+--no-baseline skips it): exits 1 if any stage's throughput drops by more than --tolerance,
+or peak memory grows by more than --tolerance and MEMORY_FLOOR_MB. Only datasets run with
+the same size and settings are compared, and the committed baseline only gates runs on the
+host that recorded it (same platform and Python); elsewhere differences are printed only.
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import json_codec
+from generate_rcm_testdata import encounter_to_dict, iter_synthetic_encounters
+from parse_rcm_documents import (
+    active_rules, apply_policy_checks, compose_charges, cross_check_structured,
+    extract_facts, iter_encounters, process_encounter, record_json, save_outputs,
+)
+
+STAGES = ["extract_facts", "cross_check_structured", "apply_policy_checks", "compose_charges", "process_encounter"]
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+MEMORY_FLOOR_MB = 1.0  # peak memory growth below this is noise, whatever the ratio
+
+def _summary(samples_ns: List[int]) -> Dict[str, float]:
+    s = sorted(samples_ns)
+    n = len(s)
+    total = sum(s)
+    pct = lambda p: s[min(n - 1, int(p * n))] / 1000
+    return {
+        "per_sec": round(n / (total / 1e9), 1) if total else 0.0,
+        "mean_us": round(total / n / 1000, 2),
+        "p50_us": round(pct(0.50), 2),
+        "p90_us": round(pct(0.90), 2),
+        "p99_us": round(pct(0.99), 2),
+    }
+
+def _dir_bytes(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).iterdir())
+
+def bench_dataset(encounters: List[Dict[str, Any]], codecs: Sequence[str] = ("gzip",),
+                  level: Optional[int] = None) -> Dict[str, Any]:
+    samples: Dict[str, List[int]] = {k: [] for k in STAGES}
+    clock = time.perf_counter_ns
+    rules = active_rules()
+
+    for enc in encounters[:200]:  # warm-up: caches, allocator, branch predictors
+        process_encounter(enc, rules)
+
+    for enc in encounters:
+        t0 = clock()
+        facts = extract_facts(enc["note_sentences"], enc["context"], rules)
+        t1 = clock()
+        cross_check_structured(facts, enc["structured"], rules)
+        t2 = clock()
+        apply_policy_checks(facts, enc["context"], rules)
+        t3 = clock()
+        compose_charges(facts, facts["diagnoses"], rules, enc["identity"].get("insurance_plan"), enc["context"].get("date_time"))
+        t4 = clock()
+        samples["extract_facts"].append(t1 - t0)
+        samples["cross_check_structured"].append(t2 - t1)
+        samples["apply_policy_checks"].append(t3 - t2)
+        samples["compose_charges"].append(t4 - t3)
+
+    for enc in encounters:
+        t0 = clock()
+        process_encounter(enc, rules)
+        samples["process_encounter"].append(clock() - t0)
+
+    stages = {k: _summary(v) for k, v in samples.items()}
+
+    # Per-rule evaluation counts and time (a separate pass: timing every rule has its own cost)
+    rule_stats: Dict[str, List[int]] = {}
+    for enc in encounters:
+        facts = extract_facts(enc["note_sentences"], enc["context"], rules)
+        apply_policy_checks(facts, enc["context"], rules, rule_stats)
+    policy = {rule: {"evaluations": n, "violations": hits, "total_ms": round(ns / 1e6, 3)}
+              for rule, (n, hits, ns) in rule_stats.items()}
+
+    # save_outputs is timed as a whole (it is a streaming writer, not per record)
+    results = [process_encounter(enc, rules) for enc in encounters]
+
+    # JSON encoding alone: the file form (stdlib-identical unless RCM_JSON_STYLE=compact)
+    # and the wire form (orjson when installed) that API responses use
+    for stage, encode in (("json_file_form", json_codec.dumps), ("json_wire_form", json_codec.dumpb)):
+        t0 = clock()
+        for r in results:
+            encode(r, record_json)
+        stages[stage] = {"per_sec": round(len(results) / ((clock() - t0) / 1e9), 1)}
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = clock()
+        save_outputs(results, tmp)
+        elapsed = clock() - t0
+        plain_bytes = _dir_bytes(tmp)
+    stages["save_outputs"] = {"per_sec": round(len(results) / (elapsed / 1e9), 1)}
+
+    # The same write with each codec: ratio against the plain files, and the extra wall time
+    compression = {}
+    for codec in codecs:
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = clock()
+            save_outputs(results, tmp, compression=codec, level=level)
+            c_elapsed = clock() - t0
+            c_bytes = _dir_bytes(tmp)
+        stages[f"save_outputs_{codec}"] = {"per_sec": round(len(results) / (c_elapsed / 1e9), 1)}
+        compression[codec] = {
+            "level": level,
+            "plain_mb": round(plain_bytes / 2**20, 2),
+            "compressed_mb": round(c_bytes / 2**20, 2),
+            "ratio": round(plain_bytes / max(c_bytes, 1), 2),
+            "cost_pct": round((c_elapsed / elapsed - 1) * 100, 1),
+        }
+    del results
+
+    # Peak memory of an end-to-end streamed run (process + write, nothing retained)
+    with tempfile.TemporaryDirectory() as tmp:
+        tracemalloc.start()
+        save_outputs((process_encounter(enc, rules) for enc in encounters), tmp)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {"n": len(encounters), "stages": stages, "policy_rules": policy, "compression": compression,
+            "peak_stream_mb": round(peak / 2**20, 2)}
+
+def same_host(results: Dict[str, Any], baseline: Dict[str, Any]) -> bool:
+    """Whether `baseline` was recorded on this platform and Python (absolute numbers are only comparable there)."""
+    return all(results["meta"].get(k) == baseline.get("meta", {}).get(k) for k in ("platform", "python"))
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Regressions of `results` against `baseline` beyond `tolerance` (fraction), and the
+    datasets skipped (name -> why) because their size or run settings differ.
+    """
+    failures: List[str] = []
+    skipped: Dict[str, str] = {}
+    config = baseline.get("meta", {}).get("config")
+    for name, ds in baseline.get("datasets", {}).items():
+        cur = results["datasets"].get(name)
+        if cur is None:
+            continue
+        if config != results["meta"]["config"]:
+            skipped[name] = f"settings {results['meta']['config']} vs baseline {config}"
+            continue
+        if cur["n"] != ds["n"]:
+            skipped[name] = f"{cur['n']} encounters vs baseline {ds['n']}"
+            continue
+        for stage, base in ds["stages"].items():
+            now = cur["stages"].get(stage)
+            if now and now["per_sec"] < base["per_sec"] * (1 - tolerance):
+                failures.append(f"{name}/{stage}: {now['per_sec']:.0f}/s vs baseline {base['per_sec']:.0f}/s")
+        grown = cur["peak_stream_mb"] - ds["peak_stream_mb"]
+        if cur["peak_stream_mb"] > ds["peak_stream_mb"] * (1 + tolerance) and grown > MEMORY_FLOOR_MB:
+            failures.append(f"{name}/peak memory: {cur['peak_stream_mb']} MB vs baseline {ds['peak_stream_mb']} MB")
+    return failures, skipped
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark each pipeline stage.")
+    ap.add_argument("--fixture", default="data/rcm_demo_input.jsonl", help="JSONL or encounter CSV")
+    ap.add_argument("--fixture-repeat", type=int, default=200, help="passes over the fixture (it is tiny)")
+    ap.add_argument("--synthetic", type=int, default=20000, help="synthetic encounters (0 to skip)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--compress", default="gzip", help="comma-separated codecs to time output writing with ('' to skip)")
+    ap.add_argument("--compress-level", type=int, help="level for every codec (default: each codec's own)")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--baseline", help=f"results file to fail on regressions against (default: {DEFAULT_BASELINE})")
+    ap.add_argument("--no-baseline", action="store_true", help="skip the baseline comparison")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    args = ap.parse_args()
+
+    # Read before running: --save-baseline may overwrite the same file
+    baseline_path = args.baseline or (DEFAULT_BASELINE if Path(DEFAULT_BASELINE).exists() else None)
+    if args.no_baseline:
+        baseline_path = None
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8")) if baseline_path else None
+
+    codecs = [c for c in args.compress.split(",") if c]
+    datasets = {"fixture": list(iter_encounters(args.fixture)) * args.fixture_repeat}
+    if args.synthetic:
+        datasets[f"synthetic_{args.synthetic}"] = [
+            encounter_to_dict(e) for e in iter_synthetic_encounters(args.synthetic, seed=args.seed)
+        ]
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "rule_pack_version": active_rules().version,
+            "json_codec": json_codec.describe(),
+            # What a baseline must match for its numbers to be compared
+            "config": {"fixture": args.fixture, "seed": args.seed, "compress": codecs,
+                       "compress_level": args.compress_level, "json_codec": json_codec.describe()},
+        },
+        "datasets": {},
+    }
+    for name, encs in datasets.items():
+        results["datasets"][name] = r = bench_dataset(encs, codecs, args.compress_level)
+        print(f"{name} ({r['n']} encounters, peak {r['peak_stream_mb']} MB)")
+        for stage, st in r["stages"].items():
+            lat = f"  p50 {st['p50_us']:>8.1f}us  p90 {st['p90_us']:>8.1f}us  p99 {st['p99_us']:>8.1f}us" if "p50_us" in st else ""
+            print(f"  {stage:<24} {st['per_sec']:>12.0f}/s{lat}")
+        for rule, st in r["policy_rules"].items():
+            print(f"  rule {rule:<19} {st['evaluations']:>12} evals  {st['violations']:>8} warnings  {st['total_ms']:>9.1f}ms")
+        for codec, st in r["compression"].items():
+            print(f"  {codec:<24} {st['plain_mb']:>9.1f} -> {st['compressed_mb']:.1f} MB  ratio {st['ratio']:>6.2f}x  cost {st['cost_pct']:+.1f}%")
+
+    Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results: {args.out}")
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Baseline saved: {args.save_baseline}")
+
+    if baseline is not None:
+        failures, skipped = compare(results, baseline, args.tolerance)
+        for name, why in skipped.items():
+            print(f"{name} not compared with {baseline_path}: {why}")
+        compared = [n for n in results["datasets"] if n in baseline.get("datasets", {}) and n not in skipped]
+        # An explicit --baseline always gates; the committed one only on the host that recorded it
+        gate = bool(args.baseline) or same_host(results, baseline)
+        if failures:
+            print(f"{'REGRESSION' if gate else 'Slower than'} {baseline_path} (tolerance {args.tolerance:.0%}):")
+            for f in failures:
+                print(f"  {f}")
+            if not gate:
+                print(f"Recorded on {baseline['meta'].get('platform')}, Python {baseline['meta'].get('python')}: not gating here.")
+            return 1 if gate else 0
+        if compared:
+            print(f"No regressions against {baseline_path} ({', '.join(compared)}).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Charge and revenue rollups over processed results, on NumPy columns.
+
+    python charge_rollup.py --by insurance_plan
+    python charge_rollup.py --input data/rcm_parsed_output.jsonl --by day --by code --percentiles 50 90 99 --json
+
+Every charge line becomes one row of dictionary-encoded columns (plan, code, visit level,
+location, day) plus units and total. Per-dimension sums and counts are kept up to date as
+batches are added; multi-dimension groupings and percentiles are computed on demand with
+vectorized grouping. Rollups need the full output profile for plan, location and day
+(slim/charges outputs group those under "").
+"""
+import argparse
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import json_codec
+from compressed_io import compression_of, open_text
+
+DIMENSIONS = ("insurance_plan", "code", "visit_level", "location", "day")
+_VISIT_PREFIX = "SVC_VISIT_"
+
+class _Column:
+    """Growable numpy column."""
+
+    def __init__(self, dtype):
+        self.data = np.empty(1024, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: np.ndarray) -> None:
+        need = self.size + len(values)
+        if need > len(self.data):
+            grown = np.empty(max(need, 2 * len(self.data)), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:need] = values
+        self.size = need
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+class RollupEngine:
+    def __init__(self):
+        self.labels: Dict[str, List[str]] = {d: [] for d in DIMENSIONS}
+        self._ids: Dict[str, Dict[str, int]] = {d: {} for d in DIMENSIONS}
+        self.columns: Dict[str, _Column] = {d: _Column(np.int32) for d in DIMENSIONS}
+        self.units = _Column(np.int64)
+        self.total = _Column(np.float64)
+        # Running per-dimension aggregates, indexed by dictionary id
+        self._sums = {d: np.zeros(0) for d in DIMENSIONS}
+        self._unit_sums = {d: np.zeros(0, dtype=np.int64) for d in DIMENSIONS}
+        self._counts = {d: np.zeros(0, dtype=np.int64) for d in DIMENSIONS}
+        self.encounters = 0
+
+    def __len__(self) -> int:
+        return self.total.size
+
+    def _encode(self, dim: str, value: str) -> int:
+        ids = self._ids[dim]
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(self.labels[dim])
+            self.labels[dim].append(value)
+        return i
+
+    def add_results(self, results: Iterable[Dict[str, Any]]) -> int:
+        """Append the charge lines of a batch of results; returns lines added."""
+        cols: Dict[str, List[int]] = {d: [] for d in DIMENSIONS}
+        units: List[int] = []
+        totals: List[float] = []
+        enc = self._encode
+        for r in results:
+            charges = r.get("charges")
+            if not charges:
+                continue
+            self.encounters += 1
+            identity, context = r.get("identity", {}), r.get("context", {})
+            level = next((c["code"][len(_VISIT_PREFIX):] for c in charges if c["code"].startswith(_VISIT_PREFIX)), "")
+            shared = (
+                enc("insurance_plan", identity.get("insurance_plan", "")),
+                enc("visit_level", level),
+                enc("location", context.get("location", "")),
+                enc("day", (context.get("date_time") or "")[:10]),
+            )
+            for c in charges:
+                cols["insurance_plan"].append(shared[0])
+                cols["visit_level"].append(shared[1])
+                cols["location"].append(shared[2])
+                cols["day"].append(shared[3])
+                cols["code"].append(enc("code", c["code"]))
+                units.append(c["units"])
+                totals.append(c["total"])
+        if not totals:
+            return 0
+
+        t = np.asarray(totals, dtype=np.float64)
+        u = np.asarray(units, dtype=np.int64)
+        self.total.extend(t)
+        self.units.extend(u)
+        for d in DIMENSIONS:
+            ids = np.asarray(cols[d], dtype=np.int32)
+            self.columns[d].extend(ids)
+            n = len(self.labels[d])
+            self._sums[d] = _pad(self._sums[d], n) + np.bincount(ids, weights=t, minlength=n)
+            self._unit_sums[d] = _pad(self._unit_sums[d], n) + np.bincount(ids, weights=u, minlength=n).astype(np.int64)
+            self._counts[d] = _pad(self._counts[d], n) + np.bincount(ids, minlength=n)
+        return len(totals)
+
+    def rollup(self, by: Sequence[str], percentiles: Sequence[float] = ()) -> List[Dict[str, Any]]:
+        """
+        Group charge lines by one or more DIMENSIONS. Each row has the group values,
+        `lines`, `units`, `total` and one `pNN` per requested percentile of line totals.
+        Rows are sorted by total, largest first.
+        """
+        by = list(by)
+        for d in by:
+            if d not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{d}' (use: {', '.join(DIMENSIONS)})")
+        if not len(self) or not by:
+            return []
+
+        if len(by) == 1 and not percentiles:
+            d = by[0]
+            present = np.nonzero(self._counts[d])[0]
+            return _rows(by, [present], [self.labels[d]], self._counts[d][present],
+                         self._unit_sums[d][present], self._sums[d][present], {})
+
+        codes = [self.columns[d].view() for d in by]
+        sizes = [len(self.labels[d]) for d in by]
+        keys = np.ravel_multi_index(codes, sizes) if len(by) > 1 else codes[0].astype(np.int64)
+        uniq, group = np.unique(keys, return_inverse=True)
+        counts = np.bincount(group)
+        sums = np.bincount(group, weights=self.total.view())
+        unit_sums = np.bincount(group, weights=self.units.view()).astype(np.int64)
+        pct = {}
+        if percentiles:
+            order = np.lexsort((self.total.view(), group))
+            ordered = self.total.view()[order]
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            for p in percentiles:
+                # linear interpolation between closest ranks, per group
+                pos = starts + (counts - 1) * (p / 100.0)
+                lo = np.floor(pos).astype(np.int64)
+                hi = np.minimum(lo + 1, starts + counts - 1)
+                frac = pos - lo
+                pct[f"p{p:g}"] = ordered[lo] * (1 - frac) + ordered[hi] * frac
+        group_codes = np.unravel_index(uniq, sizes) if len(by) > 1 else [uniq]
+        return _rows(by, group_codes, [self.labels[d] for d in by], counts, unit_sums, sums, pct)
+
+    def load_jsonl(self, path: str, start: int = 0, batch_size: int = 50000) -> int:
+        """
+        Add results from a plain processed JSONL starting at byte `start`; returns the
+        end offset. Byte offsets need an uncompressed file: use load_file for the others.
+        """
+        with open(path, "rb") as f:
+            f.seek(start)
+            batch: List[Dict[str, Any]] = []
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):  # EOF, or a line still being written
+                    break
+                start += len(line)
+                if line.strip():
+                    batch.append(json_codec.loads(line))
+                if len(batch) >= batch_size:
+                    self.add_results(batch); batch = []
+            self.add_results(batch)
+        return start
+
+    def load_file(self, path: str, batch_size: int = 50000) -> None:
+        """Add every result of a processed JSONL, plain or compressed (.gz, .bz2, .xz)."""
+        with open_text(path, "rb") as f:
+            batch: List[Dict[str, Any]] = []
+            for line in f:
+                if line.strip():
+                    batch.append(json_codec.loads(line))
+                if len(batch) >= batch_size:
+                    self.add_results(batch); batch = []
+            self.add_results(batch)
+
+def _pad(a: np.ndarray, n: int) -> np.ndarray:
+    return a if len(a) >= n else np.concatenate((a, np.zeros(n - len(a), dtype=a.dtype)))
+
+def _rows(by, group_codes, labels, counts, unit_sums, sums, pct) -> List[Dict[str, Any]]:
+    rows = []
+    for i in np.argsort(-sums, kind="stable"):
+        row: Dict[str, Any] = {d: labels[k][int(group_codes[k][i])] for k, d in enumerate(by)}
+        row.update(lines=int(counts[i]), units=int(unit_sums[i]), total=float(sums[i]))
+        for name, values in pct.items():
+            row[name] = round(float(values[i]), 2)
+        rows.append(row)
+    return rows
+
+class FileRollup:
+    """
+    A RollupEngine kept in step with a processed JSONL file: lines appended since the last
+    call are added incrementally; if the file was rewritten (replaced, shrunk, or rewritten
+    in place with different bytes before the last offset read), it is reloaded from scratch.
+    Only plain files are tailed: a compressed file has no usable byte offsets, so it is
+    reloaded whole whenever its size or mtime changes.
+    """
+
+    # Bytes at the start and just before the offset read so far that must be unchanged
+    # for the file to count as appended to rather than rewritten
+    CHECK_BYTES = 4096
+
+    def __init__(self, path: str):
+        self.path = path
+        self.engine = RollupEngine()
+        self._offset = 0
+        self._mark = b""
+        self._ino: Optional[int] = None
+        self._compressed = False
+        self._stamp: Optional[tuple] = None
+
+    def refresh(self) -> RollupEngine:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return self.engine
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if stamp == self._stamp:
+            return self.engine
+        if st.st_ino != self._ino:
+            self._ino, self._compressed = st.st_ino, compression_of(self.path) is not None
+            self._reset()
+        if self._compressed:
+            engine = RollupEngine()
+            engine.load_file(self.path)
+            self.engine = engine
+        else:
+            if st.st_size < self._offset or self._read_mark() != self._mark:
+                self._reset()  # rewritten in place (e.g. save_outputs truncates and rewrites)
+            try:
+                self._load()
+            except ValueError:
+                # The old offset fell inside a line: rewritten in a way the checks missed
+                self._reset()
+                self._load()
+        self._stamp = stamp
+        return self.engine
+
+    def _reset(self) -> None:
+        self.engine, self._offset, self._mark = RollupEngine(), 0, b""
+
+    def _load(self) -> None:
+        self._offset = self.engine.load_jsonl(self.path, self._offset)
+        self._mark = self._read_mark()
+
+    def _read_mark(self) -> bytes:
+        """The first and last CHECK_BYTES of what was read so far, as the file holds them now."""
+        if not self._offset:
+            return b""
+        n = min(self._offset, self.CHECK_BYTES)
+        with open(self.path, "rb") as f:
+            head = f.read(n)
+            f.seek(self._offset - n)
+            return head + f.read(n)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Charge totals grouped by plan, code, visit level, location or day.")
+    ap.add_argument("--input", default="data/rcm_parsed_output.jsonl")
+    ap.add_argument("--by", action="append", choices=DIMENSIONS, help="repeat to group by several dimensions")
+    ap.add_argument("--percentiles", type=float, nargs="*", default=[])
+    ap.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = ap.parse_args()
+
+    engine = RollupEngine()
+    engine.load_file(args.input)
+    by = args.by or ["insurance_plan"]
+    rows = engine.rollup(by, args.percentiles)
+    if args.json:
+        print(json.dumps({"by": by, "encounters": engine.encounters, "lines": len(engine), "rows": rows}, indent=2, ensure_ascii=False))
+        return
+    cols = list(rows[0]) if rows else by
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+    print(f"{engine.encounters} encounters, {len(engine)} charge lines from {args.input}")
+
+if __name__ == "__main__":
+    main()
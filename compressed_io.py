@@ -0,0 +1,187 @@
+"""
+Transparent gzip / bz2 / xz for the JSONL and CSV files the pipeline reads and writes.
+
+    with open_text("data/synthetic_encounters.jsonl.gz") as f: ...     # detected and decompressed
+    with open_text("data/out.jsonl.xz", "w", level=3) as f: ...         # xz, from the extension
+
+Compression is picked from the file extension (.gz, .bz2, .xz) and, for existing files
+without one, from their magic bytes. Writers compress on a background thread: the caller's
+writes are buffered into 1 MB chunks and queued, and zlib/bz2/lzma release the GIL while
+they work, so compression overlaps with processing instead of adding to it.
+
+    python compressed_io.py data/rcm_parsed_output.jsonl --to xz --level 6   # recompress a file
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+import zlib
+from pathlib import Path
+from typing import IO, Any, Dict, NamedTuple, Optional, Union
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+class Codec(NamedTuple):
+    suffix: str
+    magic: bytes
+    default_level: int
+    opener: Any                 # module with open(path, mode, ...) for reading
+    compressor: Any             # level -> object with compress(bytes) / flush()
+
+COMPRESSIONS: Dict[str, Codec] = {
+    # wbits 31: a gzip member (header + deflate + crc trailer) with mtime 0, so output is reproducible
+    "gzip": Codec(".gz", b"\x1f\x8b", 6, gzip, lambda level: zlib.compressobj(level, zlib.DEFLATED, 31)),
+    "bz2": Codec(".bz2", b"BZh", 9, bz2, lambda level: bz2.BZ2Compressor(level)),
+    "xz": Codec(".xz", b"\xfd7zXZ\x00", 6, lzma, lambda level: lzma.LZMACompressor(preset=level)),
+}
+
+# Level used when a caller does not pass one (each codec's own default if unset)
+DEFAULT_LEVEL = int(os.environ["RCM_COMPRESS_LEVEL"]) if os.environ.get("RCM_COMPRESS_LEVEL") else None
+
+CHUNK_BYTES = 1 << 20   # what the writer hands to the compression thread at a time
+QUEUE_CHUNKS = 8        # chunks in flight before writers wait for the thread
+
+def compression_of_name(path: PathLike) -> Optional[str]:
+    """The compression named by `path`'s extension (files about to be written have no magic yet)."""
+    name = str(path).lower()
+    for codec, c in COMPRESSIONS.items():
+        if name.endswith(c.suffix):
+            return codec
+    return None
+
+def compression_of(path: PathLike) -> Optional[str]:
+    """The compression of `path`: by extension, else by the magic bytes of an existing file."""
+    codec = compression_of_name(path)
+    if codec is not None:
+        return codec
+    try:
+        with open(path, "rb") as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    for codec, c in COMPRESSIONS.items():
+        if head.startswith(c.magic):
+            return codec
+    return None
+
+def plain_name(path: PathLike) -> str:
+    """`path` without its compression extension ("a.csv.gz" -> "a.csv")."""
+    name = str(path)
+    for c in COMPRESSIONS.values():
+        if name.lower().endswith(c.suffix):
+            return name[:-len(c.suffix)]
+    return name
+
+def compressed_name(path: PathLike, compression: Optional[str]) -> str:
+    """`path` with the extension of `compression` (unchanged for None)."""
+    return str(path) + COMPRESSIONS[compression].suffix if compression else str(path)
+
+class _CompressingWriter(io.RawIOBase):
+    """
+    Raw sink that compresses what it is given into `fileobj`. With `threaded`, chunks go
+    through a bounded queue to a worker thread; an error there is raised by the next
+    write or by close.
+    """
+
+    def __init__(self, fileobj: IO[bytes], compressor: Any, threaded: bool = True):
+        super().__init__()
+        self._f = fileobj
+        self._c = compressor
+        self._error: Optional[BaseException] = None
+        self._q: Optional["queue.Queue[Optional[bytes]]"] = None
+        if threaded:
+            self._q = queue.Queue(QUEUE_CHUNKS)
+            self._thread = threading.Thread(target=self._run, name="compress-writer", daemon=True)
+            self._thread.start()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self._error is not None:
+            raise self._error
+        data = bytes(b)  # the buffered writer reuses its buffer
+        if self._q is None:
+            self._f.write(self._c.compress(data))
+        else:
+            self._q.put(data)
+        return len(data)
+
+    def _run(self) -> None:
+        try:
+            while True:
+                data = self._q.get()
+                if data is None:
+                    return
+                out = self._c.compress(data)
+                if out:
+                    self._f.write(out)
+        except BaseException as e:
+            self._error = e
+            while self._q.get() is not None:  # keep the writer from blocking on a full queue
+                pass
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._q is not None:
+                self._q.put(None)
+                self._thread.join()
+            if self._error is not None:
+                raise self._error
+            self._f.write(self._c.flush())
+        finally:
+            self._f.close()
+            super().close()
+
+def open_text(path: PathLike, mode: str = "r", compression: Optional[str] = None, level: Optional[int] = None,
+              encoding: str = "utf-8", newline: Optional[str] = None, threaded: bool = True) -> IO:
+    """
+    Open a text (or, with "b" in `mode`, binary) file for reading or writing, compressed or not.
+    Reading detects the compression; writing uses `compression`, else the path's extension.
+    `level` defaults to RCM_COMPRESS_LEVEL, then to the codec's own default.
+    """
+    binary = "b" in mode
+    kind = mode.replace("b", "").replace("t", "")
+    if kind not in ("r", "w"):
+        raise ValueError(f"open_text mode must be r or w (optionally with b or t), got {mode!r}")
+    if kind == "r":
+        codec = compression_of(path)
+        if codec is None:
+            return open(path, "rb") if binary else open(path, "r", encoding=encoding, newline=newline)
+        raw: IO[bytes] = COMPRESSIONS[codec].opener.open(path, "rb")
+        return raw if binary else io.TextIOWrapper(raw, encoding=encoding, newline=newline)
+
+    codec = compression if compression is not None else compression_of_name(path)
+    if codec is None:
+        return open(path, "wb") if binary else open(path, "w", encoding=encoding, newline=newline)
+    if codec not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {codec!r}; use one of {', '.join(COMPRESSIONS)}")
+    c = COMPRESSIONS[codec]
+    level = level if level is not None else DEFAULT_LEVEL if DEFAULT_LEVEL is not None else c.default_level
+    sink = io.BufferedWriter(_CompressingWriter(open(path, "wb"), c.compressor(level), threaded), CHUNK_BYTES)
+    return sink if binary else io.TextIOWrapper(sink, encoding=encoding, newline=newline, write_through=False)
+
+if __name__ == "__main__":
+    import argparse
+    import shutil
+    import time
+
+    ap = argparse.ArgumentParser(description="Recompress a JSONL or CSV file (or decompress it with --to none).")
+    ap.add_argument("path")
+    ap.add_argument("--to", choices=sorted(COMPRESSIONS) + ["none"], default="gzip")
+    ap.add_argument("--level", type=int)
+    args = ap.parse_args()
+    to = None if args.to == "none" else args.to
+    dst = compressed_name(plain_name(args.path), to)
+    if dst == args.path:
+        ap.error(f"{args.path} already has that compression")
+    t0 = time.perf_counter()
+    with open_text(args.path, "rb") as src, open_text(dst, "wb", to, args.level) as out:
+        shutil.copyfileobj(src, out, CHUNK_BYTES)
+    size_in, size_out = Path(args.path).stat().st_size, Path(dst).stat().st_size
+    print(f"{dst}: {size_in} -> {size_out} bytes ({size_in / max(size_out, 1):.2f}x) in {time.perf_counter() - t0:.2f}s")
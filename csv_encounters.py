@@ -0,0 +1,192 @@
+"""
+Encounters from the flat columns of patient_encounters.csv.
+
+Rows keep working without `original_json`: the encounter is rebuilt from the
+identity, context and vitals columns, the `orders` summary and `clinical_notes`.
+Exports written with `encounters_to_csv(..., embed_json=False)` carry the order
+details processing needs (units, laterality, views, authorization) after each
+order name, e.g. "Imaging Orders: Head MRI without contrast [units=1, status=Pending]",
+plus the identity and context fields the default export leaves to `original_json`.
+
+    python csv_encounters.py data/patient_encounters.csv --no-json   # print rebuilt encounters
+"""
+import csv
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from compressed_io import open_text
+import json_codec
+
+# structured.orders category -> label in the `orders` column, in column order
+ORDER_LABELS = {
+    "lab_tests": "Labs",
+    "imaging": "Imaging",
+    "imaging_orders": "Imaging Orders",
+    "tests": "Tests",
+    "in_clinic_treatments": "Treatments",
+}
+_ORDER_CATEGORIES = {label: category for category, label in ORDER_LABELS.items()}
+
+# (encounter field, CSV column) in encounter order. Columns marked optional are only in
+# the JSON-free export; the default export keeps them in original_json alone.
+IDENTITY_COLUMNS = (
+    ("name", "patient_name"), ("date_of_birth", "date_of_birth"), ("sex", "sex"),
+    ("government_id", "government_id?"), ("insurance_plan", "insurance_plan"), ("member_id", "member_id"),
+    ("eligibility_status", "eligibility_status?"), ("copayment", "copayment?"),
+    ("coinsurance", "coinsurance?"), ("deductible_remaining", "deductible_remaining?"),
+)
+CONTEXT_COLUMNS = (
+    ("date_time", "visit_date"), ("location", "location"), ("clinician_role", "clinician_role"),
+    ("visit_type", "visit_type"), ("place_of_service", "place_of_service?"),
+    ("time_with_patient_min", "time_with_patient_min"), ("reason_for_visit", "reason_for_visit"),
+)
+EXTRA_COLUMNS = [col[:-1] for _, col in IDENTITY_COLUMNS + CONTEXT_COLUMNS if col.endswith("?")]
+
+_GROUP_SPLIT = re.compile(r"; (?=(?:%s): )" % "|".join(sorted(map(re.escape, _ORDER_CATEGORIES), key=len, reverse=True)))
+_GROUP_RE = re.compile(r"(%s): (.*)$" % "|".join(sorted(map(re.escape, _ORDER_CATEGORIES), key=len, reverse=True)), re.S)
+# Order names are comma-separated but may contain ", " themselves ("..., transabdominal"):
+# a new name starts with a capital or digit, detail keys are lowercase
+_NAME_SPLIT = re.compile(r", (?=[A-Z0-9])")
+_DETAIL_RE = re.compile(r"^(.*?) \[(.*)\]$", re.S)
+_DETAIL_SPLIT = re.compile(r", (?=\w+=)")
+# Sentence ids as the notes are written: "S1. ... S2. ..."
+_SENTENCE_ID = re.compile(r"S\d+\.\s")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+def split_sentences(notes: str) -> List[str]:
+    """
+    `note_sentences` of a clinical_notes string. Notes written as "S1. ... S2. ..."
+    split at their ids and keep them, so ids match the source encounter; other text
+    is split after sentence punctuation and numbered S1, S2, ... in order.
+    """
+    notes = notes.strip()
+    if not notes:
+        return []
+    # A plain search plus a look at the previous character is several times faster than a lookbehind
+    starts = [i for i in (m.start() for m in _SENTENCE_ID.finditer(notes)) if i == 0 or notes[i - 1].isspace()]
+    if starts and starts[0] == 0:
+        bounds = starts + [len(notes)]
+        return [notes[a:b].strip() for a, b in zip(bounds, bounds[1:])]
+    return [f"S{i}. {s}" for i, s in enumerate(_SENTENCE_END.split(notes), 1) if s]
+
+def _scalar(text: str) -> Any:
+    if text in ("True", "False"):
+        return text == "True"
+    if text == "None":
+        return None
+    for conv in (int, float):
+        try:
+            return conv(text)
+        except ValueError:
+            pass
+    return text
+
+def format_orders(orders: Dict[str, Any], details: bool = False) -> str:
+    """The `orders` column; with `details`, each order's scalar fields follow its name in brackets."""
+    groups = []
+    for category, label in ORDER_LABELS.items():
+        items = orders.get(category)
+        if not items:
+            continue
+        names = []
+        for o in items:
+            name = o.get("name", "")
+            if details:
+                fields = [f"{k}={v}" for k, v in o.items()
+                          if k != "name" and (v is None or isinstance(v, (str, int, float)))]
+                if fields:
+                    name = f"{name} [{', '.join(fields)}]"
+            names.append(name)
+        groups.append(f"{label}: {', '.join(names)}")
+    return "; ".join(groups)
+
+def parse_orders(text: str) -> Dict[str, List[Dict[str, Any]]]:
+    """structured.orders from an `orders` column (names only, or names with [details])."""
+    orders: Dict[str, List[Dict[str, Any]]] = {}
+    for group in _GROUP_SPLIT.split(text.strip()) if text and text.strip() else ():
+        m = _GROUP_RE.match(group)
+        if not m:
+            continue
+        items = orders.setdefault(_ORDER_CATEGORIES[m.group(1)], [])
+        for part in _NAME_SPLIT.split(m.group(2)):
+            d = _DETAIL_RE.match(part)
+            if not d:
+                items.append({"name": part.strip()})
+                continue
+            order: Dict[str, Any] = {"name": d.group(1).strip()}
+            for field in _DETAIL_SPLIT.split(d.group(2)):
+                k, _, v = field.partition("=")
+                order[k.strip()] = _scalar(v)
+            items.append(order)
+    return orders
+
+def _number(text: Optional[str]) -> Any:
+    if text is None or text == "":
+        return 0
+    v = _scalar(text)
+    return v if isinstance(v, (int, float)) else text
+
+def _compile_columns(columns) -> Tuple[Tuple[str, str, bool], ...]:
+    return tuple((field, col.rstrip("?"), col.endswith("?")) for field, col in columns)
+
+_IDENTITY = _compile_columns(IDENTITY_COLUMNS)
+_CONTEXT = _compile_columns(CONTEXT_COLUMNS)
+
+def _columns(row: Dict[str, str], columns: Tuple[Tuple[str, str, bool], ...]) -> Dict[str, Any]:
+    out = {}
+    for field, col, optional in columns:
+        if col in row:
+            out[field] = row[col]
+        elif not optional:
+            out[field] = ""
+    return out
+
+def encounter_from_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """The encounter (as parse_rcm_documents expects it) rebuilt from a CSV row's flat columns."""
+    identity, context = _columns(row, _IDENTITY), _columns(row, _CONTEXT)
+    context["time_with_patient_min"] = int(_number(context["time_with_patient_min"]))
+    vitals = {
+        "temperature_c": _number(row.get("temperature_c")),
+        "bp_mmHg": f"{row.get('bp_systolic') or 0}/{row.get('bp_diastolic') or 0}",
+        "hr_bpm": _number(row.get("heart_rate")),
+        "spo2_pct": _number(row.get("spo2")),
+        "weight_kg": _number(row.get("weight_kg")),
+        "height_cm": _number(row.get("height_cm")),
+    }
+    meds = [{"name": m} for m in (row.get("medications") or "").split("; ") if m]
+    return {
+        "encounter_id": row["encounter_id"],
+        "identity": identity,
+        "context": context,
+        "structured": {
+            "vitals": vitals,
+            "orders": parse_orders(row.get("orders", "")),
+            "meds": meds,
+            "attachments": [a for a in (row.get("attachments") or "").split("; ") if a],
+        },
+        "note_sentences": split_sentences(row.get("clinical_notes") or ""),
+    }
+
+def iter_csv_encounters(path: str, use_json: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Stream encounters from an encounter CSV (plain, .gz, .bz2 or .xz). Rows with an
+    `original_json` cell use it unless `use_json` is False; other rows are rebuilt from
+    their flat columns.
+    """
+    with open_text(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if use_json and row.get("original_json"):
+                yield json_codec.loads(row["original_json"])
+            else:
+                yield encounter_from_row(row)
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Print the encounters of an encounter CSV as JSONL.")
+    ap.add_argument("csv")
+    ap.add_argument("--no-json", action="store_true", help="rebuild every row from its flat columns")
+    args = ap.parse_args()
+    for enc in iter_csv_encounters(args.csv, use_json=not args.no_json):
+        print(json.dumps(enc, ensure_ascii=False))
@@ -0,0 +1,262 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from compressed_io import open_text
+import json_codec
+from csv_encounters import encounter_from_row
+
+SCHEMA_VERSION = 3
+
+# Bytes of the database file SQLite may memory-map (pages are mapped on demand)
+MMAP_SIZE = int(os.environ.get("RCM_STORE_MMAP_BYTES", str(1 << 30)))
+
+# Seconds between checks of the CSV's size and mtime by a running store (0 = every call)
+CHECK_SECONDS = float(os.environ.get("RCM_STORE_CHECK_SECONDS", "2"))
+
+# CSV columns matched by the free-text filter
+SEARCH_COLUMNS = ("patient_name", "reason_for_visit", "clinical_notes", "orders", "medications")
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE encounters (
+    seq INTEGER PRIMARY KEY,          -- CSV order
+    encounter_id TEXT NOT NULL UNIQUE,
+    member_id TEXT,
+    insurance_plan TEXT,
+    visit_date TEXT,                  -- 'YYYY-MM-DD HH:MM', sorts chronologically
+    visit_type TEXT,
+    search_text TEXT,                 -- lowercased name, reason, notes, orders, medications
+    row_json TEXT NOT NULL,           -- CSV row without original_json
+    encounter_json TEXT               -- original_json (or the encounter rebuilt from the row), as processed
+);
+CREATE INDEX ix_encounters_member ON encounters(member_id);
+CREATE INDEX ix_encounters_plan ON encounters(insurance_plan, visit_date);
+CREATE INDEX ix_encounters_date ON encounters(visit_date);
+"""
+
+class EncounterStore:
+    """
+    SQLite index over patient_encounters.csv.
+
+    The database file is the app's binary snapshot: opening it reads no rows, and
+    SQLite memory-maps its pages on demand, so start-up cost does not depend on
+    the dataset size. Prebuild it with `python encounter_store.py` after a data load.
+
+    Lookups by encounter_id, member_id, insurance_plan and visit date go through
+    B-tree indexes, and listings are streamed from the database, so the app
+    never holds the dataset in memory. The database is rebuilt (into a temp file,
+    then swapped in) whenever the CSV's size or mtime changes; a running store
+    stats the CSV at most every CHECK_SECONDS, on its next lookup.
+    """
+
+    def __init__(self, csv_path: str, db_path: Optional[str] = None):
+        self.csv_path = Path(csv_path)
+        self.db_path = Path(db_path) if db_path else self.csv_path.with_suffix(".sqlite")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.ensure_fresh()
+        self._checked = time.monotonic()
+
+    # -- building ---------------------------------------------------------
+
+    def _signature(self) -> str:
+        st = self.csv_path.stat()
+        return f"{SCHEMA_VERSION}:{st.st_size}:{st.st_mtime_ns}"
+
+    def _stored_signature(self) -> Optional[str]:
+        try:
+            row = self._conn().execute("SELECT value FROM meta WHERE key='signature'").fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def ensure_fresh(self) -> bool:
+        """Rebuild the index if the CSV changed since it was built. Returns True if rebuilt."""
+        sig = self._signature()
+        if self.db_path.exists() and self._stored_signature() == sig:
+            return False
+        with self._lock:
+            self._local = threading.local()  # another process may have swapped in a rebuilt file
+            if self.db_path.exists() and self._stored_signature() == sig:
+                return False
+            self._build(sig)
+        return True
+
+    def _refresh(self) -> None:
+        """ensure_fresh, at most every CHECK_SECONDS (a stat of the CSV when it is unchanged)."""
+        now = time.monotonic()
+        if now - self._checked < CHECK_SECONDS:
+            return
+        self._checked = now
+        try:
+            self.ensure_fresh()
+        except OSError as e:  # CSV missing or mid-copy: keep serving the current snapshot
+            print(f"Encounter store refresh skipped: {e}")
+
+    def _build(self, signature: str) -> None:
+        tmp = self.db_path.with_name(f"{self.db_path.name}.{os.getpid()}.tmp")
+        tmp.unlink(missing_ok=True)
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.executescript(_SCHEMA)
+            with open_text(self.csv_path, newline="") as f:
+                rows = (
+                    (
+                        row["encounter_id"], row.get("member_id"), row.get("insurance_plan"),
+                        row.get("visit_date"), row.get("visit_type"),
+                        " ".join(row.get(c) or "" for c in SEARCH_COLUMNS).lower(),
+                        json_codec.dumps({k: v for k, v in row.items() if k != "original_json"}),
+                        # Exports without original_json are rebuilt from their flat columns once, here
+                        row.get("original_json") or json_codec.dumps(encounter_from_row(row)),
+                    )
+                    for row in csv.DictReader(f)
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO encounters (encounter_id, member_id, insurance_plan, visit_date, visit_type, search_text, row_json, encounter_json)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT INTO meta VALUES ('signature', ?)", (signature,))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, self.db_path)
+        self._local = threading.local()  # reconnect to the new file
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return conn
+
+    # -- queries ----------------------------------------------------------
+
+    def count(self) -> int:
+        self._refresh()
+        return self._conn().execute("SELECT COUNT(*) FROM encounters").fetchone()[0]
+
+    def get(self, encounter_id: str) -> Optional[Dict[str, Any]]:
+        """The encounter JSON (as stored in original_json), or None."""
+        self._refresh()
+        row = self._conn().execute(
+            "SELECT encounter_json FROM encounters WHERE encounter_id = ?", (encounter_id,)).fetchone()
+        return json_codec.loads(row[0]) if row and row[0] else None
+
+    def get_raw(self, encounter_id: str) -> Optional[str]:
+        """The stored encounter JSON text, undecoded (for responses that send it as is), or None."""
+        self._refresh()
+        row = self._conn().execute(
+            "SELECT encounter_json FROM encounters WHERE encounter_id = ?", (encounter_id,)).fetchone()
+        return row[0] if row and row[0] else None
+
+    def get_row(self, encounter_id: str) -> Optional[Dict[str, Any]]:
+        """The flat CSV row (without original_json), or None."""
+        self._refresh()
+        row = self._conn().execute(
+            "SELECT row_json FROM encounters WHERE encounter_id = ?", (encounter_id,)).fetchone()
+        return json_codec.loads(row[0]) if row else None
+
+    def signature(self) -> str:
+        """Identifies the current snapshot; changes whenever the data is rebuilt."""
+        self._refresh()
+        return self._stored_signature() or ""
+
+    def query(
+        self,
+        member_id: Optional[str] = None,
+        insurance_plan: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        visit_type: Optional[str] = None,
+        limit: Optional[int] = None,
+        columns: str = "row_json",
+        text: Optional[str] = None,
+        after: Optional[int] = None,
+        raw: bool = False,
+    ) -> Iterator[Any]:
+        """
+        Stream matching encounters in CSV order. Both date bounds are inclusive
+        prefixes: date_to='2025-09-04' includes that day's visits. `text` is a
+        case-insensitive substring of the name, reason, notes, orders or medications.
+        `columns` is 'row_json' or 'encounter_json'. With `raw`, values are
+        (encounter_id, stored JSON text) pairs, not decoded.
+        """
+        for _, value in self._select(columns, member_id, insurance_plan, date_from, date_to,
+                                     visit_type, text, after, limit, raw):
+            yield value
+
+    def page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+        columns: str = "row_json",
+        raw: bool = False,
+        **filters: Optional[str],
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        One page of `query` results and the cursor of the next page (None on the
+        last page). The cursor is the position after the page's last row, so each
+        page is an index seek and costs the same however deep it is. `fields`
+        keeps only those keys of each record; `raw` is as for `query` (no `fields`).
+        """
+        try:
+            after = int(cursor) if cursor else None
+        except ValueError:
+            raise ValueError(f"Invalid cursor '{cursor}'") from None
+        rows = list(self._select(columns, after=after, limit=limit + 1, raw=raw, **filters))
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        records = [value for _, value in rows[:limit]]
+        if fields:
+            records = [{k: r[k] for k in fields if k in r} for r in records]
+        return records, next_cursor
+
+    def _select(self, columns, member_id=None, insurance_plan=None, date_from=None, date_to=None,
+                visit_type=None, text=None, after=None, limit=None, raw=False) -> Iterator[Tuple[int, Any]]:
+        if columns not in ("row_json", "encounter_json"):
+            raise ValueError(f"Unknown column '{columns}'")
+        self._refresh()
+        where, args = self._filters(member_id, insurance_plan, date_from, date_to, visit_type, text, after)
+        sql = f"SELECT seq, {columns}, encounter_id FROM encounters{where} ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        for seq, value, encounter_id in self._conn().execute(sql, args):
+            yield seq, (encounter_id, value) if raw else json_codec.loads(value)
+
+    @staticmethod
+    def _filters(member_id, insurance_plan, date_from, date_to, visit_type, text=None, after=None):
+        clauses: List[str] = []
+        args: List[Any] = []
+        for col, op, val in (
+            ("member_id", "=", member_id),
+            ("insurance_plan", "=", insurance_plan),
+            ("visit_date", ">=", date_from),
+            ("visit_date", "<=", date_to + "\uffff" if date_to else None),
+            ("visit_type", "=", visit_type),
+            ("seq", ">", after),
+        ):
+            if val is not None:
+                clauses.append(f"{col} {op} ?")
+                args.append(val)
+        if text:
+            escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("search_text LIKE ? ESCAPE '\\'")
+            args.append(f"%{escaped}%")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description="Build (or refresh) the SQLite snapshot of an encounter CSV.")
+    ap.add_argument("csv", nargs="?", default="data/patient_encounters.csv")
+    ap.add_argument("--db", help="database path (default: next to the CSV, .sqlite)")
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    store = EncounterStore(args.csv, args.db)
+    print(f"{store.db_path}: {store.count()} encounters ({time.perf_counter() - t0:.2f}s)")
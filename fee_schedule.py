@@ -0,0 +1,238 @@
+"""
+Multi-payer, effective-dated fee schedule.
+
+Rows are (plan, code, effective_from, effective_to, price); dates are inclusive
+'YYYY-MM-DD' strings and either end may be open (''). Codes a plan has no
+current row for fall back to the rule pack's base prices, then to its default.
+
+    python fee_schedule.py "Desert Care Gold" IMG_BRAIN_MRI_WO 2026-02-01
+    python fee_schedule.py --reprice data/rcm_parsed_output.jsonl data/repriced_output.jsonl
+"""
+import csv
+import sys
+from bisect import bisect_right
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from compressed_io import open_text
+
+OPEN_START = ""
+OPEN_END = "9999-12-31"
+
+_NO_ROWS: Dict[str, Any] = {}
+
+# A (plan, code) entry: a bare price when one undated row applies, else (starts, ends, prices)
+Entry = Any
+
+def _segments(rows: List[Tuple[str, str, Any]]) -> List[Tuple[str, str, Any]]:
+    """
+    Flatten possibly overlapping (start, end, price) rows into disjoint, sorted segments.
+    Where rows overlap, the one that starts later wins (a new contract supersedes the old).
+    """
+    rows = sorted(rows, key=lambda r: r[0])
+    points = sorted({r[0] for r in rows} | {_next_day(r[1]) for r in rows if r[1] != OPEN_END})
+    segs: List[Tuple[str, str, Any]] = []
+    for i, start in enumerate(points):
+        end = _prev_day(points[i + 1]) if i + 1 < len(points) else OPEN_END
+        live = [r for r in rows if r[0] <= start and r[1] >= start]
+        if not live:
+            continue
+        price = live[-1][2]
+        if segs and segs[-1][2] == price and _next_day(segs[-1][1]) == start:
+            segs[-1] = (segs[-1][0], end, price)
+        else:
+            segs.append((start, end, price))
+    return segs
+
+def _next_day(day: str) -> str:
+    return date.fromordinal(date.fromisoformat(day).toordinal() + 1).isoformat()
+
+def _prev_day(day: str) -> str:
+    return date.fromordinal(date.fromisoformat(day).toordinal() - 1).isoformat() if day else OPEN_START
+
+class FeeSchedule:
+    """
+    Prices indexed by plan, then code: a lookup is two dict probes plus, for codes
+    with dated rows, a binary search over that code's segments. Lookups for plans
+    or codes without rows cost the same as the old flat price table.
+    """
+
+    def __init__(self, base: Dict[str, Any], default_price: Any = 50,
+                 rows: Iterable[Tuple[str, str, str, str, Any]] = ()):
+        self.base = base
+        self.default_price = default_price
+        grouped: Dict[Tuple[str, str], List[Tuple[str, str, Any]]] = {}
+        n = 0
+        for plan, code, start, end, price in rows:
+            start, end = start or OPEN_START, end or OPEN_END
+            if end < start:
+                raise ValueError(f"Fee schedule row {plan}/{code}: effective_to {end} is before effective_from {start}")
+            grouped.setdefault((sys.intern(plan), sys.intern(code)), []).append((start, end, price))
+            n += 1
+        self.rows = n
+        self._plans: Dict[str, Dict[str, Entry]] = {}
+        for (plan, code), segs in grouped.items():
+            segs = _segments(segs)
+            if len(segs) == 1 and segs[0][0] == OPEN_START and segs[0][1] == OPEN_END:
+                entry: Entry = segs[0][2]
+            else:
+                entry = tuple(list(col) for col in zip(*segs))
+            self._plans.setdefault(plan, {})[code] = entry
+
+    @classmethod
+    def from_csv(cls, path: str, base: Dict[str, Any], default_price: Any = 50) -> "FeeSchedule":
+        """Columns: plan, code, effective_from, effective_to, price."""
+        with open_text(path, newline="") as f:
+            rows = [
+                (r["plan"], r["code"], r.get("effective_from") or "", r.get("effective_to") or "", _number(float(r["price"])))
+                for r in csv.DictReader(f)
+            ]
+        return cls(base, default_price, rows)
+
+    def for_plan(self, plan: Optional[str]) -> Dict[str, Entry]:
+        """The codes `plan` has rows for (empty if none): callers pricing many lines for one
+        plan can skip `price` for every other code and read `base` directly."""
+        return self._plans.get(plan, _NO_ROWS)
+
+    def price(self, plan: Optional[str], code: str, day: Optional[str]) -> Any:
+        """Price of `code` for `plan` on `day` ('YYYY-MM-DD', longer timestamps are cut)."""
+        by_code = self._plans.get(plan)
+        if by_code is not None:
+            entry = by_code.get(code)
+            if entry is not None:
+                if type(entry) is not tuple:
+                    return entry
+                if day:
+                    starts, ends, prices = entry
+                    i = bisect_right(starts, day[:10]) - 1
+                    if i >= 0 and day[:10] <= ends[i]:
+                        return prices[i]
+        return self.base.get(code, self.default_price)
+
+    def price_many(self, plans: Sequence[Optional[str]], codes: Sequence[str], days: Sequence[Optional[str]]):
+        """
+        Vectorized `price` over parallel sequences; returns a float64 array.
+        All dated segments are laid out in one sorted array keyed by (plan/code id, day),
+        so the whole batch is a single searchsorted.
+        """
+        import numpy as np  # only batch repricing needs it
+
+        keys, seg_starts, seg_ends, seg_prices = self._flat_index()
+        n = len(codes)
+        # One dict probe per line: (fallback price, dated key id or -1) per distinct plan/code
+        resolved: Dict[Tuple[Optional[str], str], int] = {}
+        table: List[Tuple[float, int]] = []
+        for pc in zip(plans, codes):
+            if pc not in resolved:
+                entry = self._plans.get(pc[0], {}).get(pc[1])
+                base = self.base.get(pc[1], self.default_price)
+                if entry is None:
+                    row = (base, -1)
+                elif type(entry) is tuple:
+                    row = (base, keys[pc])
+                else:
+                    row = (entry, -1)
+                resolved[pc] = len(table)
+                table.append(row)
+        which = np.fromiter(map(resolved.__getitem__, zip(plans, codes)), dtype=np.int64, count=n)
+        prices, key_ids = (np.array(col) for col in zip(*table)) if table else (np.zeros(0), np.zeros(0, dtype=np.int64))
+        fallback = prices.astype(np.float64)[which]
+        ids = key_ids.astype(np.int64)[which]
+
+        dated = np.flatnonzero(ids >= 0)
+        if len(dated):
+            seen: Dict[Optional[str], int] = {}  # service dates repeat a lot within a batch
+            for d in set(days[j] for j in dated.tolist()):
+                seen[d] = _ordinal(d)
+            day = np.fromiter((seen[days[j]] for j in dated.tolist()), dtype=np.int64, count=len(dated))
+            known = day >= 0
+            dated, day = dated[known], day[known]
+            q = ids[dated] * _SPAN + day
+            i = np.searchsorted(seg_starts, q, side="right") - 1
+            ok = (i >= 0) & (q <= seg_ends[np.maximum(i, 0)])
+            fallback[dated[ok]] = seg_prices[i[ok]]
+        return fallback
+
+    def _flat_index(self):
+        flat = getattr(self, "_flat", None)
+        if flat is None:
+            import numpy as np
+
+            keys: Dict[Tuple[str, str], int] = {}
+            starts: List[int] = []
+            ends: List[int] = []
+            prices: List[float] = []
+            for plan, by_code in self._plans.items():
+                for code, entry in by_code.items():
+                    if type(entry) is not tuple:
+                        continue
+                    k = keys[(plan, code)] = len(keys)
+                    for s, e, p in zip(*entry):
+                        starts.append(k * _SPAN + (_ordinal(s) if s else 0))
+                        ends.append(k * _SPAN + _ordinal(e))
+                        prices.append(p)
+            flat = self._flat = (keys, np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64),
+                                 np.asarray(prices, dtype=np.float64))
+        return flat
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_flat", None)  # rebuilt on first use
+        return state
+
+_SPAN = 1 << 22  # > date(9999, 12, 31).toordinal()
+
+def _ordinal(day: Optional[str]) -> int:
+    return date.fromisoformat(day[:10]).toordinal() if day else -1
+
+def _number(v: float) -> Any:
+    """Whole prices stay ints, as in the rule pack's price table."""
+    return int(v) if v.is_integer() else v
+
+def reprice(results: List[Dict[str, Any]], schedule: FeeSchedule) -> int:
+    """Re-price the charge lines of processed results in place, in one vectorized pass. Returns lines priced."""
+    lines = [(r, c) for r in results for c in (r.get("charges") or [])]
+    if not lines:
+        return 0
+    prices = schedule.price_many(
+        [r.get("identity", {}).get("insurance_plan") for r, _ in lines],
+        [c["code"] for _, c in lines],
+        [r.get("context", {}).get("date_time") for r, _ in lines],
+    )
+    for (_, c), p in zip(lines, prices.tolist()):
+        p = _number(p)
+        c["unit_price"], c["total"] = p, p * c["units"]
+    return len(lines)
+
+if __name__ == "__main__":
+    import argparse
+    import json_codec
+    from parse_rcm_documents import active_rules, iter_jsonl, record_json
+
+    ap = argparse.ArgumentParser(description="Look up fee-schedule prices, or re-price a processed JSONL.")
+    ap.add_argument("lookup", nargs="*", metavar="PLAN CODE DATE")
+    ap.add_argument("--schedule", help="fee schedule CSV (default: the active rule pack's)")
+    ap.add_argument("--reprice", nargs=2, metavar=("IN", "OUT"), help="re-price the charges of a full-profile output")
+    ap.add_argument("--batch-size", type=int, default=50000)
+    args = ap.parse_args()
+
+    rules = active_rules()
+    schedule = FeeSchedule.from_csv(args.schedule, rules.prices, rules.default_price) if args.schedule else rules.fees
+    if args.reprice:
+        src, dst = args.reprice
+        total = 0
+        with open_text(dst, "w") as out:  # compressed if dst ends in .gz, .bz2 or .xz
+            batch: List[Dict[str, Any]] = []
+            for rec in iter_jsonl(src):
+                batch.append(rec)
+                if len(batch) >= args.batch_size:
+                    total += reprice(batch, schedule)
+                    out.writelines(json_codec.dumps(r, record_json) + "\n" for r in batch)
+                    batch = []
+            total += reprice(batch, schedule)
+            out.writelines(json_codec.dumps(r, record_json) + "\n" for r in batch)
+        print(f"Re-priced {total} charge lines -> {dst}")
+    elif len(args.lookup) == 3:
+        print(schedule.price(*args.lookup))
+    else:
+        print(f"{schedule.rows} dated/plan rows, {len(schedule.base)} base prices, default {schedule.default_price}")
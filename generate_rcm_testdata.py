@@ -1,9 +1,16 @@
-import json
+import argparse
 import csv
+import random
+import re
 from dataclasses import dataclass, asdict
-from typing import Dict, Any, List
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Iterator, Optional
 from pathlib import Path
 
+from compressed_io import COMPRESSIONS, compressed_name, open_text
+import json_codec
+from csv_encounters import EXTRA_COLUMNS, format_orders
+
 @dataclass
 class Identity:
     name: str
@@ -455,8 +462,135 @@ def make_encounters() -> List[Encounter]:
 
     return encs
 
-def encounters_to_csv(encounters: List[Encounter]) -> List[Dict[str, Any]]:
-    """Convert encounters to flattened CSV-friendly format."""
+def encounter_to_dict(enc: Encounter) -> Dict[str, Any]:
+    """JSON-ready dict in the shape parse_rcm_documents expects."""
+    return {
+        "encounter_id": enc.encounter_id,
+        "identity": asdict(enc.identity),
+        "context": asdict(enc.context),
+        "structured": asdict(enc.structured),
+        "note_sentences": enc.note_sentences,
+    }
+
+# ---------------------------
+# Synthetic encounters at volume (load testing)
+# ---------------------------
+
+FIRST_NAMES = ["Amal", "Muhammad", "Sara", "Faisal", "Leila", "Omar", "Hanan", "Noura", "Karim", "Aisha",
+               "Yousef", "Mariam", "Khalid", "Fatima", "Hassan", "Layla", "Tariq", "Huda", "Sami", "Rania"]
+LAST_NAMES = ["Rahman", "Al-Harthy", "Al Naimi", "Khan", "Haddad", "Saleh", "Yusuf", "Al-Maktoum", "Al-Saud",
+              "Nasser", "Mansour", "Al-Farsi", "Darwish", "Aziz", "Bakr", "Qasim", "Hamdan", "Zayed"]
+FILLER_SENTENCES = [
+    "The patient denies recent travel.",
+    "Medication allergies were reviewed and none are known.",
+    "Social history was reviewed and is unchanged.",
+    "Vital signs were reviewed with the patient.",
+    "Family history is noncontributory.",
+    "The patient was counseled on the expected course of symptoms.",
+    "Questions were answered and the patient agrees with the plan.",
+    "Current medicines were reconciled with the pharmacy record.",
+]
+_SENTENCE_PREFIX = re.compile(r"^S\d+\.\s*")
+
+def iter_synthetic_encounters(
+    n: int,
+    seed: int = 0,
+    mix: Optional[Dict[str, float]] = None,
+    new_patient_ratio: float = 0.4,
+    order_rate: float = 0.9,
+    extra_sentences: tuple = (0, 4),
+    start_date: str = "2025-01-01",
+    days: int = 365,
+) -> Iterator[Encounter]:
+    """
+    Yield `n` varied encounters built from the hand-written ones in make_encounters().
+
+    Same arguments and seed -> same encounters. `mix` weights the templates by
+    encounter_id (default: equal); `new_patient_ratio` sets the visit-type mix,
+    `order_rate` the chance each structured order group is kept, and
+    `extra_sentences` the (min, max) filler sentences added to each note.
+    Encounters are produced one at a time, never held as a list.
+    """
+    rng = random.Random(seed)
+    templates = make_encounters()
+    weights = [(mix or {}).get(t.encounter_id, 0 if mix else 1) for t in templates]
+    if not any(weights):
+        raise ValueError(f"mix {mix} matches none of the template encounter ids")
+    plans = sorted({t.identity.insurance_plan for t in templates})
+    base = datetime.strptime(start_date, "%Y-%m-%d")
+
+    for i in range(n):
+        t = rng.choices(templates, weights)[0]
+        dob = datetime(1940, 1, 1) + timedelta(days=rng.randrange(365 * 65))
+        plan = rng.choice(plans)
+        identity = Identity(**{
+            **asdict(t.identity),
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "date_of_birth": dob.strftime("%Y-%m-%d"),
+            "government_id": f"ID-{rng.randrange(10**9):09d}",
+            "insurance_plan": plan,
+            "member_id": f"{''.join(w[0] for w in plan.split()[:2]).upper()}-{rng.randrange(10**6):06d}",
+        })
+        visit = base + timedelta(days=rng.randrange(days), minutes=rng.randrange(8 * 60, 18 * 60))
+        context = Context(**{
+            **asdict(t.context),
+            "date_time": visit.strftime("%Y-%m-%d %H:%M"),
+            "visit_type": "New patient" if rng.random() < new_patient_ratio else "Established patient",
+            "time_with_patient_min": rng.randint(10, 50),
+        })
+        v = t.structured.vitals
+        sys_bp, dia_bp = (int(x) for x in v.get("bp_mmHg", "120/80").split("/"))
+        structured = Structured(
+            vitals={
+                **v,
+                "temperature_c": round(v.get("temperature_c", 36.8) + rng.uniform(-0.4, 0.4), 1),
+                "bp_mmHg": f"{sys_bp + rng.randint(-10, 10)}/{dia_bp + rng.randint(-8, 8)}",
+                "hr_bpm": v.get("hr_bpm", 75) + rng.randint(-8, 8),
+            },
+            orders={k: [dict(o) for o in lst] for k, lst in t.structured.orders.items() if rng.random() < order_rate},
+            meds=[dict(m) for m in t.structured.meds],
+            attachments=list(t.structured.attachments),
+        )
+        body = [_SENTENCE_PREFIX.sub("", s) for s in t.note_sentences]
+        for _ in range(rng.randint(*extra_sentences)):
+            # Fillers go between the history and the assessment/plan
+            body.insert(rng.randint(1, max(1, len(body) - 2)), rng.choice(FILLER_SENTENCES))
+        yield Encounter(
+            encounter_id=f"SYN-{i + 1:08d}",
+            identity=identity,
+            context=context,
+            structured=structured,
+            note_sentences=[f"S{j}. {txt}" for j, txt in enumerate(body, 1)],
+        )
+
+def write_synthetic(n: int, out_dir: str = "data", embed_json: bool = True, compression: Optional[str] = None,
+                    level: Optional[int] = None, **options) -> Dict[str, str]:
+    """
+    Stream `n` synthetic encounters to synthetic_encounters.jsonl and .csv in `out_dir`.
+    `embed_json=False` leaves original_json out of the CSV (about half its size).
+    With `compression` (gzip, bz2 or xz) both files are written compressed.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    jsonl_out = Path(compressed_name(out / "synthetic_encounters.jsonl", compression))
+    csv_out = Path(compressed_name(out / "synthetic_encounters.csv", compression))
+    with open_text(jsonl_out, "w", compression, level) as fj, open_text(csv_out, "w", compression, level, newline="") as fc:
+        writer = None
+        for enc in iter_synthetic_encounters(n, **options):
+            fj.write(json_codec.dumps(encounter_to_dict(enc)) + "\n")
+            row = encounters_to_csv([enc], embed_json)[0]
+            if writer is None:
+                writer = csv.DictWriter(fc, fieldnames=row.keys())
+                writer.writeheader()
+            writer.writerow(row)
+    return {"jsonl": str(jsonl_out), "csv": str(csv_out)}
+
+def encounters_to_csv(encounters: List[Encounter], embed_json: bool = True) -> List[Dict[str, Any]]:
+    """
+    Convert encounters to flattened CSV-friendly format. Without `embed_json` there is no
+    original_json column; order details and the remaining identity/context fields go into
+    flat columns instead, so csv_encounters can rebuild the encounter.
+    """
     csv_data = []
     for enc in encounters:
         # Parse blood pressure
@@ -468,23 +602,8 @@ def encounters_to_csv(encounters: List[Encounter]) -> List[Dict[str, Any]]:
         clinical_notes = " ".join(enc.note_sentences)
         
         # Summarize orders
-        orders_summary = []
-        if enc.structured.orders.get("lab_tests"):
-            lab_names = [test.get("name", "") for test in enc.structured.orders["lab_tests"]]
-            orders_summary.append(f"Labs: {', '.join(lab_names)}")
-        if enc.structured.orders.get("imaging"):
-            img_names = [img.get("name", "") for img in enc.structured.orders["imaging"]]
-            orders_summary.append(f"Imaging: {', '.join(img_names)}")
-        if enc.structured.orders.get("imaging_orders"):
-            img_ord_names = [img.get("name", "") for img in enc.structured.orders["imaging_orders"]]
-            orders_summary.append(f"Imaging Orders: {', '.join(img_ord_names)}")
-        if enc.structured.orders.get("tests"):
-            test_names = [test.get("name", "") for test in enc.structured.orders["tests"]]
-            orders_summary.append(f"Tests: {', '.join(test_names)}")
-        if enc.structured.orders.get("in_clinic_treatments"):
-            treat_names = [treat.get("name", "") for treat in enc.structured.orders["in_clinic_treatments"]]
-            orders_summary.append(f"Treatments: {', '.join(treat_names)}")
-        
+        orders_summary = format_orders(enc.structured.orders, details=not embed_json)
+
         # Summarize medications
         med_summary = []
         for med in enc.structured.meds:
@@ -516,18 +635,16 @@ def encounters_to_csv(encounters: List[Encounter]) -> List[Dict[str, Any]]:
             "weight_kg": enc.structured.vitals.get("weight_kg", 0),
             "height_cm": enc.structured.vitals.get("height_cm", 0),
             "clinical_notes": clinical_notes,
-            "orders": "; ".join(orders_summary),
+            "orders": orders_summary,
             "medications": "; ".join(med_summary),
             "attachments": "; ".join(enc.structured.attachments),
-            # Store original JSON data for processing
-            "original_json": json.dumps({
-                "encounter_id": enc.encounter_id,
-                "identity": asdict(enc.identity),
-                "context": asdict(enc.context),
-                "structured": asdict(enc.structured),
-                "note_sentences": enc.note_sentences,
-            }, ensure_ascii=False)
         }
+        if embed_json:
+            # Store original JSON data for processing
+            csv_row["original_json"] = json_codec.dumps(encounter_to_dict(enc))
+        else:
+            fields = {**asdict(enc.identity), **asdict(enc.context)}
+            csv_row.update((col, fields[col]) for col in EXTRA_COLUMNS)
         csv_data.append(csv_row)
     return csv_data
 
@@ -550,16 +667,34 @@ def main():
     jsonl_out = Path("data/rcm_demo_input.jsonl")
     with jsonl_out.open("w", encoding="utf-8") as f:
         for enc in encounters:
-            f.write(json.dumps({
-                "encounter_id": enc.encounter_id,
-                "identity": asdict(enc.identity),
-                "context": asdict(enc.context),
-                "structured": asdict(enc.structured),
-                "note_sentences": enc.note_sentences,
-            }, ensure_ascii=False) + "\n")
+            f.write(json_codec.dumps(encounter_to_dict(enc)) + "\n")
     
     print(f"CSV: {csv_out}")
     print(f"JSONL: {jsonl_out}")
 
+def _parse_mix(text: str) -> Dict[str, float]:
+    """'ENC-001=3,ENC-006=1' -> {'ENC-001': 3.0, 'ENC-006': 1.0}"""
+    return {k.strip(): float(v) for k, v in (part.split("=") for part in text.split(",") if part.strip())}
+
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Write the demo encounters, or N synthetic ones for load testing.")
+    ap.add_argument("--synthetic", type=int, metavar="N", help="stream N synthetic encounters instead of the demo set")
+    ap.add_argument("--out-dir", default="data")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--mix", type=_parse_mix, help="template weights, e.g. ENC-001=3,ENC-006=1")
+    ap.add_argument("--new-patient-ratio", type=float, default=0.4)
+    ap.add_argument("--order-rate", type=float, default=0.9, help="chance each order group is kept")
+    ap.add_argument("--extra-sentences", type=int, nargs=2, default=(0, 4), metavar=("MIN", "MAX"))
+    ap.add_argument("--no-json", action="store_true", help="write the synthetic CSV without original_json")
+    ap.add_argument("--compress", choices=sorted(COMPRESSIONS), help="write the synthetic files compressed")
+    ap.add_argument("--compress-level", type=int)
+    args = ap.parse_args()
+    if args.synthetic is None:
+        main()
+    else:
+        paths = write_synthetic(args.synthetic, args.out_dir, embed_json=not args.no_json, compression=args.compress,
+                                level=args.compress_level, seed=args.seed, mix=args.mix,
+                                new_patient_ratio=args.new_patient_ratio, order_rate=args.order_rate,
+                                extra_sentences=tuple(args.extra_sentences))
+        print(f"CSV: {paths['csv']}")
+        print(f"JSONL: {paths['jsonl']}")
@@ -0,0 +1,167 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+class QueueFull(Exception):
+    """The queue cannot take the submitted encounters right now."""
+
+class Job:
+    def __init__(self, items: List[Tuple[Optional[Dict[str, Any]], Optional[str]]],
+                 process: Callable[[int, Dict[str, Any]], Dict[str, Any]],
+                 fail: Callable[[int, str], Dict[str, Any]]):
+        self.id = uuid.uuid4().hex
+        self.total = len(items)
+        self.completed = 0
+        self.errors = 0
+        self.results: List[Optional[Dict[str, Any]]] = [None] * self.total
+        self.cancelled = False
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.process = process
+        self.fail = fail
+
+    @property
+    def status(self) -> str:
+        if self.cancelled:
+            return "cancelled"
+        if self.finished is not None:
+            return "done"
+        return "running" if self.started is not None else "queued"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "errors": self.errors,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+class JobQueue:
+    """
+    Bounded in-process queue of encounters, drained by background worker threads.
+
+    Capacity is counted in encounters, not jobs, and a submission is accepted whole
+    or refused with QueueFull, so memory held by waiting work is bounded however
+    many clients submit at once. Finished jobs keep their results until fetched and
+    deleted, until `retain_sec` has passed, or until more than `max_finished` jobs
+    are finished (oldest go first). Workers start on the first submission.
+    """
+
+    def __init__(self, workers: int = 2, capacity: int = 10000, max_finished: int = 100, retain_sec: float = 3600):
+        self.workers = workers
+        self.capacity = capacity
+        self.max_finished = max_finished
+        self.retain_sec = retain_sec
+        self._items: Deque[Tuple[Job, int, Optional[Dict[str, Any]], Optional[str]]] = deque()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, items: List[Tuple[Optional[Dict[str, Any]], Optional[str]]],
+               process: Callable[[int, Dict[str, Any]], Dict[str, Any]],
+               fail: Callable[[int, str], Dict[str, Any]]) -> Job:
+        """
+        Queue a job of (encounter, None) or (None, error message) items. `process(i, enc)`
+        makes the result of item i and `fail(i, message)` the record of an unusable one.
+        """
+        job = Job(items, process, fail)
+        with self._cond:
+            if len(self._items) + len(items) > self.capacity:
+                raise QueueFull(f"{len(self._items)} encounters queued, capacity {self.capacity}")
+            self._expire()
+            self._jobs[job.id] = job
+            self._items.extend((job, i, enc, err) for i, (enc, err) in enumerate(items))
+            if not items:
+                job.finished = job.started = time.time()
+            self._start_workers()
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Drop a job: its queued encounters are skipped and its results released."""
+        with self._cond:
+            job = self._jobs.pop(job_id, None)
+            if job is not None and job.finished is None:
+                job.cancelled = True
+                self._items = deque(item for item in self._items if item[0] is not job)
+                self._cond.notify_all()
+            return job
+
+    def wait(self, job: Job, seen: Tuple[int, str], timeout: float) -> None:
+        """Block until the job's progress differs from `seen` (completed, status) or timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: (job.completed, job.status) != seen, timeout)
+
+    def watch(self, job: Job, heartbeat: float = 5.0) -> Iterator[Dict[str, Any]]:
+        """Status snapshots as the job progresses, ending with its final state."""
+        seen = None
+        while True:
+            snapshot = (job.completed, job.status)
+            if snapshot != seen:
+                seen = snapshot
+                yield job.to_dict()
+                if job.status in ("done", "cancelled"):
+                    return
+                continue
+            self.wait(job, seen, heartbeat)
+            if (job.completed, job.status) == seen:
+                yield job.to_dict()  # keep idle connections alive
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {"queued_encounters": len(self._items), "capacity": self.capacity,
+                    "workers": len(self._threads), "jobs": by_status}
+
+    # -- internals --------------------------------------------------------
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _expire(self) -> None:
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.finished is not None]
+        excess = len(finished) - self.max_finished
+        for j in finished:
+            if excess > 0 or now - j.finished > self.retain_sec:
+                del self._jobs[j.id]
+                excess -= 1
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._items)
+                job, i, enc, err = self._items.popleft()
+                if job.started is None:
+                    job.started = time.time()
+            try:
+                result = job.process(i, enc) if err is None else job.fail(i, err)
+            except Exception as e:
+                # A crashed worker would leave the job running forever
+                result = job.fail(i, str(e))
+            with self._cond:
+                if job.cancelled:
+                    continue
+                job.results[i] = result
+                job.completed += 1
+                if "error" in result:
+                    job.errors += 1
+                if job.completed == job.total:
+                    job.finished = time.time()
+                self._cond.notify_all()
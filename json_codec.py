@@ -0,0 +1,92 @@
+"""
+The JSON codec used by the pipeline and the API.
+
+orjson is used when it is installed (RCM_JSON_CODEC=stdlib forces the standard library).
+Two output forms:
+
+    dumps(obj, default)   file form: byte for byte what json.dumps(obj, ensure_ascii=False)
+                          writes (", " and ": " separators), so processed outputs, incremental
+                          manifests and existing consumers see unchanged files. Set
+                          RCM_JSON_STYLE=compact to write the wire form instead.
+    dumpb(obj, default)   wire form, as UTF-8 bytes: no whitespace, non-ASCII unescaped.
+                          Either backend writes the same bytes, except that orjson writes
+                          exponent floats without padding (8.3e-6, not 8.3e-06).
+
+With orjson installed, the default speeds up `loads` (every input line and request body)
+and `dumpb` (API responses). `dumps` keeps the stdlib encoder so outputs stay byte-identical,
+and it is the bulk of a batch run's encoding: benchmark_rcm.py times both forms
+(json_file_form / json_wire_form). On the reference machine a full-profile result takes about
+55us in file form and 14us in wire form, against roughly 120us to process it, so
+RCM_JSON_STYLE=compact makes a serial run about a fifth faster.
+
+`loads` accepts str or bytes. Input orjson rejects but the stdlib accepts (NaN, integers
+beyond 64 bits) is retried with the stdlib, so both backends accept the same documents and
+report the stdlib's error message for invalid ones.
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib codec is used instead
+    orjson = None
+
+CODEC = os.environ.get("RCM_JSON_CODEC", "auto")
+if CODEC not in ("auto", "orjson", "stdlib"):
+    raise ValueError(f"RCM_JSON_CODEC must be auto, orjson or stdlib, got {CODEC!r}")
+if CODEC == "orjson" and orjson is None:
+    raise ImportError("RCM_JSON_CODEC=orjson but orjson is not installed")
+BACKEND = "orjson" if orjson is not None and CODEC != "stdlib" else "stdlib"
+
+STYLE = os.environ.get("RCM_JSON_STYLE", "stdlib")
+if STYLE not in ("stdlib", "compact"):
+    raise ValueError(f"RCM_JSON_STYLE must be stdlib or compact, got {STYLE!r}")
+
+Default = Optional[Callable[[Any], Any]]
+
+# json.dumps builds a new encoder per call; these are reused per `default` hook
+_FILE_ENCODERS: Dict[Default, json.JSONEncoder] = {}
+
+def _file_encoder(default: Default) -> json.JSONEncoder:
+    enc = _FILE_ENCODERS.get(default)
+    if enc is None:
+        enc = _FILE_ENCODERS[default] = json.JSONEncoder(ensure_ascii=False, default=default)
+    return enc
+
+def _stdlib_dumpb(obj: Any, default: Default = None, sort_keys: bool = False) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=default).encode("utf-8")
+
+if BACKEND == "orjson":
+    # As with the stdlib: int keys become strings, and dates and dataclasses go to `default`
+    _OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumpb(obj: Any, default: Default = None, sort_keys: bool = False) -> bytes:
+        """Wire form of `obj` as UTF-8 bytes (see module docstring)."""
+        try:
+            return orjson.dumps(obj, default=default, option=(_OPTS | orjson.OPT_SORT_KEYS) if sort_keys else _OPTS)
+        except TypeError:
+            # Integers beyond 64 bits, or a type `default` cannot handle: the stdlib
+            # encodes the first and raises the usual TypeError for the second
+            return _stdlib_dumpb(obj, default, sort_keys)
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+else:
+    dumpb = _stdlib_dumpb
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+def dumps(obj: Any, default: Default = None) -> str:
+    """File form of `obj` (one JSONL line without the newline)."""
+    if STYLE == "compact":
+        return dumpb(obj, default).decode("utf-8")
+    return _file_encoder(default).encode(obj)
+
+def describe() -> Dict[str, str]:
+    """The active backend and file style, for /api/health and benchmark results."""
+    return {"backend": BACKEND, "style": STYLE}
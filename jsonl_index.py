@@ -0,0 +1,258 @@
+"""
+Random access into large JSONL files (encounter inputs or processed outputs).
+
+    python jsonl_index.py data/rcm_demo_input.jsonl                # build/refresh the index
+    python jsonl_index.py data/rcm_parsed_output.jsonl ENC-003     # print one record
+
+The file is memory-mapped and indexed once: encounter_id -> (byte offset, length) of its
+line. The index is saved next to the file (`.<name>.idx`) and reused while the file is
+unchanged; when the file has only grown (appended lines), just the new tail is scanned.
+Fetching a record reads only its own line, and `split_ranges` cuts the file into
+line-aligned byte ranges that worker processes can read independently.
+"""
+import json
+import mmap
+import os
+import pickle
+import re
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import json_codec
+
+INDEX_FORMAT = 1
+
+# First "encounter_id" key on a line; both inputs and results write it as the first key
+_ID_RE = re.compile(rb'"encounter_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    """Read-only map of the whole file (None for an empty file, which cannot be mapped)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def iter_range_lines(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (i, line) for the non-empty lines that start in [start, end) (end=None: to EOF),
+    stripped and undecoded; `i` counts every line from `start`, blank ones included.
+    """
+    mm = _map(path)
+    if mm is None:
+        return
+    with mm:
+        end = len(mm) if end is None else min(end, len(mm))
+        pos, i = start, 0
+        while pos < end:
+            nl = mm.find(b"\n", pos)
+            stop = len(mm) if nl < 0 else nl
+            line = mm[pos:stop].strip()
+            if line:
+                yield i, line
+            pos, i = stop + 1, i + 1
+
+def iter_range(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the records of the lines that start in [start, end) (end=None: to EOF)."""
+    for _, line in iter_range_lines(path, start, end):
+        yield json_codec.loads(line)
+
+def count_lines(path: str, end: int) -> int:
+    """Number of lines that end before byte `end` (so the line at `end` is number count + 1)."""
+    n = 0
+    with open(path, "rb") as f:
+        while end > 0:
+            chunk = f.read(min(end, 1 << 20))
+            if not chunk:
+                break
+            n += chunk.count(b"\n")
+            end -= len(chunk)
+    return n
+
+def split_ranges(path: str, target_bytes: int = 4 << 20) -> List[Tuple[int, int]]:
+    """Cut the file into consecutive byte ranges of about `target_bytes`, each ending on a newline."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    mm = _map(path)
+    ranges = []
+    with mm:
+        start = 0
+        while start < size:
+            nl = mm.find(b"\n", min(start + target_bytes, size) - 1)
+            end = size if nl < 0 else nl + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+class JsonlIndex:
+    """
+    encounter_id -> line index over a JSONL file.
+
+    Lines without an encounter_id are skipped; if an id repeats, the last line wins
+    (matching how run_incremental treats duplicates).
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        self.path = Path(path)
+        self.index_path = Path(index_path) if index_path else self.path.with_name(f".{self.path.name}.idx")
+        self._lock = threading.Lock()
+        self._mm: Optional[mmap.mmap] = None
+        self.ids: List[str] = []
+        self.offsets = array("q")
+        self.lengths = array("q")
+        self._pos: Dict[str, int] = {}
+        self._scanned = 0       # bytes of the file covered by the index
+        self._signature = None  # (size, mtime_ns) when the index was last brought up to date
+        self.refresh()
+
+    # -- building ---------------------------------------------------------
+
+    def refresh(self) -> bool:
+        """Bring the index up to date with the file. Returns True if it changed."""
+        with self._lock:
+            st = self.path.stat()
+            sig = (st.st_size, st.st_mtime_ns)
+            if sig == self._signature:
+                return False
+            if self._signature is None:
+                self._load_saved()
+            if self._signature != sig and not (self._signature and st.st_size > self._signature[0] and self._is_prefix()):
+                # Rewritten (or never indexed): start over
+                self._reset()
+            before = (len(self.ids), self._scanned)
+            self._remap()
+            self._scan(self._scanned)
+            changed = self._signature is None or (len(self.ids), self._scanned) != before
+            self._signature = sig
+            if changed:
+                self._save()
+            return changed
+
+    def _reset(self) -> None:
+        self.ids, self.offsets, self.lengths, self._pos, self._scanned = [], array("q"), array("q"), {}, 0
+        self._signature = None
+
+    def _is_prefix(self) -> bool:
+        """Whether the indexed bytes are still a prefix of the file (i.e. it was only appended to)."""
+        if self._scanned == 0:
+            return True
+        with open(self.path, "rb") as f:
+            f.seek(self._scanned - 1)
+            if f.read(1) != b"\n":
+                return False
+            if not self.ids:
+                return True
+            # The last indexed line must still be where it was
+            f.seek(self.offsets[-1])
+            line = f.read(self.lengths[-1])
+        m = _ID_RE.search(line)
+        return bool(m) and json.loads(b'"' + m.group(1) + b'"') == self.ids[-1]
+
+    def _remap(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = _map(str(self.path))
+
+    def _scan(self, pos: int) -> None:
+        mm = self._mm
+        if mm is None:
+            self._scanned = 0
+            return
+        size = len(mm)
+        find, search = mm.find, _ID_RE.search
+        while pos < size:
+            nl = find(b"\n", pos)
+            if nl < 0:
+                break  # a line still being written; picked up on the next refresh
+            line = mm[pos:nl]
+            m = search(line)
+            if m:
+                eid = json.loads(b'"' + m.group(1) + b'"')
+            else:
+                rec = json_codec.loads(line) if line.strip() else None
+                eid = rec.get("encounter_id") if isinstance(rec, dict) else None
+            if eid is not None:
+                i = self._pos.get(eid)
+                if i is None:
+                    self._pos[eid] = len(self.ids)
+                    self.ids.append(eid)
+                    self.offsets.append(pos)
+                    self.lengths.append(nl - pos)
+                else:
+                    self.offsets[i], self.lengths[i] = pos, nl - pos
+            pos = nl + 1
+        self._scanned = pos
+
+    def _load_saved(self) -> None:
+        try:
+            with self.index_path.open("rb") as f:
+                saved = pickle.load(f)
+            if saved["format"] != INDEX_FORMAT:
+                return
+        except (OSError, pickle.PickleError, EOFError, KeyError):
+            return
+        self.ids, self.offsets, self.lengths = saved["ids"], saved["offsets"], saved["lengths"]
+        self._scanned = saved["scanned"]
+        self._signature = tuple(saved["signature"])
+        self._pos = {eid: i for i, eid in enumerate(self.ids)}
+
+    def _save(self) -> None:
+        try:
+            tmp = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+            with tmp.open("wb") as f:
+                pickle.dump({"format": INDEX_FORMAT, "ids": self.ids, "offsets": self.offsets,
+                             "lengths": self.lengths, "scanned": self._scanned, "signature": self._signature}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            # A read-only data directory only costs a rescan next time
+            print(f"Could not save index {self.index_path}: {e}")
+
+    # -- lookups ----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, encounter_id: str) -> bool:
+        return encounter_id in self._pos
+
+    def raw(self, encounter_id: str) -> Optional[bytes]:
+        """The record's line as bytes (without the newline), or None."""
+        i = self._pos.get(encounter_id)
+        if i is None:
+            return None
+        start = self.offsets[i]
+        return self._mm[start:start + self.lengths[i]]
+
+    def get(self, encounter_id: str) -> Optional[Dict[str, Any]]:
+        line = self.raw(encounter_id)
+        return json_codec.loads(line) if line is not None else None
+
+    def get_many(self, encounter_ids: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Records for the given ids, in the order asked; unknown ids are skipped."""
+        for eid in encounter_ids:
+            rec = self.get(eid)
+            if rec is not None:
+                yield rec
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description="Build the offset index of a JSONL file, or print records by id.")
+    ap.add_argument("path")
+    ap.add_argument("ids", nargs="*", help="encounter ids to print")
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    index = JsonlIndex(args.path)
+    if args.ids:
+        for rec in index.get_many(args.ids):
+            print(json.dumps(rec, ensure_ascii=False))
+    else:
+        print(f"{index.index_path}: {len(index)} records ({time.perf_counter() - t0:.2f}s)")
@@ -0,0 +1,147 @@
+"""
+Structured order names -> codes, through one precompiled index per order category.
+
+Names are normalized before matching: lowercased, punctuation turned into spaces, and
+synonym phrases rewritten to one canonical token ("x-ray", "radiograph" -> "xray"). An
+entry matches an order by `names` (the whole name, in any word order) or by `words` (phrases
+whose words must all appear in the name, in any order). A name that matches a `names` entry
+maps to that entry alone; otherwise it maps to every `words` entry it matches, in pack order,
+so "MRI head and lumbar spine X-ray" yields both codes. Example rule-pack entry:
+
+    {"item": {"code": "IMG_BRAIN_MRI_WO", "label": "Head MRI without contrast"},
+     "words": ["mri head"], "copy": {"units": 1, "authorization_required": false, "status": null}}
+
+`item` is shared by every fact the entry produces; `copy` fields are read from the order
+(with those defaults) for each encounter.
+"""
+import re
+import sys
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Resolved names kept per index (orders repeat the same few names across encounters)
+MEMO_SIZE = 4096
+
+_PUNCT_RE = re.compile(r"[^0-9a-z]+")
+
+class OrderEntry:
+    __slots__ = ("item", "copy", "terms")
+
+    def __init__(self, item: Dict[str, Any], copy: Dict[str, Any], terms: FrozenSet[str] = frozenset()):
+        self.item = item
+        self.copy = tuple(copy.items())
+        self.terms = terms
+
+    def fields(self, order: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Per-order fields of the fact (None if the entry copies nothing)."""
+        if not self.copy:
+            return None
+        return {k: order.get(k, default) for k, default in self.copy}
+
+class OrderIndex:
+    """
+    category -> (bucket, {normalized word set: entry}, {word: [`words` entries using it]}).
+    `resolve` is a dict hit for a name seen before; a new name costs one normalization,
+    one exact probe and a check of only the `words` entries that share a word with it.
+    A name resolves to a tuple of entries (empty if nothing matches).
+    """
+
+    def __init__(self, categories: Dict[str, Dict[str, Any]], synonyms: Optional[Dict[str, str]] = None):
+        self.synonyms = dict(synonyms or {})
+        phrases = sorted((self._clean(p) for p in self.synonyms), key=len, reverse=True)
+        self._synonyms = {self._clean(p): self._clean(c) for p, c in self.synonyms.items()}
+        self._synonym_re = re.compile(r"(?<!\S)(?:%s)(?!\S)" % "|".join(map(re.escape, phrases))) if phrases else None
+        self.buckets: Dict[str, str] = {}
+        self._names: Dict[str, Dict[FrozenSet[str], OrderEntry]] = {}
+        self._by_word: Dict[str, Dict[str, List[Tuple[int, OrderEntry]]]] = {}
+        self._memo: Dict[str, Dict[str, Tuple[OrderEntry, ...]]] = {}
+        for category, spec in categories.items():
+            self.buckets[category] = spec["bucket"]
+            names = self._names[category] = {}
+            by_word = self._by_word[category] = {}
+            for rank, e in enumerate(spec.get("entries", [])):
+                item = {sys.intern(k): sys.intern(v) if isinstance(v, str) else v for k, v in e["item"].items()}
+                copy = e.get("copy", {})
+                for name in e.get("names", []):
+                    names.setdefault(self.words(name), OrderEntry(item, copy))  # first entry wins
+                for term in e.get("words", []):
+                    entry = OrderEntry(item, copy, self.words(term))
+                    for w in entry.terms:
+                        by_word.setdefault(w, []).append((rank, entry))
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        return " ".join(_PUNCT_RE.sub(" ", text.lower()).split())
+
+    def words(self, name: str) -> FrozenSet[str]:
+        """The normalized word set of an order name."""
+        text = self._clean(name)
+        if self._synonym_re is not None:
+            text = self._synonym_re.sub(lambda m: self._synonyms[m.group(0)], text)
+        return frozenset(text.split())
+
+    def resolve(self, category: str, name: Any) -> Tuple[OrderEntry, ...]:
+        """The entries an order name maps to in `category`."""
+        memo = self._memo.get(category)
+        if memo is None:
+            memo = self._memo[category] = {}
+        return self._resolve(memo, category, name)
+
+    def _resolve(self, memo: Dict[str, Tuple[OrderEntry, ...]], category: str, name: Any) -> Tuple[OrderEntry, ...]:
+        try:
+            return memo[name]
+        except (KeyError, TypeError):
+            pass
+        name = name if isinstance(name, str) else str(name)
+        entries = self._lookup(category, name)
+        if len(memo) >= MEMO_SIZE:
+            memo.clear()
+        memo[name] = entries
+        return entries
+
+    def _lookup(self, category: str, name: str) -> Tuple[OrderEntry, ...]:
+        words = self.words(name)
+        entry = self._names.get(category, {}).get(words)
+        if entry is not None:
+            return (entry,)
+        by_word = self._by_word.get(category, {})
+        matched: Dict[int, OrderEntry] = {}  # rank -> first matching phrase of that pack entry
+        for w in words:
+            for rank, cand in by_word.get(w, ()):
+                if rank not in matched and cand.terms <= words:
+                    matched[rank] = cand
+        return tuple(matched[rank] for rank in sorted(matched))
+
+    def orders(self, orders: Dict[str, Any]) -> Iterable[Tuple[str, OrderEntry, Dict[str, Any]]]:
+        """(bucket, entry, order) for each order in a structured `orders` block that maps to a code."""
+        for category, bucket in self.buckets.items():
+            category_orders = orders.get(category)
+            if not category_orders:
+                continue
+            memo = self._memo.get(category)
+            if memo is None:
+                memo = self._memo[category] = {}
+            for order in category_orders:
+                name = order.get("name", "")
+                entries = memo.get(name) if type(name) is str else None
+                if entries is None:
+                    entries = self._resolve(memo, category, name)
+                for entry in entries:
+                    yield bucket, entry, order
+
+    @classmethod
+    def from_rule_pack(cls, d: Dict[str, Any]) -> "OrderIndex":
+        """Index for a rule-pack dict: its `order_map`, with `lab_map` names as lab_tests entries."""
+        order_map = d.get("order_map", {})
+        categories = {c: dict(spec) for c, spec in order_map.get("categories", {}).items()}
+        lab_entries = [{"item": meta, "names": [name], "copy": {"units": 1}} for name, meta in d.get("lab_map", {}).items()]
+        if lab_entries:
+            if "lab_tests" not in categories:
+                categories = {"lab_tests": {"bucket": "tests"}, **categories}
+            labs = categories["lab_tests"]
+            labs["entries"] = lab_entries + list(labs.get("entries", []))
+        return cls(categories, order_map.get("synonyms"))
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_memo"] = {}
+        return state
@@ -1,37 +1,303 @@
+import argparse
+import hashlib
 import json
+import os
+import pickle
 import re
-from typing import List, Dict, Any, Tuple
+import sys
+import threading
+from collections import deque
+from functools import lru_cache
+from itertools import chain, islice
+from typing import List, Dict, Any, Tuple, Optional, Set, FrozenSet, Iterable, Iterator, Deque, NamedTuple, Union
 from pathlib import Path
+from time import perf_counter
+
+from pipeline_metrics import METRICS, PipelineMetrics
+from fee_schedule import FeeSchedule
+from policy_engine import PolicyEngine
+from order_index import OrderIndex
+from jsonl_index import JsonlIndex, count_lines, iter_range_lines, split_ranges
+from csv_encounters import iter_csv_encounters
+from compressed_io import COMPRESSIONS, compressed_name, compression_of, open_text, plain_name
+import json_codec
+from rcm_results import (  # re-exported: callers import these from here
+    OUTPUT_PROFILES, SUMMARY_HEADERS, ChargeLine, Evidence, Fact, encode_result, record_json, shape_result, summary_row,
+)
+
+try:
+    from re import _parser as _sre_parse, _constants as _sre  # Python 3.11+
+except ImportError:
+    import sre_parse as _sre_parse, sre_constants as _sre
 
 # ---------------------------
 # 1) Input
 # ---------------------------
 
-def load_jsonl(path: str) -> List[Dict[str, Any]]:
-    items = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
+class RawLine(NamedTuple):
+    """An unparsed input line: process_encounter_safe parses it, so invalid JSON fails only its own record."""
+    line: int                   # 1-based line number in the input file
+    text: Union[str, bytes]
+
+def iter_lines(path: str) -> Iterator[RawLine]:
+    """The non-empty lines of a JSONL file, stripped and unparsed (gzip/bz2/xz too)."""
+    with open_text(path) as f:
+        for n, line in enumerate(f, 1):
             line = line.strip()
-            if not line:
-                continue
-            items.append(json.loads(line))
-    return items
+            if line:
+                yield RawLine(n, line)
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield one record per non-empty line without holding the file in memory (gzip/bz2/xz too)."""
+    for raw in iter_lines(path):
+        yield json_codec.loads(raw.text)
+
+def load_jsonl(path: str) -> List[Dict[str, Any]]:
+    return list(iter_jsonl(path))
+
+def _is_csv(path: str) -> bool:
+    return plain_name(path).lower().endswith(".csv")
+
+def iter_encounters(path: str, use_json: bool = True) -> Iterator[Dict[str, Any]]:
+    """Encounters from a JSONL file or, for a .csv path, an encounter CSV (see csv_encounters)."""
+    if _is_csv(path):
+        return iter_csv_encounters(path, use_json)
+    return iter_jsonl(path)
+
+def iter_records(path: str, use_json: bool = True) -> Iterator[Union[Dict[str, Any], RawLine]]:
+    """iter_encounters for the pipeline: JSONL lines are left for the per-record guard to parse."""
+    if _is_csv(path):
+        return iter_csv_encounters(path, use_json)
+    return iter_lines(path)
 
 # ---------------------------
 # 2) Note sentence helper
 # ---------------------------
 
+_SENTENCE_ID = re.compile(r"^(S\\d+)\\.\\s*(.*)$")
+
 def sentence_pairs(note_sentences: List[str]) -> List[Tuple[str, str]]:
     """Return [(sentence_id, text_without_id), ...]."""
     out = []
     for s in note_sentences:
-        m = re.match(r"^(S\\d+)\\.\\s*(.*)$", s.strip())
+        m = _SENTENCE_ID.match(s.strip())
         if m:
             out.append((m.group(1), m.group(2)))
         else:
             out.append(("", s.strip()))
     return out
 
+def _intern_strings(obj: Dict[str, Any]) -> Dict[str, Any]:
+    return {sys.intern(k): sys.intern(v) if isinstance(v, str) else v for k, v in obj.items()}
+
+# ---------------------------
+# 2b) Rule packs (versioned, precompiled, hot-swappable)
+# ---------------------------
+
+def _literal_anchors(sub) -> Optional[List[str]]:
+    """Literal strings at least one of which occurs in every match of `sub` (None if unknown)."""
+    options: List[List[str]] = []
+    run: List[str] = []
+    for op, av in list(sub) + [(None, None)]:
+        if op is _sre.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            options.append(["".join(run)]); run = []
+        if op is _sre.BRANCH:
+            alts = [_literal_anchors(branch) for branch in av[1]]
+            if all(alts):
+                options.append([a for alt in alts for a in alt])
+        elif op is _sre.SUBPATTERN:
+            anchors = _literal_anchors(av[-1])
+            if anchors:
+                options.append(anchors)
+    # Prefer the option whose shortest literal is longest: fewer false candidates.
+    return max(options, key=lambda o: min(map(len, o))) if options else None
+
+class NoteMatcher:
+    """
+    Every note rule of a rule pack compiled into a single matcher, built once.
+
+    One scan of the sentence with a combined alternation of literal anchors
+    (taken from each rule's pattern) yields the candidate rules; only those
+    are confirmed with their own compiled pattern. Rules without a usable
+    anchor are always confirmed. Hits come back in rule order.
+    """
+
+    def __init__(self, rules: Dict[str, List[Tuple[str, Dict[str, Any]]]]):
+        self.rules: List[Tuple[str, Dict[str, Any], "re.Pattern[str]"]] = []
+        by_anchor: Dict[str, Set[int]] = {}
+        always: List[int] = []
+        for bucket, patterns in rules.items():
+            for pat, obj in patterns:
+                idx = len(self.rules)
+                self.rules.append((bucket, obj, re.compile(pat)))
+                anchors = _literal_anchors(_sre_parse.parse(pat))
+                if not anchors:
+                    always.append(idx)
+                    continue
+                for a in anchors:
+                    by_anchor.setdefault(a, set()).add(idx)
+
+        # Longest anchor wins at a given position, so each anchor also carries
+        # the rules of every anchor that is a prefix of it.
+        self._anchor_rules: Dict[str, FrozenSet[int]] = {
+            a: frozenset(i for b, ids in by_anchor.items() if a.startswith(b) for i in ids)
+            for a in by_anchor
+        }
+        self._always = frozenset(always)
+        alternation = "|".join(re.escape(a) for a in sorted(by_anchor, key=len, reverse=True))
+        self._scan = re.compile(f"(?=({alternation}))") if alternation else None
+
+    def match(self, low: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return [(bucket, obj), ...] for every rule matching the lowercased sentence."""
+        cand = set(self._always)
+        if self._scan is not None:
+            anchor_rules = self._anchor_rules
+            for m in self._scan.finditer(low):
+                cand.update(anchor_rules[m.group(1)])
+        hits = []
+        for idx in sorted(cand):
+            bucket, obj, rx = self.rules[idx]
+            if rx.search(low):
+                hits.append((bucket, obj))
+        return hits
+
+DEFAULT_RULES_PATH = os.environ.get("RCM_RULES_PATH", str(Path(__file__).resolve().parent / "rules" / "rcm_rules.json"))
+RULE_CACHE_FORMAT = 4
+
+class RulePack:
+    """
+    Note rules, order (lab) map and prices from one rule-pack file, with its version stamp.
+    `prices` is the base price table; `fees` adds per-plan, effective-dated prices from the
+    pack's optional fee-schedule CSV (`"fee_schedule": "<path relative to the pack>"`).
+    `policy` is the compiled `"policy_rules"` list (see policy_engine) and `orders` the
+    structured order-name index built from `lab_map` and `"order_map"` (see order_index).
+    """
+
+    def __init__(self, version: str, note_rules: Dict[str, List[Tuple[str, Dict[str, Any]]]],
+                 lab_map: Dict[str, Dict[str, Any]], prices: Dict[str, int], default_price: int = 50,
+                 source: str = "", digest: str = "", fees: Optional[FeeSchedule] = None,
+                 dependencies: Tuple[str, ...] = (), policy: Optional[PolicyEngine] = None,
+                 orders: Optional[OrderIndex] = None):
+        self.version = version
+        self.note_rules = note_rules
+        self.note_matcher = NoteMatcher(note_rules)
+        self.lab_map = lab_map
+        self.prices = prices
+        self.default_price = default_price
+        self.fees = fees or FeeSchedule(prices, default_price)
+        self.policy = policy or PolicyEngine()
+        self.orders = orders or OrderIndex.from_rule_pack({"lab_map": lab_map})
+        self.source = source
+        self.digest = digest
+        self.dependencies = dependencies  # other files the pack was built from (part of the digest)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], source: str = "", digest: str = "") -> "RulePack":
+        if not d.get("version"):
+            raise ValueError(f"Rule pack {source or '<dict>'} has no version stamp.")
+        prices = _intern_strings(d.get("prices", {}))
+        default_price = d.get("default_price", 50)
+        schedule = _fee_schedule_path(d, source)
+        return cls(
+            version=str(d["version"]),
+            # Codes and labels are interned: every fact and charge line refers to these strings
+            note_rules={b: [(pat, _intern_strings(obj)) for pat, obj in rules] for b, rules in d.get("note_rules", {}).items()},
+            lab_map={name: _intern_strings(meta) for name, meta in d.get("lab_map", {}).items()},
+            prices=prices,
+            default_price=default_price,
+            source=source,
+            digest=digest,
+            fees=FeeSchedule.from_csv(schedule, prices, default_price) if schedule else None,
+            dependencies=(schedule,) if schedule else (),
+            policy=PolicyEngine(d.get("policy_rules", [])),
+            orders=OrderIndex.from_rule_pack(d),
+        )
+
+def _fee_schedule_path(d: Dict[str, Any], source: str) -> Optional[str]:
+    ref = d.get("fee_schedule")
+    if not ref:
+        return None
+    return str(Path(source).parent / ref) if source else ref
+
+def _rule_cache_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.cache")
+
+def _pack_digest(raw: bytes, dependencies: Iterable[str]) -> str:
+    h = hashlib.sha256(raw)
+    for dep in dependencies:
+        h.update(b"\0")
+        h.update(Path(dep).read_bytes())
+    return h.hexdigest()
+
+def load_rule_pack(path: str = DEFAULT_RULES_PATH) -> RulePack:
+    """
+    Load a rule pack, reusing its compiled cache when the pack bytes (and its fee
+    schedule's) are unchanged. The cache is a pickle next to the pack, keyed by their sha256.
+    Dependencies are taken from the pack as it is now, and a cache written for the pack at
+    another path (e.g. a copied deployment) is rebuilt, so `source` and `dependencies`
+    always name this pack's files.
+    """
+    src = Path(path).resolve()
+    raw = src.read_bytes()
+    d = json.loads(raw)  # cheap next to compiling, and names the fee schedule to check
+    schedule = _fee_schedule_path(d, str(src))
+    dependencies = (schedule,) if schedule else ()
+    digest = _pack_digest(raw, dependencies)
+    cache = _rule_cache_path(src)
+    try:
+        with cache.open("rb") as f:
+            fmt, cached_digest, pack = pickle.load(f)
+        if (fmt == RULE_CACHE_FORMAT and cached_digest == digest and pack.source == str(src)
+                and pack.dependencies == dependencies):
+            return pack
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError):
+        pass
+
+    pack = RulePack.from_dict(d, source=str(src), digest=digest)
+    tmp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            pickle.dump((RULE_CACHE_FORMAT, digest, pack), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError:
+        pass  # read-only deployment: the cache is an optimisation only
+    return pack
+
+_ACTIVE_RULES: Optional[RulePack] = None
+_RULES_LOCK = threading.Lock()
+
+def active_rules() -> RulePack:
+    """The rule pack new work should use (loaded from DEFAULT_RULES_PATH on first use)."""
+    pack = _ACTIVE_RULES
+    if pack is None:
+        with _RULES_LOCK:
+            if _ACTIVE_RULES is None:
+                set_active_rules(load_rule_pack(DEFAULT_RULES_PATH))
+            pack = _ACTIVE_RULES
+    return pack
+
+def set_active_rules(pack: RulePack) -> None:
+    """Swap in a new pack. A single reference assignment: callers holding the old pack keep it."""
+    global _ACTIVE_RULES
+    _ACTIVE_RULES = pack
+
+def reload_rules(path: Optional[str] = None, force: bool = False) -> bool:
+    """
+    Re-read the active pack's file (or `path`) and swap it in if its content changed.
+    Compilation happens before the swap, so in-flight work is never paused.
+    Returns True when a new pack was activated.
+    """
+    current = _ACTIVE_RULES
+    target = path or (current.source if current else DEFAULT_RULES_PATH)
+    pack = load_rule_pack(target)
+    if not force and current is not None and pack.digest == current.digest:
+        return False
+    set_active_rules(pack)
+    return True
+
 # ---------------------------
 # 3) Fact extraction (diagnoses, services, tests, imaging, drugs, treatments, modifiers)
 # ---------------------------
@@ -50,242 +316,107 @@ def map_visit_level(visit_type: str, minutes: int) -> str:
         if minutes < 40: return "LEVEL_4"
         return "LEVEL_5"
 
-def extract_facts(note_sentences: List[str], context: Dict[str, Any]) -> Dict[str, Any]:
+def extract_facts(note_sentences: List[str], context: Dict[str, Any], rules: Optional["RulePack"] = None) -> Dict[str, Any]:
+    matcher = (rules or active_rules()).note_matcher
     sents = sentence_pairs(note_sentences)
     extracted = {
         "diagnoses": [], "services": [], "tests": [], "imaging": [], "treatments": [], "drugs": [], "modifiers": []
     }
 
-    def add(bucket: str, obj: Dict[str, Any], sid: str, span: str):
-        o = dict(obj); o["evidence"] = {"sentence_id": sid, "text": span}
-        extracted[bucket].append(o)
-
-    # Diagnoses (pattern-based demo only)
-    diag_patterns = [
-        (r"pharyngitis|sore throat", "DX_ACUTE_PHARYNGITIS", "Acute pharyngitis"),
-        (r"right knee sprain", "DX_ACUTE_RIGHT_KNEE_SPRAIN", "Acute right knee sprain"),
-        (r"type 2 diabetes.*without complications", "DX_T2DM_NO_COMPLICATIONS", "Type 2 diabetes without complications"),
-        (r"mixed hyperlipidemia", "DX_MIXED_HYPERLIPIDEMIA", "Mixed hyperlipidemia"),
-        (r"high blood pressure|hypertension", "DX_ESSENTIAL_HYPERTENSION", "Essential hypertension"),
-        (r"asthma exacerbation", "DX_ASTHMA_EXACERBATION", "Mild asthma exacerbation"),
-        (r"migraine", "DX_MIGRAINE", "Migraine without warning signs"),
-        (r"urinary tract infection|UTI", "DX_UTI_UNCOMPLICATED", "Uncomplicated urinary tract infection"),
-        (r"allergic contact dermatitis|contact dermatitis", "DX_ALLERGIC_CONTACT_DERMATITIS", "Allergic contact dermatitis"),
-        (r"low back pain.*nerve root|lower back pain.*nerve root", "DX_ACUTE_LOWBACK_WITH_RADIATION", "Acute low back pain with probable radicular symptoms"),
-        (r"early intrauterine pregnancy|early pregnancy", "DX_EARLY_PREGNANCY", "Early intrauterine pregnancy"),
-    ]
-    for sid, txt in sents:
-        low = txt.lower()
-        for pat, code, label in diag_patterns:
-            if re.search(pat, low):
-                add("diagnoses", {"code": code, "label": label}, sid, txt)
-
     # Visit service (time-based)
     level = map_visit_level(context.get("visit_type",""), int(context.get("time_with_patient_min", 0)))
     ev_sid, ev_txt = sents[0] if sents else ("STRUCTURED:context", context.get("reason_for_visit",""))
-    add("services", {
-        "code": f"SVC_VISIT_{'NEW' if context.get('visit_type','').startswith('New') else 'EST'}_{level}",
-        "label": f"Outpatient visit ({context.get('visit_type','')} , {level.replace('_',' ').title()})",
-        "units": 1
-    }, ev_sid, ev_txt)
-
-    # Tests
-    test_patterns = [
-        (r"rapid streptococcal|rapid strep", {"code":"TEST_RAPID_STREP","label":"Rapid streptococcal antigen test","units":1}),
-        (r"electrocardiogram|ecg", {"code":"TEST_ECG","label":"Resting electrocardiogram with interpretation","units":1}),
-        (r"urinalysis", {"code":"TEST_URINALYSIS","label":"Urinalysis with microscopy","units":1}),
-        (r"urine culture", {"code":"TEST_URINE_CULTURE","label":"Urine culture","units":1}),
-        (r"hbA1c|glycated hemoglobin", {"code":"TEST_HBA1C","label":"Glycated hemoglobin","units":1}),
-        (r"fasting lipid", {"code":"TEST_LIPID_PANEL","label":"Fasting lipid profile","units":1}),
-        (r"urine microalbumin", {"code":"TEST_MICROALB","label":"Urine microalbumin","units":1}),
-        (r"prenatal.*panel", {"code":"TEST_PRENATAL_PANEL","label":"Prenatal laboratory panel","units":1}),
-    ]
-    for sid, txt in sents:
-        lw = txt.lower()
-        for pat, obj in test_patterns:
-            if re.search(pat, lw):
-                add("tests", obj, sid, txt)
-
-    # Imaging
-    imaging_patterns = [
-        (r"two[- ]view.*right knee|right knee.*two[- ]view", {"code":"IMG_KNEE_XR_2V_RIGHT","label":"Knee X-ray, right, two views","units":1,"side":"Right","views":2}),
-        (r"magnetic resonance imaging|\\bmri\\b", {"code":"IMG_BRAIN_MRI_WO","label":"Head MRI without contrast","units":1}),
-        (r"ultrasound.*pregnan", {"code":"IMG_OB_EARLY_US","label":"Early pregnancy ultrasound, transabdominal","units":1}),
-        (r"lumbar spine.*radiograph|radiographs.*lumbar spine", {"code":"IMG_LUMBAR_XR_2V","label":"Lumbar spine X-ray, two or three views","units":1}),
-    ]
-    for sid, txt in sents:
-        lw = txt.lower()
-        for pat, obj in imaging_patterns:
-            if re.search(pat, lw):
-                add("imaging", obj, sid, txt)
+    extracted["services"].append(Fact(_visit_service(context.get("visit_type",""), level), Evidence(ev_sid, ev_txt)))
 
-    # Treatments
+    # Diagnoses, tests, imaging, treatments, drugs and laterality in one pass per sentence
+    laterality_found = False
     for sid, txt in sents:
-        if re.search(r"nebulized bronchodilator", txt.lower()):
-            add("treatments", {"code":"TRT_NEBULIZER","label":"Nebulized bronchodilator treatment","units":1}, sid, txt)
-
-    # Drugs (demo)
-    drug_patterns = [
-        (r"paracetamol", {"name":"Paracetamol"}),
-        (r"metformin", {"name":"Metformin"}),
-        (r"atorvastatin", {"name":"Atorvastatin"}),
-        (r"amlodipine", {"name":"Amlodipine"}),
-        (r"triptan", {"name":"Triptan"}),
-        (r"antibiotic", {"name":"Antibiotic (unspecified)"}),
-        (r"prenatal vitamin", {"name":"Prenatal vitamins"}),
-        (r"antihistamine", {"name":"Oral antihistamine"}),
-        (r"topical steroid", {"name":"Topical steroid cream"}),
-        (r"NSAID|anti-inflammatory", {"name":"Non-steroidal anti-inflammatory drug"}),
-        (r"inhaler|controller inhaler|reliever", {"name":"Inhaler medication"}),
-    ]
-    for sid, txt in sents:
-        lw = txt.lower()
-        for pat, obj in drug_patterns:
-            if re.search(pat, lw):
-                add("drugs", obj, sid, txt)
-
-    # Laterality modifier (only if present)
-    for sid, txt in sents:
-        lw = txt.lower()
-        if " right " in f" {lw} ":
-            add("modifiers", {"type":"LATERALITY","value":"Right"}, sid, txt)
-            break
-        if " left " in f" {lw} ":
-            add("modifiers", {"type":"LATERALITY","value":"Left"}, sid, txt)
-            break
+        evidence = None
+        for bucket, obj in matcher.match(txt.lower()):
+            if bucket == "modifiers":
+                if laterality_found:
+                    continue
+                laterality_found = True
+            if evidence is None:
+                evidence = Evidence(sid, txt)  # shared by every fact from this sentence
+            extracted[bucket].append(Fact(obj, evidence))
 
     return extracted
 
+@lru_cache(maxsize=256)
+def _visit_service(visit_type: str, level: str) -> Dict[str, Any]:
+    """The visit service item for a visit type and level (shared; do not mutate)."""
+    return {
+        "code": sys.intern(f"SVC_VISIT_{'NEW' if visit_type.startswith('New') else 'EST'}_{level}"),
+        "label": sys.intern(f"Outpatient visit ({visit_type} , {level.replace('_',' ').title()})"),
+        "units": 1
+    }
+
 # ---------------------------
 # 4) Structured cross-check
 # ---------------------------
 
-def _ensure_item(extracted_bucket: List[Dict[str,Any]], cand: Dict[str,Any], key_fields: List[str]) -> None:
-    for ex in extracted_bucket:
-        if all(k in ex and k in cand and ex[k]==cand[k] for k in key_fields):
-            return
-    c = dict(cand); c["evidence"] = {"sentence_id":"STRUCTURED:orders","text":"From structured orders"}
-    extracted_bucket.append(c)
-
-def cross_check_structured(extracted: Dict[str,Any], structured: Dict[str,Any]) -> None:
-    orders = structured.get("orders", {})
-
-    # Labs
-    lab_map = {
-        "Rapid streptococcal antigen": {"code":"TEST_RAPID_STREP","label":"Rapid streptococcal antigen test"},
-        "HbA1c": {"code":"TEST_HBA1C","label":"Glycated hemoglobin"},
-        "Fasting lipid profile": {"code":"TEST_LIPID_PANEL","label":"Fasting lipid profile"},
-        "Urine microalbumin": {"code":"TEST_MICROALB","label":"Urine microalbumin"},
-        "Prenatal panel": {"code":"TEST_PRENATAL_PANEL","label":"Prenatal laboratory panel"},
-        "Urinalysis with microscopy": {"code":"TEST_URINALYSIS","label":"Urinalysis with microscopy"},
-        "Urine culture": {"code":"TEST_URINE_CULTURE","label":"Urine culture"},
-    }
-    for lab in orders.get("lab_tests", []):
-        meta = lab_map.get(lab.get("name"))
-        if meta:
-            cand = {**meta, "units": lab.get("units", 1)}
-            _ensure_item(extracted["tests"], cand, ["code"])
-
-    # Tests
-    for t in orders.get("tests", []):
-        if str(t.get("name","")).lower().startswith("resting electrocardiogram"):
-            _ensure_item(extracted["tests"], {"code":"TEST_ECG","label":"Resting electrocardiogram with interpretation","units": t.get("units",1)}, ["code"])
-
-    # Imaging performed
-    for img in orders.get("imaging", []):
-        nm = str(img.get("name","")).lower()
-        if "knee" in nm:
-            _ensure_item(extracted["imaging"], {"code":"IMG_KNEE_XR_2V_RIGHT","label":"Knee X-ray, right, two views","units":1,"side":img.get("side"),"views":img.get("views")}, ["code"])
-
-    # Imaging orders
-    for io in orders.get("imaging_orders", []):
-        nm = str(io.get("name","")).lower()
-        if "mri" in nm and "head" in nm:
-            _ensure_item(extracted["imaging"], {"code":"IMG_BRAIN_MRI_WO","label":"Head MRI without contrast","units": io.get("units",1),"authorization_required": io.get("authorization_required", False),"status": io.get("status")}, ["code"])
-        if "lumbar spine" in nm and "x-ray" in nm:
-            _ensure_item(extracted["imaging"], {"code":"IMG_LUMBAR_XR_2V","label":"Lumbar spine X-ray, two or three views","units":1}, ["code"])
-        if "ultrasound" in nm and "pregnancy" in nm:
-            _ensure_item(extracted["imaging"], {"code":"IMG_OB_EARLY_US","label":"Early pregnancy ultrasound, transabdominal","units": io.get("units",1)}, ["code"])
-
-    # In-clinic treatments
-    for tr in orders.get("in_clinic_treatments", []):
-        if "nebulized" in str(tr.get("name","")).lower():
-            _ensure_item(extracted["treatments"], {"code":"TRT_NEBULIZER","label":"Nebulized bronchodilator treatment","units": tr.get("units",1)}, ["code"])
+_ORDERS_EVIDENCE = Evidence("STRUCTURED:orders", "From structured orders")
+
+def _ensure_item(extracted_bucket: List[Fact], cand: Dict[str,Any], key_fields: List[str], extra: Optional[Dict[str,Any]] = None,
+                 seen: Optional[Set[Tuple[Any, ...]]] = None) -> None:
+    """
+    Add `cand` (with `extra` fields) unless an item with the same key fields is already there.
+    `seen` holds the key tuples of the bucket's items; pass the same set for every call on a
+    bucket so each check is a hash probe rather than a rescan.
+    """
+    try:
+        key = tuple(extra[k] if extra and k in extra else cand[k] for k in key_fields)
+    except KeyError:
+        extracted_bucket.append(Fact(cand, _ORDERS_EVIDENCE, extra))  # nothing to compare on: never a duplicate
+        return
+    if seen is None:
+        seen = {tuple(ex[k] for k in key_fields) for ex in extracted_bucket if all(k in ex for k in key_fields)}
+    if key not in seen:
+        seen.add(key)
+        extracted_bucket.append(Fact(cand, _ORDERS_EVIDENCE, extra))
+
+def cross_check_structured(extracted: Dict[str,Any], structured: Dict[str,Any], rules: Optional["RulePack"] = None) -> None:
+    """Add the items of structured orders (labs, tests, imaging, treatments) that the note did not mention."""
+    seen: Dict[str, Set[Tuple[Any, ...]]] = {}
+    for bucket, entry, order in (rules or active_rules()).orders.orders(structured.get("orders", {})):
+        keys = seen.get(bucket)
+        if keys is None:
+            keys = seen[bucket] = {(ex["code"],) for ex in extracted[bucket] if "code" in ex}
+        _ensure_item(extracted[bucket], entry.item, ["code"], entry.fields(order), keys)
 
 # ---------------------------
-# 5) Policy checks (very small rules layer)
+# 5) Policy checks (declarative, dispatched by code)
 # ---------------------------
 
-def apply_policy_checks(extracted: Dict[str,Any], context: Dict[str,Any]) -> Dict[str, List[str]]:
+def apply_policy_checks(extracted: Dict[str,Any], context: Dict[str,Any], rules: Optional["RulePack"] = None,
+                        stats: Optional[Dict[str, List[int]]] = None) -> Dict[str, List[str]]:
     """
-    Returns dict: {item_code: [warnings...]}
-    Demo rules:
-      - Imaging knee X-ray requires laterality and views >= 2.
-      - Units must be positive integers.
-      - MRI 'authorization_required' -> warn if status is not 'Approved' (demo).
+    Returns dict: {item_code: [warnings...]} from the rule pack's `policy_rules`
+    (units, knee X-ray laterality/views, MRI authorization in the demo pack).
+    `stats` collects per-rule [evaluations, violations, nanoseconds].
     """
-    warnings: Dict[str, List[str]] = {}
-
-    def warn(code: str, msg: str):
-        warnings.setdefault(code, []).append(msg)
-
-    # Units check
-    for bucket in ("tests","imaging","treatments","services"):
-        for item in extracted[bucket]:
-            units = int(item.get("units", 1) or 0)
-            if units <= 0:
-                warn(item.get("code","?"), "Units must be a positive integer.")
-
-    # Knee X-ray checks
-    for im in extracted["imaging"]:
-        if im.get("code") == "IMG_KNEE_XR_2V_RIGHT":
-            if im.get("side") not in ("Right","Left"):
-                warn(im["code"], "Laterality (right/left) should be specified.")
-            if int(im.get("views", 0) or 0) < 2:
-                warn(im["code"], "Knee radiograph should include at least two views.")
-
-    # MRI authorization
-    for im in extracted["imaging"]:
-        if im.get("code") == "IMG_BRAIN_MRI_WO" and im.get("authorization_required"):
-            if im.get("status") != "Approved":
-                warn(im["code"], f"MRI requires authorization; current status is '{im.get('status')}'.")
-
-    return warnings
+    return (rules or active_rules()).policy.check(extracted, stats)
 
 # ---------------------------
 # 6) Charge capture
 # ---------------------------
 
-PRICE = {
-    "SVC_VISIT_NEW_LEVEL_2": 60, "SVC_VISIT_NEW_LEVEL_3": 90, "SVC_VISIT_NEW_LEVEL_4": 140, "SVC_VISIT_NEW_LEVEL_5": 220,
-    "SVC_VISIT_EST_LEVEL_2": 40, "SVC_VISIT_EST_LEVEL_3": 70, "SVC_VISIT_EST_LEVEL_4": 110, "SVC_VISIT_EST_LEVEL_5": 180,
-    "TEST_RAPID_STREP": 25, "TEST_ECG": 45, "TEST_URINALYSIS": 20, "TEST_URINE_CULTURE": 35, "TEST_HBA1C": 30,
-    "TEST_LIPID_PANEL": 35, "TEST_MICROALB": 25, "TEST_PRENATAL_PANEL": 85,
-    "IMG_KNEE_XR_2V_RIGHT": 60, "IMG_BRAIN_MRI_WO": 400, "IMG_OB_EARLY_US": 120, "IMG_LUMBAR_XR_2V": 70,
-    "TRT_NEBULIZER": 30,
-}
-
-def compose_charges(extracted: Dict[str,Any], diagnoses: List[Dict[str,Any]]) -> List[Dict[str,Any]]:
-    dx = diagnoses or [{"code":"DX_UNSPECIFIED","label":"Unspecified diagnosis","evidence":{"sentence_id":"N/A","text":"No diagnosis found"}}]
+def compose_charges(extracted: Dict[str,Any], diagnoses: List[Dict[str,Any]], rules: Optional["RulePack"] = None,
+                    plan: Optional[str] = None, service_date: Optional[str] = None) -> List[ChargeLine]:
+    """Charge lines priced from the fee schedule for `plan` on `service_date` (base prices if unknown)."""
+    rules = rules or active_rules()
+    fees = rules.fees
+    prices, default_price = fees.base, fees.default_price
+    plan_rows = fees.for_plan(plan)
+    dx_code = diagnoses[0]["code"] if diagnoses else "DX_UNSPECIFIED"
     charges = []
 
-    def add_line(item: Dict[str,Any]):
-        code = item.get("code","UNKNOWN")
-        units = int(item.get("units",1))
-        price = PRICE.get(code, 50)
-        charges.append({
-            "description": item.get("label", code),
-            "code": code,
-            "units": units,
-            "unit_price": price,
-            "total": price * units,
-            "supported_by_diagnosis": [dx[0]["code"]],
-            "evidence": item.get("evidence", {}),
-        })
-
     for b in ("services","tests","imaging","treatments"):
-        for it in extracted[b]:
-            add_line(it)
+        for item in extracted[b]:
+            code = item.get("code","UNKNOWN")
+            price = prices.get(code, default_price) if code not in plan_rows else fees.price(plan, code, service_date)
+            charges.append(ChargeLine(item.get("label", code), code, int(item.get("units",1)), price, dx_code, item.get("evidence", {})))
 
     return charges
 
@@ -293,12 +424,34 @@ def compose_charges(extracted: Dict[str,Any], diagnoses: List[Dict[str,Any]]) ->
 # 7) Orchestrate + Save
 # ---------------------------
 
-def process_encounter(enc: Dict[str,Any]) -> Dict[str,Any]:
-    facts = extract_facts(enc["note_sentences"], enc["context"])
-    cross_check_structured(facts, enc["structured"])
-    warnings = apply_policy_checks(facts, enc["context"])
-    charges = compose_charges(facts, facts["diagnoses"])
-    return {
+def process_encounter(enc: Dict[str,Any], rules: Optional[RulePack] = None) -> Dict[str,Any]:
+    # One pack for the whole encounter, even if a reload swaps it mid-way.
+    rules = rules or active_rules()
+    if not METRICS.enabled:
+        return _process(enc, rules)
+    try:
+        return _process(enc, rules, METRICS)
+    except Exception:
+        METRICS.record_error()
+        raise
+
+def _process(enc: Dict[str,Any], rules: RulePack, metrics: Optional[PipelineMetrics] = None) -> Dict[str,Any]:
+    if metrics:
+        t0 = perf_counter()
+    facts = extract_facts(enc["note_sentences"], enc["context"], rules)
+    if metrics:
+        t1 = perf_counter()
+    cross_check_structured(facts, enc["structured"], rules)
+    if metrics:
+        t2 = perf_counter()
+    if metrics:
+        rule_stats: Dict[str, List[int]] = {}
+        warnings = apply_policy_checks(facts, enc["context"], rules, rule_stats)
+        t3 = perf_counter()
+    else:
+        warnings = apply_policy_checks(facts, enc["context"], rules)
+    charges = compose_charges(facts, facts["diagnoses"], rules, enc["identity"].get("insurance_plan"), enc["context"].get("date_time"))
+    result = {
         "encounter_id": enc["encounter_id"],
         "identity": enc["identity"],
         "context": enc["context"],
@@ -307,54 +460,400 @@ def process_encounter(enc: Dict[str,Any]) -> Dict[str,Any]:
         "extracted": facts,
         "policy_warnings": warnings,
         "charges": charges,
+        "rule_pack_version": rules.version,
     }
+    if metrics:
+        t4 = perf_counter()
+        metrics.record({
+            "extract_facts": t1 - t0,
+            "cross_check_structured": t2 - t1,
+            "apply_policy_checks": t3 - t2,
+            "compose_charges": t4 - t3,
+            "process_encounter": t4 - t0,
+        }, len(charges), rule_stats)
+    return result
+
+def process_encounter_safe(enc: Union[Dict[str,Any], RawLine]) -> Dict[str,Any]:
+    """
+    process_encounter, but a failure becomes an error record instead of aborting the batch.
+    A RawLine is parsed here first; one that is not valid JSON becomes {"line": n, "error": ...}.
+    """
+    if isinstance(enc, RawLine):
+        raw = enc
+        try:
+            enc = json_codec.loads(raw.text)
+        except ValueError as e:
+            return {"line": raw.line, "error": f"Invalid JSON: {e}"}
+    try:
+        return process_encounter(enc)
+    except Exception as e:
+        eid = enc.get("encounter_id") if isinstance(enc, dict) else None
+        return {"encounter_id": eid, "error": f"{type(e).__name__}: {e}"}
+
+def _init_worker(rules_path: str) -> None:
+    set_active_rules(load_rule_pack(rules_path))
+
+def _process_batch(batch: List[Dict[str,Any]]) -> List[Dict[str,Any]]:
+    return [process_encounter_safe(enc) for enc in batch]
+
+def _range_results(path: str, start: int, end: int) -> Iterator[Dict[str,Any]]:
+    base = None
+    for i, line in iter_range_lines(path, start, end):
+        r = process_encounter_safe(RawLine(i + 1, line))
+        if "line" in r:
+            # Numbered from the range start: count the lines before it only when one fails
+            if base is None:
+                base = count_lines(path, start)
+            r["line"] += base
+        yield r
+
+def _process_range(path: str, start: int, end: int) -> List[Dict[str,Any]]:
+    return list(_range_results(path, start, end))
+
+def _encode(results: Iterable[Dict[str,Any]], profile: str) -> Tuple[bytes, bytes]:
+    lines, rows = [], []
+    for r in results:
+        line, row = encode_result(r, profile)
+        lines.append(line)
+        rows.append(row)
+    return b"".join(lines), b"".join(rows)
+
+def _encode_batch(batch: List[Dict[str,Any]], profile: str) -> Tuple[bytes, bytes]:
+    return _encode(map(process_encounter_safe, batch), profile)
+
+def _encode_range(path: str, start: int, end: int, profile: str) -> Tuple[bytes, bytes]:
+    return _encode(_range_results(path, start, end), profile)
+
+def _run_ordered(fn, tasks: Iterable[Tuple], workers: int) -> Iterator[Any]:
+    """Run fn(*task) on a pool, at most 2 tasks per worker in flight, yielding what each returns in task order."""
+    import multiprocessing  # only the batch CLI needs it; keeps app start-up light
+
+    workers = workers or os.cpu_count() or 1
+    window = 2 * workers
+    it = iter(tasks)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(active_rules().source,)) as pool:
+        pending: Deque[Any] = deque()
+        while True:
+            while len(pending) < window:
+                task = next(it, None)
+                if task is None:
+                    break
+                pending.append(pool.apply_async(fn, task))
+            if not pending:
+                return
+            yield pending.popleft().get()
+
+def _batches(encounters: Iterable[Dict[str,Any]], chunk_size: int) -> Iterator[List[Dict[str,Any]]]:
+    it = iter(encounters)
+    while True:
+        batch = list(islice(it, chunk_size))
+        if not batch:
+            return
+        yield batch
+
+def process_parallel(encounters: Iterable[Dict[str,Any]], workers: int = 0, chunk_size: int = 64) -> Iterator[Dict[str,Any]]:
+    """
+    Process encounters on a pool of `workers` processes (0 = all cores), yielding
+    results in input order. Records go to workers in batches of `chunk_size`; at most
+    2 batches per worker are in flight, so input is read only as fast as it is consumed.
+    """
+    tasks = ((batch,) for batch in _batches(encounters, chunk_size))
+    return chain.from_iterable(_run_ordered(_process_batch, tasks, workers))
+
+def process_file_parallel(path: str, workers: int = 0, range_bytes: int = 4 << 20) -> Iterator[Dict[str,Any]]:
+    """
+    Like process_parallel for a JSONL file, but workers read their own line-aligned
+    byte ranges of it (memory-mapped), so the parent never parses or pickles the input.
+    """
+    tasks = ((path, start, end) for start, end in split_ranges(path, range_bytes))
+    return chain.from_iterable(_run_ordered(_process_range, tasks, workers))
+
+def encode_parallel(encounters: Iterable[Dict[str,Any]], workers: int = 0, chunk_size: int = 64,
+                    profile: str = "full") -> Iterator[Tuple[bytes, bytes]]:
+    """
+    process_parallel for output files: each worker encodes its batch too and returns
+    (JSONL lines, CSV rows) as bytes, so the parent only writes them (see save_encoded)
+    instead of unpickling and encoding every result on one thread.
+    """
+    return _run_ordered(_encode_batch, ((batch, profile) for batch in _batches(encounters, chunk_size)), workers)
+
+def encode_file_parallel(path: str, workers: int = 0, range_bytes: int = 4 << 20,
+                         profile: str = "full") -> Iterator[Tuple[bytes, bytes]]:
+    """encode_parallel over the byte ranges of a JSONL file, as in process_file_parallel."""
+    tasks = ((path, start, end, profile) for start, end in split_ranges(path, range_bytes))
+    return _run_ordered(_encode_range, tasks, workers)
+
+def save_outputs(results: Iterable[Dict[str,Any]], out_dir: str, flush_every: int = 100, profile: str = "full",
+                 compression: Optional[str] = None, level: Optional[int] = None) -> Dict[str,str]:
+    """
+    Write the detailed JSONL and the summary CSV in a single pass over `results`.
+    `results` may be a generator: each record is written as soon as it arrives and
+    both files are flushed every `flush_every` records, so memory stays flat.
+    The JSONL holds each result cut to the output `profile`; the CSV is unaffected.
+    With `compression` (gzip, bz2 or xz) both files get its extension and are
+    compressed on background threads (see compressed_io).
+    """
+    encoded = (encode_result(r, profile) for r in results)
+    return save_encoded(encoded, out_dir, flush_every, compression, level)
 
-def save_outputs(results: List[Dict[str,Any]], out_dir: str) -> Dict[str,str]:
+def save_encoded(chunks: Iterable[Tuple[bytes, bytes]], out_dir: str, flush_every: int = 100,
+                 compression: Optional[str] = None, level: Optional[int] = None) -> Dict[str,str]:
+    """save_outputs for results already encoded: (JSONL bytes, CSV bytes) per record or per batch."""
     out = Path(out_dir)
     out.mkdir(parents=True, exist_ok=True)
 
-    # Detailed JSONL
-    detailed = out / "rcm_parsed_output.jsonl"
-    with detailed.open("w", encoding="utf-8") as f:
-        for r in results:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
-
-    # CSV summary
-    headers = ["Encounter","Patient","Visit type","Diagnoses","Services","Tests","Imaging","Charge total (mock currency)","Warnings"]
-    csvp = out / "rcm_parsed_summary.csv"
-    def labels(lst, key="label"):
-        return ", ".join(sorted({x.get(key, x.get("code","")) for x in lst})) if lst else "—"
-
-    with csvp.open("w", encoding="utf-8") as f:
-        f.write(",".join(headers) + "\n")
-        for r in results:
-            dx = labels(r["extracted"]["diagnoses"])
-            svc = labels(r["extracted"]["services"])
-            tests = labels(r["extracted"]["tests"])
-            img = labels(r["extracted"]["imaging"])
-            total = sum(c["total"] for c in r["charges"])
-            warn = "; ".join(f"{k}: {' | '.join(v)}" for k,v in r["policy_warnings"].items()) or "—"
-            row = [
-                r["encounter_id"],
-                r["identity"]["name"],
-                r["context"]["visit_type"],
-                dx.replace(",",";"),
-                svc.replace(",",";"),
-                tests.replace(",",";"),
-                img.replace(",",";"),
-                str(total),
-                warn.replace(",",";"),
-            ]
-            f.write(",".join(row) + "\n")
+    detailed = Path(compressed_name(out / "rcm_parsed_output.jsonl", compression))
+    csvp = Path(compressed_name(out / "rcm_parsed_summary.csv", compression))
+    with open_text(detailed, "wb", compression, level) as fj, open_text(csvp, "wb", compression, level) as fc:
+        fc.write((",".join(SUMMARY_HEADERS) + "\n").encode("utf-8"))
+        for n, (lines, rows) in enumerate(chunks, 1):
+            fj.write(lines)
+            fc.write(rows)
+            if n % flush_every == 0:
+                fj.flush(); fc.flush()
 
     return {"jsonl": str(detailed), "csv": str(csvp)}
 
-def main(input_path: str = "data/rcm_demo_input.jsonl", out_dir: str = "data"):
-    data = load_jsonl(input_path)
-    results = [process_encounter(enc) for enc in data]
-    paths = save_outputs(results, out_dir)
+def process_stream(encounters: Iterable[Dict[str,Any]], workers: int = 1, chunk_size: int = 64) -> Iterator[Dict[str,Any]]:
+    """Serial (workers=1) or parallel processing of a stream, results in input order."""
+    if workers == 1:
+        return (process_encounter_safe(enc) for enc in encounters)
+    return process_parallel(encounters, workers, chunk_size)
+
+# ---------------------------
+# 8) Incremental runs (manifest of what is already in the outputs)
+# ---------------------------
+
+MANIFEST_NAME = "rcm_manifest.json"
+MANIFEST_FORMAT = 2
+_LINE_KEY = "#line "  # manifest key of an input line that is not valid JSON (no encounter_id)
+
+def _fingerprint(line: str) -> str:
+    return hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+def load_manifest(out_dir: str, profile: str = "full") -> Optional[Dict[str,Any]]:
+    """
+    The manifest maps encounter_id -> [input fingerprint, rule-pack digest, jsonl offset,
+    jsonl length, csv offset, csv length], in output order. It is only trusted if both
+    output files still have the sizes it recorded (i.e. nothing else rewrote them) and
+    the JSONL was written with the same output profile.
+    """
+    out = Path(out_dir)
+    try:
+        m = json.loads((out / MANIFEST_NAME).read_text(encoding="utf-8"))
+        if (m.get("format") == MANIFEST_FORMAT
+                and m.get("profile") == profile
+                and (out / "rcm_parsed_output.jsonl").stat().st_size == m["jsonl_size"]
+                and (out / "rcm_parsed_summary.csv").stat().st_size == m["csv_size"]):
+            return m
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def run_incremental(input_path: str, out_dir: str, workers: int = 1, chunk_size: int = 64, profile: str = "full") -> Dict[str,Any]:
+    """
+    Reprocess only encounters that are new, whose input line changed, or whose result was
+    produced with a different rule pack (failed ones are always retried), and merge them
+    into the existing outputs. Unchanged results are copied as raw bytes; encounters not in
+    this input are kept. New encounters alone are appended in place.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    detailed, csvp = out / "rcm_parsed_output.jsonl", out / "rcm_parsed_summary.csv"
+    manifest = load_manifest(out_dir, profile)
+    entries: Dict[str, List[Any]] = manifest["encounters"] if manifest else {}
+    # Invalid lines are reprocessed on every run and numbered afresh: drop the old records
+    entries = {eid: e for eid, e in entries.items() if not eid.startswith(_LINE_KEY)}
+    rules = active_rules()
+
+    # Changed encounters are processed as the input streams past, and their output is
+    # spilled to disk: only offsets into the spill files are held until the merge
+    fingerprints: Deque[str] = deque()
+
+    def changed() -> Iterator[Union[Dict[str,Any], RawLine]]:
+        for raw in iter_lines(input_path):
+            fp = _fingerprint(raw.text)
+            try:
+                enc = json_codec.loads(raw.text)
+            except ValueError:
+                # Reported by the per-record guard, and retried on every run like other failures
+                fingerprints.append(fp)
+                yield raw
+                continue
+            e = entries.get(enc.get("encounter_id")) if isinstance(enc, dict) else None
+            if e is None or e[0] != fp or e[1] != rules.digest:
+                fingerprints.append(fp)
+                yield enc
+
+    spill_j, spill_c = detailed.with_name(detailed.name + ".delta"), csvp.with_name(csvp.name + ".delta")
+    delta: Dict[str, Tuple[str, str, int, int, int, int]] = {}
+    new_entries: Dict[str, List[Any]] = {}
+    try:
+        with spill_j.open("w+b") as sj, spill_c.open("w+b") as sc:
+            for r in process_stream(changed(), workers, chunk_size):  # in input order
+                jline, cline = encode_result(r, profile)
+                digest = "" if "error" in r else rules.digest
+                key = _LINE_KEY + str(r["line"]) if "line" in r else str(r.get("encounter_id"))
+                delta[key] = (fingerprints.popleft(), digest, sj.tell(), len(jline), sc.tell(), len(cline))
+                sj.write(jline); sc.write(cline)
+
+            stats = {"jsonl": str(detailed), "csv": str(csvp), "manifest": str(out / MANIFEST_NAME),
+                     "reprocessed": len(delta), "total": len(set(entries) | set(delta))}
+            if not delta:
+                return stats
+
+            def emit(fj, fc, eid: str, fp: str, digest: str, jline: bytes, cline: bytes) -> None:
+                new_entries[eid] = [fp, digest, fj.tell(), len(jline), fc.tell(), len(cline)]
+                fj.write(jline); fc.write(cline)
+
+            def spilled(eid: str) -> Tuple[str, str, bytes, bytes]:
+                fp, digest, joff, jlen, coff, clen = delta.pop(eid)
+                sj.seek(joff); sc.seek(coff)
+                return fp, digest, sj.read(jlen), sc.read(clen)
+
+            if (manifest is not None and len(entries) == len(manifest["encounters"])
+                    and not any(eid in entries for eid in delta)):
+                # Only new encounters: append to the existing files
+                new_entries.update(entries)
+                with detailed.open("ab") as fj, csvp.open("ab") as fc:
+                    for eid in list(delta):
+                        emit(fj, fc, eid, *spilled(eid))
+            else:
+                tmp_j, tmp_c = detailed.with_name(detailed.name + ".tmp"), csvp.with_name(csvp.name + ".tmp")
+                with tmp_j.open("wb") as fj, tmp_c.open("wb") as fc:
+                    fc.write((",".join(SUMMARY_HEADERS) + "\n").encode("utf-8"))
+                    if entries:
+                        with detailed.open("rb") as oj, csvp.open("rb") as oc:
+                            for eid, (fp, digest, joff, jlen, coff, clen) in entries.items():
+                                if eid in delta:
+                                    emit(fj, fc, eid, *spilled(eid))
+                                    continue
+                                oj.seek(joff); oc.seek(coff)
+                                emit(fj, fc, eid, fp, digest, oj.read(jlen), oc.read(clen))
+                    for eid in list(delta):
+                        emit(fj, fc, eid, *spilled(eid))
+                os.replace(tmp_j, detailed)
+                os.replace(tmp_c, csvp)
+    finally:
+        spill_j.unlink(missing_ok=True)
+        spill_c.unlink(missing_ok=True)
+
+    # Written last: if we stop before this, the size check discards the old manifest
+    tmp_m = out / (MANIFEST_NAME + ".tmp")
+    tmp_m.write_text(json.dumps({
+        "format": MANIFEST_FORMAT,
+        "profile": profile,
+        "rule_pack_version": rules.version,
+        "jsonl_size": detailed.stat().st_size,
+        "csv_size": csvp.stat().st_size,
+        "encounters": new_entries,
+    }), encoding="utf-8")
+    os.replace(tmp_m, out / MANIFEST_NAME)
+    stats["total"] = len(new_entries)
+    return stats
+
+def main(input_path: str = "data/rcm_demo_input.jsonl", out_dir: str = "data", workers: int = 1, chunk_size: int = 64,
+         incremental: bool = False, profile: str = "full", ids: Optional[List[str]] = None, range_mb: float = 4,
+         use_json: bool = True, partition_by: Optional[List[str]] = None, partition_mb: float = 64,
+         compression: Optional[str] = None, level: Optional[int] = None):
+    if incremental and (_is_csv(input_path) or compression):
+        # The manifest records byte offsets into plain JSONL outputs, keyed by input lines
+        print("--incremental needs JSONL input and uncompressed outputs")
+        return
+    if incremental:
+        stats = run_incremental(input_path, out_dir, workers, chunk_size, profile)
+        print(stats["jsonl"])
+        print(stats["csv"])
+        print(f"Reprocessed {stats['reprocessed']} of {stats['total']} encounters")
+        return
+    if _is_csv(input_path) or compression_of(input_path):
+        # CSV rows and compressed lines are streamed from here; offset indexes and byte
+        # ranges need a plain JSONL file
+        encounters = iter_records(input_path, use_json)
+        if ids:
+            wanted = set(ids)
+            encounters = (enc for enc in encounters if _record_id(enc) in wanted)
+        if workers != 1 and not partition_by:
+            _print_paths(save_encoded(encode_parallel(encounters, workers, chunk_size, profile), out_dir,
+                                      compression=compression, level=level))
+            return
+        _write_results(process_stream(encounters, workers, chunk_size), out_dir, profile, partition_by, partition_mb,
+                       compression, level)
+        return
+    if ids:
+        # Only the requested encounters are read, through the offset index
+        index = JsonlIndex(input_path)
+        missing = [eid for eid in ids if eid not in index]
+        if missing:
+            print(f"Not in {input_path}: {', '.join(missing)}")
+        results = process_stream(index.get_many(ids), workers, chunk_size)
+    elif workers != 1:
+        if not partition_by:
+            # Workers encode their ranges; this process only writes the bytes in order
+            _print_paths(save_encoded(encode_file_parallel(input_path, workers, int(range_mb * (1 << 20)), profile),
+                                      out_dir, compression=compression, level=level))
+            return
+        results = process_file_parallel(input_path, workers, int(range_mb * (1 << 20)))
+    else:
+        # Streamed end to end: read one encounter, process it, write it.
+        results = process_stream(iter_lines(input_path), workers, chunk_size)
+    _write_results(results, out_dir, profile, partition_by, partition_mb, compression, level)
+
+def _record_id(rec: Union[Dict[str,Any], RawLine]) -> Optional[str]:
+    if isinstance(rec, RawLine):
+        try:
+            rec = json_codec.loads(rec.text)
+        except ValueError:
+            return None  # left for the per-record guard to report
+    return rec.get("encounter_id") if isinstance(rec, dict) else None
+
+def _write_results(results: Iterable[Dict[str,Any]], out_dir: str, profile: str,
+                   partition_by: Optional[List[str]], partition_mb: float,
+                   compression: Optional[str] = None, level: Optional[int] = None) -> None:
+    if partition_by:
+        if compression:
+            print("--compress applies to single-file outputs; partitions are written uncompressed")
+        from partitioned_output import save_partitioned
+
+        root = Path(out_dir) / "partitions"
+        try:
+            entry = save_partitioned(results, str(root), partition_by, int(partition_mb * (1 << 20)), profile)
+        except ValueError as e:
+            print(e)
+            return
+        print(f"{root}: {sum(p['rows'] for p in entry['parts'])} results in {len(entry['parts'])} parts (run {entry['run_id']})")
+        return
+    _print_paths(save_outputs(results, out_dir, profile=profile, compression=compression, level=level))
+
+def _print_paths(paths: Dict[str,str]) -> None:
     print(paths["jsonl"])
     print(paths["csv"])
 
+def cli(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Extract facts and charges from encounter JSONL (or an encounter CSV).")
+    ap.add_argument("--input", default="data/rcm_demo_input.jsonl",
+                    help="JSONL, or .csv such as data/patient_encounters.csv; either may be .gz, .bz2 or .xz")
+    ap.add_argument("--out-dir", default="data")
+    ap.add_argument("--workers", type=int, default=1, help="worker processes (1 = serial, 0 = all cores)")
+    ap.add_argument("--chunk-size", type=int, default=64, help="encounters sent to a worker per batch")
+    ap.add_argument("--range-mb", type=float, default=4, help="MB of input each worker reads per task (parallel runs)")
+    ap.add_argument("--incremental", action="store_true", help="only reprocess new/changed encounters (see rcm_manifest.json)")
+    ap.add_argument("--profile", choices=sorted(OUTPUT_PROFILES), default="full",
+                    help="detail kept in the JSONL: full (echoes the input), slim or charges")
+    ap.add_argument("--ids", help="comma-separated encounter ids to process (uses the input's offset index)")
+    ap.add_argument("--partition-by", help="write partitioned output under <out-dir>/partitions, by any of day|month,plan")
+    ap.add_argument("--partition-mb", type=float, default=64, help="size at which a partition's part file rotates")
+    ap.add_argument("--compress", choices=sorted(COMPRESSIONS), help="write the JSONL and CSV outputs compressed")
+    ap.add_argument("--compress-level", type=int, help="compression level (default: RCM_COMPRESS_LEVEL or the codec's)")
+    ap.add_argument("--ignore-json", action="store_true",
+                    help="CSV input: rebuild every encounter from the flat columns, even where original_json is present")
+    args = ap.parse_args(argv)
+    main(args.input, args.out_dir, args.workers, args.chunk_size, args.incremental, args.profile,
+         [i for i in (args.ids or "").split(",") if i], args.range_mb, not args.ignore_json,
+         [p for p in (args.partition_by or "").split(",") if p], args.partition_mb, args.compress, args.compress_level)
+
 if __name__ == "__main__":
-    main()
+    # Run from the importable module, so pickled rule packs (and worker tasks) name
+    # parse_rcm_documents classes rather than __main__ ones the app cannot load
+    import parse_rcm_documents
+    parse_rcm_documents.cli()
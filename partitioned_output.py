@@ -0,0 +1,281 @@
+"""
+Partitioned, size-capped output for processed results.
+
+    python parse_rcm_documents.py --input data/synthetic_encounters.jsonl --partition-by month,plan
+    python partitioned_output.py data/partitions                          # catalog summary
+    python partitioned_output.py data/partitions --plan "Cedar Health Basic" --from 2025-06 --to 2025-06
+
+Results are sharded by visit date (`day` or `month`) and/or insurance `plan` into
+Hive-style directories (`visit_month=2025-09/plan=Oasis_Health_Silver_Care/`). Each
+partition holds `part-<run>-<n>.jsonl` files (with a matching `.csv` summary) that
+rotate once they pass `max_bytes`. File names carry the writing run's id, so
+concurrent runs never share a file; each run records its parts in its own catalog
+file (`_catalog/<run>.json`), and `read_catalog` merges them. With `overwrite`
+(the default), a run's parts replace older parts of the partitions it wrote, and
+partitions it did not touch are left alone.
+"""
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import json_codec
+
+from rcm_results import SUMMARY_HEADERS, encode_result
+
+CATALOG_DIR = "_catalog"
+CATALOG_FORMAT = 1
+ERROR_PARTITION = "_errors"
+
+# Partition column -> (directory key, value of a result)
+PARTITION_KEYS = {
+    "day": ("visit_date", lambda r: (r.get("context", {}).get("date_time") or "")[:10] or None),
+    "month": ("visit_month", lambda r: (r.get("context", {}).get("date_time") or "")[:7] or None),
+    "plan": ("plan", lambda r: r.get("identity", {}).get("insurance_plan") or None),
+}
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+def _dir_value(value: Optional[str]) -> str:
+    if not value:
+        return "_unknown"
+    return _UNSAFE.sub("_", value).strip("_") or "_"
+
+class _Part:
+    __slots__ = ("partition", "path", "index", "rows", "bytes", "min_visit", "max_visit", "fj", "fc")
+
+    def __init__(self, partition: Dict[str, Any], path: str, index: int):
+        self.partition = partition
+        self.path = path
+        self.index = index
+        self.rows = 0
+        self.bytes = 0
+        self.min_visit: Optional[str] = None
+        self.max_visit: Optional[str] = None
+        self.fj = self.fc = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"partition": self.partition, "path": self.path, "rows": self.rows,
+                "bytes": self.bytes, "min_visit": self.min_visit, "max_visit": self.max_visit}
+
+class PartitionedWriter:
+    """
+    Streams results into partition files. At most `max_open` partitions keep their
+    files open (least recently used are closed and reopened for append), so any
+    number of partitions can be written in one pass with bounded file handles.
+    """
+
+    def __init__(self, root: str, partition_by: Sequence[str] = ("month", "plan"), max_bytes: int = 64 << 20,
+                 profile: str = "full", overwrite: bool = True, max_open: int = 64):
+        unknown = [p for p in partition_by if p not in PARTITION_KEYS]
+        if unknown or not partition_by:
+            raise ValueError(f"Partition by one or more of {', '.join(PARTITION_KEYS)}, got {list(partition_by)}")
+        self.root = Path(root)
+        self.partition_by = tuple(partition_by)
+        # Parts of runs with another layout would overlap ours (the same encounters, twice)
+        other = {tuple(r["partition_by"]) for r in _catalog_runs(self.root)} - {self.partition_by}
+        if other:
+            raise ValueError(f"{root} is partitioned by {','.join(sorted(other)[0])}, not {','.join(self.partition_by)}; "
+                             "write this layout to another directory")
+        self.max_bytes = max_bytes
+        self.profile = profile
+        self.overwrite = overwrite
+        self.max_open = max_open
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.started = time.time()
+        self._current: Dict[str, _Part] = {}  # by partition directory
+        self._open: "OrderedDict[str, _Part]" = OrderedDict()
+        self._parts: List[_Part] = []
+        self.rows = 0
+        self.entry: Optional[Dict[str, Any]] = None  # catalog entry, once closed
+
+    def __enter__(self) -> "PartitionedWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(commit=exc_type is None)
+
+    def _partition(self, r: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        if "error" in r:
+            return {}, ERROR_PARTITION
+        values = [(PARTITION_KEYS[p][0], PARTITION_KEYS[p][1](r)) for p in self.partition_by]
+        return dict(values), "/".join(f"{k}={_dir_value(v)}" for k, v in values)
+
+    def write(self, r: Dict[str, Any]) -> None:
+        # Values that map to the same directory ("A/B", "A B") share its parts
+        partition, rel = self._partition(r)
+        part = self._current.get(rel)
+        if part is not None and part.bytes >= self.max_bytes:
+            self._close_part(rel, part)
+            part = None
+        if part is None:
+            index = 0 if rel not in self._current else self._current[rel].index + 1
+            part = self._current[rel] = _Part(partition, f"{rel}/part-{self.run_id}-{index:05d}.jsonl", index)
+            self._parts.append(part)
+        if part.fj is None:
+            self._reopen(rel, part)
+        else:
+            self._open.move_to_end(rel)
+
+        line, row = encode_result(r, self.profile)
+        part.fj.write(line)
+        part.fc.write(row)
+        part.rows += 1
+        part.bytes += len(line)
+        visit = (r.get("context", {}).get("date_time") if "error" not in r else None)
+        if visit:
+            if part.min_visit is None or visit < part.min_visit:
+                part.min_visit = visit
+            if part.max_visit is None or visit > part.max_visit:
+                part.max_visit = visit
+        self.rows += 1
+
+    def _reopen(self, key: str, part: _Part) -> None:
+        while len(self._open) >= self.max_open:
+            old_key, old = self._open.popitem(last=False)
+            old.fj.close(); old.fc.close()
+            old.fj = old.fc = None
+        path = self.root / part.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        new = part.rows == 0
+        part.fj = path.open("ab")
+        part.fc = path.with_suffix(".csv").open("ab")
+        if new:
+            part.fc.write((",".join(SUMMARY_HEADERS) + "\n").encode("utf-8"))
+        self._open[key] = part
+
+    def _close_part(self, key: str, part: _Part) -> None:
+        if part.fj is not None:
+            part.fj.close(); part.fc.close()
+            part.fj = part.fc = None
+            self._open.pop(key, None)
+
+    def close(self, commit: bool = True) -> Dict[str, Any]:
+        """
+        Close every file and record the run in the catalog. Without `commit` (a failed
+        run) the run's files are removed instead, so readers never see partial output.
+        """
+        if self.entry is not None:
+            return self.entry
+        for key, part in list(self._open.items()):
+            self._close_part(key, part)
+        if not commit:
+            for part in self._parts:
+                for p in (self.root / part.path, (self.root / part.path).with_suffix(".csv")):
+                    p.unlink(missing_ok=True)
+            self.entry = {}
+            return self.entry
+        entry = self.entry = {
+            "format": CATALOG_FORMAT,
+            "run_id": self.run_id,
+            "started": self.started,
+            "finished": time.time(),
+            "partition_by": list(self.partition_by),
+            "profile": self.profile,
+            "overwrite": self.overwrite,
+            "parts": [p.to_dict() for p in self._parts],
+        }
+        catalog = self.root / CATALOG_DIR
+        catalog.mkdir(parents=True, exist_ok=True)
+        tmp = catalog / f".{self.run_id}.tmp"
+        tmp.write_text(json.dumps(entry, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, catalog / f"{self.run_id}.json")
+        if self.overwrite:
+            self._drop_superseded()
+        return entry
+
+    def _drop_superseded(self) -> None:
+        """Delete the files of older parts in the partitions this run rewrote."""
+        live = {p["path"] for p in read_catalog(str(self.root))}
+        mine = {part.path.rsplit("/", 1)[0] for part in self._parts}
+        for run in _catalog_runs(self.root):
+            for p in run["parts"]:
+                if p["path"] not in live and p["path"].rsplit("/", 1)[0] in mine:
+                    for f in (self.root / p["path"], (self.root / p["path"]).with_suffix(".csv")):
+                        f.unlink(missing_ok=True)
+
+def _catalog_runs(root: Path) -> List[Dict[str, Any]]:
+    runs = []
+    for f in (root / CATALOG_DIR).glob("*.json"):
+        try:
+            run = json.loads(f.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue  # being replaced, or not a catalog file
+        if run.get("format") == CATALOG_FORMAT:
+            runs.append(run)
+    return sorted(runs, key=lambda r: (r["finished"], r["run_id"]))
+
+def read_catalog(root: str) -> List[Dict[str, Any]]:
+    """
+    The current parts of a partitioned output, oldest run first. A part is dropped when
+    a later overwriting run wrote the same partition directory.
+    """
+    parts: List[Dict[str, Any]] = []
+    for run in _catalog_runs(Path(root)):
+        if run["overwrite"]:
+            rewritten = {p["path"].rsplit("/", 1)[0] for p in run["parts"]}
+            parts = [p for p in parts if p["path"].rsplit("/", 1)[0] not in rewritten]
+        parts.extend(run["parts"])
+    return parts
+
+def select_parts(root: str, plan: Optional[str] = None, date_from: Optional[str] = None,
+                 date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Parts that can hold results for `plan` with visits in [date_from, date_to] (inclusive
+    prefixes, as in EncounterStore.query). Decided from the catalog alone; error records
+    are only selected without filters.
+    """
+    selected = []
+    for p in read_catalog(root):
+        if p["path"].startswith(ERROR_PARTITION + "/"):
+            if plan is None and not date_from and not date_to:
+                selected.append(p)
+            continue
+        # Compared as directory values: a part holds every plan that maps to its directory
+        if plan is not None and "plan" in p["partition"] and _dir_value(p["partition"]["plan"]) != _dir_value(plan):
+            continue
+        if date_from and p["max_visit"] and p["max_visit"] < date_from:
+            continue
+        if date_to and p["min_visit"] and p["min_visit"][:len(date_to)] > date_to:
+            continue
+        selected.append(p)
+    return selected
+
+def iter_partitions(root: str, plan: Optional[str] = None, date_from: Optional[str] = None,
+                    date_to: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Results from the selected parts only (the partition filter; rows are not re-checked)."""
+    for p in select_parts(root, plan, date_from, date_to):
+        with open(Path(root) / p["path"], "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json_codec.loads(line)
+
+def save_partitioned(results, root: str, partition_by: Sequence[str] = ("month", "plan"),
+                     max_bytes: int = 64 << 20, profile: str = "full", overwrite: bool = True) -> Dict[str, Any]:
+    """Write a stream of results as one partitioned run; returns its catalog entry."""
+    with PartitionedWriter(root, partition_by, max_bytes, profile, overwrite) as writer:
+        for r in results:
+            writer.write(r)
+    return writer.entry
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Summarize a partitioned output, or print the results of selected partitions.")
+    ap.add_argument("root", nargs="?", default="data/partitions")
+    ap.add_argument("--plan")
+    ap.add_argument("--from", dest="date_from")
+    ap.add_argument("--to", dest="date_to")
+    args = ap.parse_args()
+    if args.plan or args.date_from or args.date_to:
+        for rec in iter_partitions(args.root, args.plan, args.date_from, args.date_to):
+            print(json.dumps(rec, ensure_ascii=False))
+    else:
+        parts = read_catalog(args.root)
+        for p in parts:
+            print(f"{p['path']}: {p['rows']} rows, {p['bytes']} bytes, visits {p['min_visit']} .. {p['max_visit']}")
+        print(f"{len(parts)} parts, {sum(p['rows'] for p in parts)} rows")
@@ -0,0 +1,109 @@
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+class Histogram:
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+class PipelineMetrics:
+    """
+    Process-wide counters and per-stage latency histograms for process_encounter.
+
+    Each process (gunicorn worker, pool worker) keeps its own numbers. When
+    `enabled` is False the pipeline skips every timer and counter; the only
+    cost left is reading this flag once per encounter.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.encounters = 0
+            self.errors = 0
+            self.charge_lines = 0
+            self.stages: Dict[str, Histogram] = {}
+            self.policy_rules: Dict[str, List[int]] = {}  # rule id -> [evaluations, violations, ns]
+
+    def record(self, stage_seconds: Dict[str, float], charge_lines: int,
+               rule_stats: Optional[Dict[str, List[int]]] = None) -> None:
+        """One successfully processed encounter (and its policy rules' [evaluations, violations, ns])."""
+        with self._lock:
+            for rule, (n, hits, ns) in (rule_stats or {}).items():
+                total = self.policy_rules.get(rule)
+                if total is None:
+                    total = self.policy_rules[rule] = [0, 0, 0]
+                total[0] += n
+                total[1] += hits
+                total[2] += ns
+            self.encounters += 1
+            self.charge_lines += charge_lines
+            for stage, sec in stage_seconds.items():
+                h = self.stages.get(stage)
+                if h is None:
+                    h = self.stages[stage] = Histogram()
+                h.observe(sec)
+
+    def policy_summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-rule totals: evaluations, violations, seconds."""
+        with self._lock:
+            return {rule: {"evaluations": n, "violations": hits, "seconds": ns / 1e9}
+                    for rule, (n, hits, ns) in self.policy_rules.items()}
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def prometheus_text(self) -> str:
+        """Render in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            lines = [
+                "# HELP rcm_encounters_processed_total Encounters processed successfully.",
+                "# TYPE rcm_encounters_processed_total counter",
+                f"rcm_encounters_processed_total {self.encounters}",
+                "# HELP rcm_encounter_errors_total Encounters whose processing raised an error.",
+                "# TYPE rcm_encounter_errors_total counter",
+                f"rcm_encounter_errors_total {self.errors}",
+                "# HELP rcm_charge_lines_total Charge lines emitted by compose_charges.",
+                "# TYPE rcm_charge_lines_total counter",
+                f"rcm_charge_lines_total {self.charge_lines}",
+                "# HELP rcm_stage_duration_seconds Time spent in each pipeline stage per encounter.",
+                "# TYPE rcm_stage_duration_seconds histogram",
+            ]
+            for stage, h in self.stages.items():
+                cumulative = 0
+                for bound, n in zip(h.bounds + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'rcm_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'rcm_stage_duration_seconds_sum{{stage="{stage}"}} {h.total!r}')
+                lines.append(f'rcm_stage_duration_seconds_count{{stage="{stage}"}} {h.count}')
+            if self.policy_rules:
+                for name, i, help_text in (
+                    ("rcm_policy_rule_evaluations_total", 0, "Items each policy rule was evaluated against."),
+                    ("rcm_policy_rule_violations_total", 1, "Warnings raised by each policy rule."),
+                    ("rcm_policy_rule_seconds_total", 2, "Time spent evaluating each policy rule."),
+                ):
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                    for rule, totals in self.policy_rules.items():
+                        value = totals[i] / 1e9 if i == 2 else totals[i]
+                        lines.append(f'{name}{{rule="{rule}"}} {value!r}')
+        return "\n".join(lines) + "\n"
+
+# Set RCM_METRICS=0 to switch instrumentation off
+METRICS = PipelineMetrics(enabled=os.environ.get("RCM_METRICS", "1") not in ("0", "false", "no", "off"))
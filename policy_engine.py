@@ -0,0 +1,189 @@
+"""
+Declarative policy rules, dispatched by item code.
+
+Each rule names the buckets and codes it applies to (omit either for all), optional
+`when` conditions and a `require` condition; an item that meets every `when` but not
+`require` gets the rule's warning. A condition is {"field", "op", "value", "default"}
+with op one of:
+
+    truthy     the field is set and truthy
+    eq / ne    equals / differs from value
+    in         is one of value (a list)
+    ge / le    int(field or 0) >= / <= value
+
+Messages may use {field} placeholders. Example:
+
+    {"id": "knee_xr_views", "buckets": ["imaging"], "codes": ["IMG_KNEE_XR_2V_RIGHT"],
+     "require": {"field": "views", "op": "ge", "value": 2, "default": 0},
+     "message": "Knee radiograph should include at least two views."}
+"""
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# One closure per op, so a condition is a single call on the item
+_OPS: Dict[str, Callable[[str, Any, Any], Callable[[Any], bool]]] = {
+    "truthy": lambda f, x, d: lambda item: bool(item.get(f, d)),
+    "eq": lambda f, x, d: lambda item: item.get(f, d) == x,
+    "ne": lambda f, x, d: lambda item: item.get(f, d) != x,
+    "in": lambda f, x, d: lambda item: item.get(f, d) in x,
+    "ge": lambda f, x, d: lambda item: int(item.get(f, d) or 0) >= x,
+    "le": lambda f, x, d: lambda item: int(item.get(f, d) or 0) <= x,
+}
+
+def _condition(spec: Dict[str, Any], rule_id: str) -> Callable[[Any], bool]:
+    make = _OPS.get(spec.get("op", ""))
+    if make is None or "field" not in spec:
+        raise ValueError(f"Policy rule '{rule_id}': condition needs a field and an op ({', '.join(_OPS)}), got {spec}")
+    value = spec.get("value")
+    if isinstance(value, list):
+        value = frozenset(value) if all(isinstance(x, str) for x in value) else tuple(value)
+    return make(spec["field"], value, spec.get("default"))
+
+class _Fields:
+    """format_map view of an item: missing fields read as None."""
+    __slots__ = ("item",)
+
+    def __init__(self, item):
+        self.item = item
+
+    def __getitem__(self, key):
+        return self.item.get(key)
+
+class PolicyRule:
+    def __init__(self, spec: Dict[str, Any]):
+        self.id = spec.get("id") or ""
+        if not self.id or "message" not in spec or "require" not in spec:
+            raise ValueError(f"Policy rule needs an id, a require condition and a message: {spec}")
+        self.buckets = tuple(spec.get("buckets") or ())
+        self.codes = tuple(spec.get("codes") or ())
+        self.message = spec["message"]
+        self._templated = "{" in self.message
+        self.when = tuple(_condition(c, self.id) for c in spec.get("when", []))
+        self.require = _condition(spec["require"], self.id)
+
+    def violated(self, item) -> Optional[str]:
+        """The warning for `item`, or None if it passes (or the rule does not apply)."""
+        for cond in self.when:
+            if not cond(item):
+                return None
+        if self.require(item):
+            return None
+        return self.warning(item)
+
+    def warning(self, item) -> str:
+        return self.message.format_map(_Fields(item)) if self._templated else self.message
+
+class PolicyEngine:
+    """
+    Rules compiled into a bucket -> code -> [rules] index. `check` visits every
+    extracted item once and runs only the rules indexed under its code (plus the
+    bucket's any-code rules), so adding rules for other codes costs nothing.
+    Warnings come out in rule order, then item order, whatever the visiting order;
+    consecutive rules with the same buckets and codes report together, item by item.
+    """
+
+    def __init__(self, specs: Sequence[Dict[str, Any]] = ()):
+        self.specs = list(specs)
+        self._compile()
+
+    def _compile(self) -> None:
+        self.rules = [PolicyRule(s) for s in self.specs]
+        ids = [r.id for r in self.rules]
+        dupes = sorted({i for i in ids if ids.count(i) > 1})
+        if dupes:
+            raise ValueError(f"Duplicate policy rule ids: {', '.join(dupes)}")
+        # Buckets in order of first mention, so items are visited in a stable order
+        self.buckets: List[str] = []
+        for r in self.rules:
+            for b in r.buckets:
+                if b not in self.buckets:
+                    self.buckets.append(b)
+        self._named = frozenset(self.buckets)
+        # Report group of each rule: the first of its run of rules sharing a selector
+        self._group: List[int] = []
+        for i, r in enumerate(self.rules):
+            prev = self.rules[i - 1] if i else None
+            same = prev is not None and (prev.buckets, prev.codes) == (r.buckets, r.codes)
+            self._group.append(self._group[-1] if same else i)
+        # bucket -> ({code: rules}, rules for any other code); rules as (index, rule), in rule order.
+        # Rules without buckets are kept under None and join every bucket's lists.
+        any_code: Dict[Optional[str], List[int]] = {}
+        by_code: Dict[Optional[str], Dict[str, List[int]]] = {}
+        for i, r in enumerate(self.rules):
+            for b in r.buckets or (None,):
+                if r.codes:
+                    for code in r.codes:
+                        by_code.setdefault(b, {}).setdefault(code, []).append(i)
+                else:
+                    any_code.setdefault(b, []).append(i)
+        entries = lambda idx: tuple((i, self.rules[i]) for i in sorted(idx))
+
+        def selector(b: Optional[str]):
+            anywhere = any_code.get(None, []) + (any_code.get(b, []) if b else [])
+            codes: Dict[str, List[int]] = {}
+            for source in (by_code.get(None, {}), by_code.get(b, {}) if b else {}):
+                for code, idx in source.items():
+                    codes[code] = codes.get(code, []) + idx
+            return {code: entries(anywhere + idx) for code, idx in codes.items()}, entries(anywhere)
+
+        self._dispatch: List[Tuple[str, Dict[str, Tuple[Tuple[int, PolicyRule], ...]], Tuple[Tuple[int, PolicyRule], ...]]] = [
+            (b, *selector(b)) for b in self.buckets
+        ]
+        # Buckets no rule names are only visited when some rule applies to all buckets
+        self._other = selector(None) if None in any_code or None in by_code else None
+
+    def check(self, extracted: Dict[str, Any], stats: Optional[Dict[str, List[int]]] = None) -> Dict[str, List[str]]:
+        """
+        {item_code: [warnings...]} for the extracted facts. With `stats`, each rule's
+        [evaluations, violations, nanoseconds] are added to stats[rule_id].
+        """
+        hits: List[Tuple[int, int, str, str]] = []
+        seq = 0
+        dispatch = self._dispatch
+        if self._other is not None:
+            dispatch = dispatch + [(b, *self._other) for b in extracted if b not in self._named]
+        for bucket, by_code, any_code in dispatch:
+            for item in extracted.get(bucket, ()):
+                seq += 1
+                code = item.get("code", "?")
+                for i, rule in by_code.get(code, any_code):
+                    if stats is not None:
+                        msg = self._timed(rule, item, stats)
+                        if msg is not None:
+                            hits.append((i, seq, code, msg))
+                        continue
+                    for cond in rule.when:
+                        if not cond(item):
+                            break
+                    else:
+                        if not rule.require(item):
+                            hits.append((i, seq, code, rule.warning(item)))
+        if not hits:
+            return {}
+
+        warnings: Dict[str, List[str]] = {}
+        group = self._group
+        for _, _, code, msg in sorted(hits, key=lambda h: (group[h[0]], h[1], h[0])) if len(hits) > 1 else hits:
+            warnings.setdefault(code, []).append(msg)
+        return warnings
+
+    @staticmethod
+    def _timed(rule: PolicyRule, item, stats: Dict[str, List[int]]) -> Optional[str]:
+        t0 = perf_counter_ns()
+        msg = rule.violated(item)
+        elapsed = perf_counter_ns() - t0
+        s = stats.get(rule.id)
+        if s is None:
+            s = stats[rule.id] = [0, 0, 0]
+        s[0] += 1
+        s[1] += msg is not None
+        s[2] += elapsed
+        return msg
+
+    # Compiled conditions are closures: pickle the specs and recompile
+    def __getstate__(self):
+        return {"specs": self.specs}
+
+    def __setstate__(self, state):
+        self.specs = state["specs"]
+        self._compile()
@@ -0,0 +1,194 @@
+"""
+Pipeline result records and their output forms.
+
+Facts, evidence and charge lines are slotted records that serialize through
+`record_json`; `shape_result` cuts a result to an output profile and `summary_row`
+renders its summary CSV line; `encode_result` gives both as the bytes written out.
+Kept apart from parse_rcm_documents so writers (partitioned_output, worker
+processes) import them without the pipeline.
+"""
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
+
+import json_codec
+
+# ---------------------------
+# Records (facts, evidence, charge lines)
+# ---------------------------
+
+class _Record(Mapping):
+    """
+    Slotted pipeline record, read-only through the Mapping interface: it reads
+    like the dict it replaces (`rec["code"]`, `rec.get("units")`) and becomes one
+    only when written out (`to_dict`, or `json_codec.dumps(..., record_json)`).
+    Records are never modified after construction, so they can be shared.
+    """
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, f) for f in self.__slots__))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in self._fields}
+
+class Evidence(_Record):
+    __slots__ = _fields = ("sentence_id", "text")
+
+    def __init__(self, sentence_id: str, text: str):
+        self.sentence_id = sentence_id
+        self.text = text
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sentence_id": self.sentence_id, "text": self.text}
+
+class Fact(_Record):
+    """
+    An extracted item. `base` is the matching rule's object, shared by every fact
+    it produces and never copied; `extra` holds per-encounter fields (e.g. units
+    from an order) that override or extend it.
+    """
+    __slots__ = ("base", "evidence", "extra")
+
+    def __init__(self, base: Dict[str, Any], evidence: Evidence, extra: Optional[Dict[str, Any]] = None):
+        self.base = base
+        self.evidence = evidence
+        self.extra = extra
+
+    def __getitem__(self, key):
+        if key == "evidence":
+            return self.evidence
+        extra = self.extra
+        if extra and key in extra:
+            return extra[key]
+        return self.base[key]
+
+    def __contains__(self, key):
+        return key == "evidence" or key in self.base or bool(self.extra and key in self.extra)
+
+    def __iter__(self):
+        yield from self.base
+        if self.extra:
+            yield from (k for k in self.extra if k not in self.base)
+        yield "evidence"
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.extra:
+            return {**self.base, **self.extra, "evidence": self.evidence.to_dict()}
+        return {**self.base, "evidence": self.evidence.to_dict()}
+
+class ChargeLine(_Record):
+    __slots__ = ("description", "code", "units", "unit_price", "total", "diagnosis", "evidence")
+    _fields = ("description", "code", "units", "unit_price", "total", "supported_by_diagnosis", "evidence")
+
+    def __init__(self, description: str, code: str, units: int, unit_price: Any, diagnosis: str, evidence: Any):
+        self.description = description
+        self.code = code
+        self.units = units
+        self.unit_price = unit_price
+        self.total = unit_price * units
+        self.diagnosis = diagnosis
+        self.evidence = evidence
+
+    def __reduce__(self):
+        return (type(self), (self.description, self.code, self.units, self.unit_price, self.diagnosis, self.evidence))
+
+    def __getitem__(self, key):
+        if key == "supported_by_diagnosis":
+            return [self.diagnosis]
+        return super().__getitem__(key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ev = self.evidence
+        return {
+            "description": self.description,
+            "code": self.code,
+            "units": self.units,
+            "unit_price": self.unit_price,
+            "total": self.total,
+            "supported_by_diagnosis": [self.diagnosis],
+            "evidence": ev.to_dict() if type(ev) is Evidence else ev,
+        }
+
+def record_json(o: Any) -> Any:
+    """`default` hook for json_codec / json.dumps: records become their dict form."""
+    if type(o) in _RECORD_TYPES:  # exact types: an ABC isinstance check costs more than the conversion
+        return o.to_dict()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+_RECORD_TYPES = frozenset((Evidence, Fact, ChargeLine))
+
+# ---------------------------
+# Output profiles and the summary CSV
+# ---------------------------
+
+# What each output profile keeps of a result ("full" keeps everything, including the input echo)
+OUTPUT_PROFILES = {
+    "full": None,
+    "slim": ("encounter_id", "member_id", "extracted", "policy_warnings", "charges", "rule_pack_version"),
+    "charges": ("encounter_id", "charges", "rule_pack_version"),
+}
+
+def shape_result(r: Dict[str,Any], profile: str = "full") -> Dict[str,Any]:
+    """Cut a process_encounter result down to an output profile. Error records pass through."""
+    keep = OUTPUT_PROFILES[profile]
+    if keep is None or "error" in r:
+        return r
+    out = {}
+    for k in keep:
+        if k == "member_id":
+            out[k] = r.get("identity", {}).get("member_id")
+        elif k in r:
+            out[k] = r[k]
+    return out
+
+SUMMARY_HEADERS = ["Encounter","Patient","Visit type","Diagnoses","Services","Tests","Imaging","Charge total (mock currency)","Warnings"]
+
+def _labels(lst: List[Dict[str,Any]], key: str = "label") -> str:
+    return ", ".join(sorted({x.get(key, x.get("code","")) for x in lst})) if lst else "—"
+
+def summary_row(r: Dict[str,Any]) -> str:
+    """One line of the summary CSV (commas inside cells become ';')."""
+    if "error" in r:
+        cells = [str(r.get("encounter_id") or ""), "", "", "", "", "", "", "", "ERROR: " + r["error"]]
+        return ",".join(c.replace(",",";").replace("\n"," ") for c in cells) + "\n"
+    dx = _labels(r["extracted"]["diagnoses"])
+    svc = _labels(r["extracted"]["services"])
+    tests = _labels(r["extracted"]["tests"])
+    img = _labels(r["extracted"]["imaging"])
+    total = sum(c["total"] for c in r["charges"])
+    warn = "; ".join(f"{k}: {' | '.join(v)}" for k,v in r["policy_warnings"].items()) or "—"
+    row = [
+        r["encounter_id"],
+        r["identity"]["name"],
+        r["context"]["visit_type"],
+        dx.replace(",",";"),
+        svc.replace(",",";"),
+        tests.replace(",",";"),
+        img.replace(",",";"),
+        str(total),
+        warn.replace(",",";"),
+    ]
+    return ",".join(row) + "\n"
+
+def encode_result(r: Dict[str,Any], profile: str = "full") -> Tuple[bytes, bytes]:
+    """The JSONL line (cut to `profile`) and summary CSV row of a result, as UTF-8 bytes."""
+    return ((json_codec.dumps(shape_result(r, profile), record_json) + "\n").encode("utf-8"),
+            summary_row(r).encode("utf-8"))
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+class ResultCache:
+    """
+    Content-addressed cache of serialized processing results.
+
+    Keys are the sha256 of the canonical encounter JSON plus the rule-pack digest,
+    so an edited rule or price table never serves a stale result. The in-memory tier
+    is an LRU bounded to `max_entries`; the optional disk tier (`disk_dir`) is shared
+    by every process pointing at the same directory, e.g. all gunicorn workers.
+
+    The disk tier is bounded to `disk_max_bytes` (0 = unbounded): once a process's
+    running estimate passes it, the directory is scanned and the least recently used
+    files (oldest mtime; hits touch theirs) are deleted down to 90% of the cap.
+    """
+
+    def __init__(self, max_entries: int = 1024, disk_dir: Optional[str] = None, disk_max_bytes: int = 256 << 20):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.pruned = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            if self.disk_max_bytes > 0:
+                self._prune()
+
+    @staticmethod
+    def key(enc: Dict[str, Any], rules_digest: str) -> str:
+        canonical = json.dumps(enc, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        h = hashlib.sha256(rules_digest.encode("utf-8"))
+        h.update(b"\0")
+        h.update(canonical.encode("utf-8"))
+        return h.hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._mem.get(key)
+            if body is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return body
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                body = path.read_bytes()
+                os.utime(path)  # recently used: pruned last
+            except OSError:
+                body = None
+            if body is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, body)
+                return body
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, body: bytes) -> None:
+        self._remember(key, body)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                path.parent.mkdir(exist_ok=True)
+                tmp.write_bytes(body)
+                os.replace(tmp, path)  # atomic: other workers never see a partial file
+            except OSError as e:
+                print(f"Result cache write failed: {e}")
+                return
+            if self.disk_max_bytes > 0:
+                with self._lock:
+                    self._disk_bytes += len(body)
+                    over = self._disk_bytes > self.disk_max_bytes
+                if over:
+                    self._prune()
+
+    def _prune(self) -> None:
+        """Measure the disk tier and delete its oldest files until it is under 90% of the cap."""
+        if not self._prune_lock.acquire(blocking=False):
+            return  # another thread is already at it
+        try:
+            files = []
+            for shard in os.scandir(self.disk_dir):
+                if shard.is_dir():
+                    for f in os.scandir(shard.path):
+                        if f.name.endswith(".json"):
+                            try:
+                                st = f.stat()
+                            except OSError:
+                                continue  # pruned by another worker
+                            files.append((st.st_mtime, st.st_size, f.path))
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            if total > self.disk_max_bytes:
+                target = self.disk_max_bytes * 9 // 10
+                for _, size, path in sorted(files):
+                    if total <= target:
+                        break
+                    try:
+                        os.unlink(path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        print(f"Result cache prune failed: {e}")
+                        continue
+                    total -= size
+            with self._lock:
+                self._disk_bytes = total
+                self.pruned += removed
+        finally:
+            self._prune_lock.release()
+
+    def _remember(self, key: str, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._mem[key] = body
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                "disk_bytes": self._disk_bytes if self.disk_dir and self.disk_max_bytes > 0 else None,
+                "disk_max_bytes": self.disk_max_bytes if self.disk_dir else None,
+                "pruned": self.pruned,
+            }
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+os.environ.setdefault("RCM_RULES_POLL_SEC", "0")  # no rules watcher thread in tests
+
+import pytest
+
+import app as rcm_app
+from job_queue import JobQueue
+
+LINES = (Path(__file__).resolve().parent.parent / "data" / "rcm_demo_input.jsonl").read_text(encoding="utf-8").splitlines()
+
+@pytest.fixture
+def client():
+    return rcm_app.app.test_client()
+
+@pytest.fixture
+def jobs(monkeypatch):
+    queue = JobQueue(workers=1, capacity=3)
+    monkeypatch.setattr(rcm_app, "JOBS", queue)
+    return queue
+
+def finished(client, job_id):
+    for _ in range(50):
+        status = client.get(f"/api/jobs/{job_id}?wait=0.2").get_json()
+        if status["status"] not in ("queued", "running"):
+            return status
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_oversized_batch_body_gets_a_json_413(client, monkeypatch):
+    monkeypatch.setattr(rcm_app, "MAX_BATCH_BYTES", 100)
+    r = client.post("/api/process_batch", data="x" * 500, content_type="application/x-ndjson")
+    assert r.status_code == 413
+    assert r.get_json() == {"error": "Request body too large (max 100 bytes)"}
+
+def test_too_many_batch_items_gets_a_json_413(client, monkeypatch):
+    monkeypatch.setattr(rcm_app, "MAX_BATCH_ITEMS", 1)
+    r = client.post("/api/process_batch", data='{"a": 1}\n{"b": 2}\n', content_type="application/x-ndjson")
+    assert r.status_code == 413
+    assert "Batch too large" in r.get_json()["error"]
+
+def test_unpaginated_listing_is_streamed_and_matches_the_pages(client):
+    r = client.get("/api/encounters_csv?fields=encounter_id,visit_date")
+    assert r.is_streamed
+    rows, cursor = [], None
+    while True:
+        page = client.get("/api/encounters_csv?fields=encounter_id,visit_date&limit=3" + (f"&cursor={cursor}" if cursor else ""))
+        rows += page.get_json()
+        cursor = page.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert r.get_json() == rows and len(rows) > 3
+
+def test_unpaginated_full_listing_is_keyed_by_encounter(client):
+    full = client.get("/api/encounters_full").get_json()
+    one = next(iter(full))
+    assert client.get(f"/api/encounters/{one}").get_json() == full[one]
+
+def test_job_results_match_the_batch_endpoint(client, jobs):
+    body = "\n".join(LINES[:2] + ["{not json"]) + "\n"
+    r = client.post("/api/jobs", data=body, content_type="application/x-ndjson")
+    assert r.status_code == 202 and r.headers["Location"] == r.get_json()["status_url"]
+    assert finished(client, r.get_json()["job_id"])["errors"] == 1
+    results = client.get(r.get_json()["results_url"]).get_data()
+    assert results == client.post("/api/process_batch", data=body, content_type="application/x-ndjson").get_data()
+
+@pytest.fixture
+def held(monkeypatch):
+    """Holds job processing until the test sets the returned event."""
+    release = threading.Event()
+    def process(enc):
+        release.wait(5)
+        return {"encounter_id": enc["encounter_id"]}
+    monkeypatch.setattr(rcm_app, "process_encounter_safe", process)
+    yield release
+    release.set()
+
+def test_full_job_queue_answers_429_with_retry_after(client, jobs, held):
+    assert client.post("/api/jobs", data="\n".join(LINES[:3])).status_code == 202
+    r = client.post("/api/jobs", data="\n".join(LINES[3:5]))  # at least 2 of the 3 are still waiting
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "5"
+    assert "queue is full" in r.get_json()["error"]
+    assert client.post("/api/jobs", data="\n".join(LINES[:4])).status_code == 413  # can never fit
+
+def test_cancelled_job_is_gone(client, jobs, held):
+    job = client.post("/api/jobs", data="\n".join(LINES[:3])).get_json()
+    r = client.delete(job["status_url"])
+    assert r.status_code == 200 and r.get_json()["status"] == "cancelled"
+    assert client.get(job["status_url"]).status_code == 404
+    assert client.get(job["results_url"]).status_code == 404
+    assert jobs.stats()["queued_encounters"] == 0
+
+def test_results_of_an_unfinished_job_are_a_409(client, jobs, held):
+    job = client.post("/api/jobs", data=LINES[0]).get_json()
+    assert client.get(job["results_url"]).status_code == 409
+    held.set()
+    assert finished(client, job["job_id"])["status"] == "done"
+    assert json.loads(client.get(job["results_url"]).get_data()) == {"encounter_id": "ENC-001"}
+
+def test_worker_exception_becomes_an_error_record(client, jobs, monkeypatch):
+    def process(enc):
+        if enc["encounter_id"] == "ENC-002":
+            raise RuntimeError("boom")
+        return {"encounter_id": enc["encounter_id"]}
+    monkeypatch.setattr(rcm_app, "process_encounter_safe", process)
+    job = client.post("/api/jobs", data="\n".join(LINES[:3])).get_json()
+    assert finished(client, job["job_id"])["errors"] == 1
+    results = [json.loads(line) for line in client.get(job["results_url"]).get_data().splitlines()]
+    assert results == [{"encounter_id": "ENC-001"}, {"index": 1, "encounter_id": None, "error": "boom"},
+                       {"encounter_id": "ENC-003"}]
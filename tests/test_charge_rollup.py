@@ -0,0 +1,47 @@
+import json
+
+from charge_rollup import FileRollup, RollupEngine
+
+def result(eid, plan, total):
+    return {"encounter_id": eid, "identity": {"insurance_plan": plan},
+            "context": {"date_time": "2025-09-04 10:00", "location": "Clinic"},
+            "charges": [{"code": "SVC_VISIT_LEVEL3", "units": 1, "total": total}]}
+
+def write(path, results):
+    with open(path, "w", encoding="utf-8") as f:  # truncates in place, as save_outputs does
+        f.writelines(json.dumps(r) + "\n" for r in results)
+
+def totals(engine):
+    return {r["insurance_plan"]: r["total"] for r in engine.rollup(["insurance_plan"])}
+
+def test_appended_lines_are_added(tmp_path):
+    path = tmp_path / "out.jsonl"
+    write(path, [result("ENC-1", "A", 10.0)])
+    rollup = FileRollup(str(path))
+    assert totals(rollup.refresh()) == {"A": 10.0}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result("ENC-2", "B", 5.0)) + "\n")
+    assert totals(rollup.refresh()) == {"A": 10.0, "B": 5.0}
+
+def test_rewrite_in_place_is_reloaded(tmp_path):
+    # A run over a few --ids, then a full run over the same file (same inode, longer)
+    path = tmp_path / "out.jsonl"
+    write(path, [result("ENC-5", "A", 10.0), result("ENC-9", "B", 20.0)])
+    rollup = FileRollup(str(path))
+    rollup.refresh()
+    full = [result(f"ENC-{i}", "AB"[i % 2], float(i)) for i in range(1, 11)]
+    write(path, full)
+    expected = RollupEngine()
+    expected.add_results(full)
+    engine = rollup.refresh()
+    assert totals(engine) == totals(expected)
+    assert engine.encounters == 10
+
+def test_rewrite_keeping_the_first_lines_is_not_counted_twice(tmp_path):
+    path = tmp_path / "out.jsonl"
+    first = [result("ENC-1", "A", 10.0), result("ENC-2", "B", 20.0)]
+    write(path, first)
+    rollup = FileRollup(str(path))
+    rollup.refresh()
+    write(path, [first[0], result("ENC-3", "B", 7.0), first[1]])
+    assert totals(rollup.refresh()) == {"A": 10.0, "B": 27.0}
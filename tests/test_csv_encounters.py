@@ -0,0 +1,43 @@
+import csv
+import json
+from pathlib import Path
+
+import parse_rcm_documents as rcm
+from csv_encounters import iter_csv_encounters
+from generate_rcm_testdata import encounters_to_csv, make_encounters, write_synthetic
+
+ROOT = Path(__file__).resolve().parent.parent
+FACTS = ("extracted", "policy_warnings", "charges")
+
+def facts(encounters):
+    return {r["encounter_id"]: {k: r[k] for k in FACTS} for r in map(rcm.process_encounter_safe, encounters)}
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+def read_jsonl(path):
+    return [json.loads(line) for line in Path(path).read_text(encoding="utf-8").splitlines()]
+
+def test_fixture_csv_original_json_is_the_jsonl_input():
+    assert list(iter_csv_encounters(str(ROOT / "data" / "patient_encounters.csv"))) == \
+        read_jsonl(ROOT / "data" / "rcm_demo_input.jsonl")
+
+def test_fixture_rebuilt_without_json_processes_like_the_json(tmp_path):
+    path = write_csv(tmp_path / "no_json.csv", encounters_to_csv(make_encounters(), embed_json=False))
+    rebuilt = list(iter_csv_encounters(path, use_json=False))
+    expected = read_jsonl(ROOT / "data" / "rcm_demo_input.jsonl")
+    assert facts(rebuilt) == facts(expected)
+    assert [(e["identity"], e["context"], e["note_sentences"]) for e in rebuilt] == \
+        [(e["identity"], e["context"], e["note_sentences"]) for e in expected]
+
+def test_ignoring_embedded_json_processes_like_the_json(tmp_path):
+    path = write_csv(tmp_path / "with_json.csv", encounters_to_csv(make_encounters()))
+    assert facts(iter_csv_encounters(path, use_json=False)) == facts(iter_csv_encounters(path))
+
+def test_synthetic_csv_without_json_processes_like_its_jsonl(tmp_path):
+    paths = write_synthetic(300, str(tmp_path), embed_json=False, seed=7)
+    assert facts(iter_csv_encounters(paths["csv"])) == facts(read_jsonl(paths["jsonl"]))
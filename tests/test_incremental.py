@@ -0,0 +1,66 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+import parse_rcm_documents as rcm
+
+ROOT = Path(__file__).resolve().parent.parent
+LINES = (ROOT / "data" / "rcm_demo_input.jsonl").read_text(encoding="utf-8").splitlines(True)
+
+def write_input(path, lines):
+    path.write_text("".join(lines), encoding="utf-8")
+    return str(path)
+
+def outputs(out_dir):
+    return ((out_dir / "rcm_parsed_output.jsonl").read_bytes(), (out_dir / "rcm_parsed_summary.csv").read_bytes())
+
+def full_run(input_path, out_dir):
+    rcm.save_outputs((rcm.process_encounter_safe(e) for e in rcm.iter_jsonl(input_path)), str(out_dir))
+    return outputs(out_dir)
+
+@pytest.fixture
+def rules():
+    """Restores the active rule pack after tests that swap it."""
+    pack = rcm.active_rules()
+    yield pack
+    rcm.set_active_rules(pack)
+
+def test_first_run_matches_a_full_run(tmp_path):
+    src = write_input(tmp_path / "in.jsonl", LINES)
+    stats = rcm.run_incremental(src, str(tmp_path / "inc"))
+    assert (stats["reprocessed"], stats["total"]) == (10, 10)
+    assert outputs(tmp_path / "inc") == full_run(src, tmp_path / "full")
+    assert not list((tmp_path / "inc").glob("*.delta"))  # spill files removed
+
+def test_new_encounters_are_appended(tmp_path):
+    out = tmp_path / "inc"
+    rcm.run_incremental(write_input(tmp_path / "in.jsonl", LINES[:6]), str(out))
+    size = (out / "rcm_parsed_output.jsonl").stat().st_size
+    src = write_input(tmp_path / "in.jsonl", LINES)
+    assert rcm.run_incremental(src, str(out))["reprocessed"] == 4
+    assert outputs(out)[0][:size] == full_run(src, tmp_path / "full")[0][:size]
+    assert outputs(out) == outputs(tmp_path / "full")
+    assert rcm.run_incremental(src, str(out))["reprocessed"] == 0
+
+def test_changed_encounter_is_reprocessed(tmp_path):
+    out = tmp_path / "inc"
+    rcm.run_incremental(write_input(tmp_path / "in.jsonl", LINES), str(out))
+    enc = json.loads(LINES[2])
+    enc["context"]["visit_type"] = "Follow-up"
+    src = write_input(tmp_path / "in.jsonl", LINES[:2] + [json.dumps(enc) + "\n"] + LINES[3:])
+    assert rcm.run_incremental(src, str(out))["reprocessed"] == 1
+    assert outputs(out) == full_run(src, tmp_path / "full")
+
+def test_rule_pack_change_reprocesses_everything(tmp_path, rules):
+    src = write_input(tmp_path / "in.jsonl", LINES)
+    out = tmp_path / "inc"
+    rcm.run_incremental(src, str(out))
+    edited = tmp_path / "rules"
+    shutil.copytree(ROOT / "rules", edited, ignore=shutil.ignore_patterns(".*"))
+    csv = edited / "fee_schedule.csv"
+    csv.write_text(csv.read_text(encoding="utf-8").replace(",450\n", ",999\n"), encoding="utf-8")
+    rcm.set_active_rules(rcm.load_rule_pack(str(edited / "rcm_rules.json")))
+    assert rcm.run_incremental(src, str(out))["reprocessed"] == 10
+    assert outputs(out) == full_run(src, tmp_path / "full")
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue, QueueFull
+
+def echo(i, enc):
+    return {"index": i, **enc}
+
+def fail(i, message):
+    return {"index": i, "error": message}
+
+def items(n):
+    return [({"n": i}, None) for i in range(n)]
+
+def finish(queue, job, timeout=5.0):
+    deadline = time.time() + timeout
+    while job.status not in ("done", "cancelled") and time.time() < deadline:
+        queue.wait(job, (job.completed, job.status), 0.1)
+    assert job.status == "done"
+    return job
+
+@pytest.fixture
+def gate():
+    """A process function that holds every worker until the test releases it."""
+    release = threading.Event()
+    started = threading.Event()
+    def process(i, enc):
+        started.set()
+        release.wait(5)
+        return echo(i, enc)
+    process.release, process.started = release, started
+    yield process
+    release.set()
+
+def test_results_keep_submission_order_and_record_item_errors():
+    queue = JobQueue(workers=2)
+    job = finish(queue, queue.submit(items(3) + [(None, "Invalid JSON")], echo, fail))
+    assert job.results == [{"index": 0, "n": 0}, {"index": 1, "n": 1}, {"index": 2, "n": 2},
+                           {"index": 3, "error": "Invalid JSON"}]
+    assert (job.completed, job.errors) == (4, 1)
+
+def test_submission_over_capacity_is_refused_whole(gate):
+    queue = JobQueue(workers=1, capacity=3)
+    queue.submit(items(2), gate, fail)
+    assert gate.started.wait(5)
+    queue.submit(items(2), gate, fail)  # one is being processed, so only 1 + 2 wait
+    with pytest.raises(QueueFull):
+        queue.submit(items(1), gate, fail)
+    assert queue.stats()["queued_encounters"] == 3
+
+def test_cancel_drops_queued_encounters(gate):
+    queue = JobQueue(workers=1)
+    first = queue.submit(items(1), gate, fail)
+    assert gate.started.wait(5)
+    second = queue.submit(items(5), gate, fail)
+    assert queue.cancel(second.id) is second
+    assert second.status == "cancelled"
+    assert queue.get(second.id) is None
+    assert queue.stats()["queued_encounters"] == 0
+    gate.release.set()
+    finish(queue, first)
+    assert second.completed == 0
+
+def test_cancel_while_processing_discards_the_result(gate):
+    queue = JobQueue(workers=1)
+    job = queue.submit(items(1), gate, fail)
+    assert gate.started.wait(5)
+    queue.cancel(job.id)
+    gate.release.set()
+    other = finish(queue, queue.submit(items(1), echo, fail))  # the worker moved on
+    assert other.results == [{"index": 0, "n": 0}]
+    assert (job.status, job.completed, job.results) == ("cancelled", 0, [None])
+
+def test_worker_exception_fails_the_item_and_the_job_finishes():
+    def process(i, enc):
+        if i == 1:
+            raise RuntimeError("boom")
+        return echo(i, enc)
+    queue = JobQueue(workers=1)
+    job = finish(queue, queue.submit(items(3), process, fail))
+    assert job.results[1] == {"index": 1, "error": "boom"}
+    assert (job.completed, job.errors) == (3, 1)
+    assert finish(queue, queue.submit(items(1), echo, fail)).results == [{"index": 0, "n": 0}]
+
+def test_oldest_finished_jobs_are_evicted_past_max_finished():
+    queue = JobQueue(workers=1, max_finished=2)
+    jobs = [finish(queue, queue.submit(items(1), echo, fail)) for _ in range(3)]
+    queue.submit([], echo, fail)  # eviction runs on submission
+    assert [queue.get(j.id) for j in jobs] == [None, jobs[1], jobs[2]]
+
+def test_finished_jobs_expire_after_retain_sec():
+    queue = JobQueue(workers=1, retain_sec=60)
+    old = finish(queue, queue.submit(items(1), echo, fail))
+    recent = finish(queue, queue.submit(items(1), echo, fail))
+    old.finished -= 120
+    queue.submit([], echo, fail)  # expiry runs on submission
+    assert queue.get(old.id) is None
+    assert queue.get(recent.id) is recent
+
+def test_running_jobs_are_never_evicted(gate):
+    queue = JobQueue(workers=1, max_finished=0, retain_sec=0)
+    job = queue.submit(items(1), gate, fail)
+    assert gate.started.wait(5)
+    queue.submit(items(1), gate, fail)
+    assert queue.get(job.id) is job
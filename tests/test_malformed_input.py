@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import parse_rcm_documents as rcm
+
+ROOT = Path(__file__).resolve().parent.parent
+LINES = (ROOT / "data" / "rcm_demo_input.jsonl").read_text(encoding="utf-8").splitlines(True)
+
+@pytest.fixture
+def bad_input(tmp_path):
+    lines = LINES[:3] + ['{"encounter_id": "ENC-X", "identity": \n', "\n"] + LINES[3:]
+    path = tmp_path / "in.jsonl"
+    path.write_text("".join(lines), encoding="utf-8")
+    return str(path)
+
+def records(out_dir):
+    return [json.loads(l) for l in (Path(out_dir) / "rcm_parsed_output.jsonl").read_text(encoding="utf-8").splitlines()]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_invalid_line_becomes_an_error_record(bad_input, tmp_path, workers):
+    out = tmp_path / f"out{workers}"
+    rcm.main(bad_input, str(out), workers=workers, range_mb=0.01)
+    recs = records(out)
+    assert len(recs) == len(LINES) + 1
+    assert recs[3]["line"] == 4 and recs[3]["error"].startswith("Invalid JSON")
+    assert [r.get("encounter_id") for r in recs[4:6]] == [json.loads(l)["encounter_id"] for l in LINES[3:5]]
+    summary = (out / "rcm_parsed_summary.csv").read_text(encoding="utf-8").splitlines()
+    assert summary[4].startswith(",,,,,,,,ERROR: Invalid JSON")
+
+def test_invalid_line_in_an_incremental_run(bad_input, tmp_path):
+    out = tmp_path / "inc"
+    assert rcm.run_incremental(bad_input, str(out))["total"] == len(LINES) + 1
+    stats = rcm.run_incremental(bad_input, str(out))
+    assert (stats["reprocessed"], stats["total"]) == (1, len(LINES) + 1)
+    assert sum("line" in r for r in records(out)) == 1
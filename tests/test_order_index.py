@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import parse_rcm_documents as rcm
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURE = [json.loads(line) for line in (ROOT / "data" / "rcm_demo_input.jsonl").read_text(encoding="utf-8").splitlines()]
+
+def legacy_codes(orders, lab_map):
+    """Codes per bucket from the substring checks cross_check_structured used before the order index."""
+    out = {"tests": [], "imaging": [], "treatments": []}
+    def add(bucket, code):
+        if code not in out[bucket]:
+            out[bucket].append(code)
+    for lab in orders.get("lab_tests", []):
+        meta = lab_map.get(lab.get("name"))
+        if meta:
+            add("tests", meta["code"])
+    for t in orders.get("tests", []):
+        if str(t.get("name", "")).lower().startswith("resting electrocardiogram"):
+            add("tests", "TEST_ECG")
+    for img in orders.get("imaging", []):
+        if "knee" in str(img.get("name", "")).lower():
+            add("imaging", "IMG_KNEE_XR_2V_RIGHT")
+    for io in orders.get("imaging_orders", []):
+        nm = str(io.get("name", "")).lower()
+        if "mri" in nm and "head" in nm:
+            add("imaging", "IMG_BRAIN_MRI_WO")
+        if "lumbar spine" in nm and "x-ray" in nm:
+            add("imaging", "IMG_LUMBAR_XR_2V")
+        if "ultrasound" in nm and "pregnancy" in nm:
+            add("imaging", "IMG_OB_EARLY_US")
+    for tr in orders.get("in_clinic_treatments", []):
+        if "nebulized" in str(tr.get("name", "")).lower():
+            add("treatments", "TRT_NEBULIZER")
+    return out
+
+def index_codes(orders):
+    extracted = {"tests": [], "imaging": [], "treatments": []}
+    rcm.cross_check_structured(extracted, {"orders": orders})
+    return {bucket: [f["code"] for f in facts] for bucket, facts in extracted.items()}
+
+@pytest.mark.parametrize("enc", FIXTURE, ids=[e["encounter_id"] for e in FIXTURE])
+def test_fixture_orders_match_the_legacy_checks(enc):
+    orders = enc.get("structured", {}).get("orders", {})
+    assert index_codes(orders) == legacy_codes(orders, rcm.active_rules().lab_map)
+
+@pytest.mark.parametrize("category,name", [
+    ("imaging_orders", "Head MRI without contrast"),
+    ("imaging_orders", "MRI of the head"),
+    ("imaging_orders", "Lumbar spine X-ray, 2 views"),
+    ("imaging_orders", "X-ray, lumbar spine"),
+    ("imaging_orders", "MRI head and lumbar spine X-ray"),
+    ("imaging_orders", "Ultrasound, early pregnancy"),
+    ("imaging", "Knee radiograph"),
+    ("tests", "Resting electrocardiogram, 12 lead"),
+    ("in_clinic_treatments", "Nebulized albuterol"),
+    ("lab_tests", "HbA1c"),
+])
+def test_names_the_legacy_checks_matched_resolve_the_same(category, name):
+    orders = {category: [{"name": name}]}
+    assert index_codes(orders) == legacy_codes(orders, rcm.active_rules().lab_map)
+
+def test_one_imaging_order_can_add_several_items():
+    orders = {"imaging_orders": [{"name": "MRI head and lumbar spine X-ray"}]}
+    assert index_codes(orders)["imaging"] == ["IMG_BRAIN_MRI_WO", "IMG_LUMBAR_XR_2V"]
+
+@pytest.mark.parametrize("category,name,code", [
+    ("imaging_orders", "Lumbar spine radiograph", "IMG_LUMBAR_XR_2V"),
+    ("imaging_orders", "LUMBAR SPINE X RAY", "IMG_LUMBAR_XR_2V"),
+    ("imaging_orders", "Head magnetic resonance imaging", "IMG_BRAIN_MRI_WO"),
+    ("imaging_orders", "Pregnancy sonogram", "IMG_OB_EARLY_US"),
+    ("tests", "Resting ECG", "TEST_ECG"),
+    ("in_clinic_treatments", "Nebuliser treatment", "TRT_NEBULIZER"),
+])
+def test_synonyms_resolve_names_the_legacy_checks_missed(category, name, code):
+    orders = {category: [{"name": name}]}
+    assert sum(legacy_codes(orders, rcm.active_rules().lab_map).values(), []) == []
+    assert sum(index_codes(orders).values(), []) == [code]
+
+def test_repeated_codes_are_added_once():
+    orders = {"imaging_orders": [{"name": "Head MRI"}, {"name": "MRI, head"}, {"name": "Lumbar spine X-ray head MRI"}]}
+    assert index_codes(orders)["imaging"] == ["IMG_BRAIN_MRI_WO", "IMG_LUMBAR_XR_2V"]
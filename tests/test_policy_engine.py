@@ -0,0 +1,20 @@
+from policy_engine import PolicyEngine
+
+UNITS = {"id": "units_positive", "require": {"field": "units", "op": "ge", "value": 1, "default": 0},
+         "message": "Units must be positive."}
+
+EXTRACTED = {"diagnoses": [{"code": "DX_A", "units": 0}], "tests": [{"code": "TEST_B", "units": 0}],
+             "drugs": [{"code": "DRUG_C", "units": 2}]}
+
+def test_rule_without_buckets_applies_to_every_bucket():
+    assert PolicyEngine([UNITS]).check(EXTRACTED) == {"DX_A": ["Units must be positive."],
+                                                     "TEST_B": ["Units must be positive."]}
+
+def test_rule_without_buckets_alongside_bucketed_rules():
+    views = {"id": "views", "buckets": ["tests"], "message": "Needs views.",
+             "require": {"field": "views", "op": "ge", "value": 2, "default": 0}}
+    warnings = PolicyEngine([views, {**UNITS, "codes": ["DX_A"]}]).check(EXTRACTED)
+    assert warnings == {"TEST_B": ["Needs views."], "DX_A": ["Units must be positive."]}
+
+def test_rule_with_buckets_stays_in_them():
+    assert PolicyEngine([{**UNITS, "buckets": ["tests"]}]).check(EXTRACTED) == {"TEST_B": ["Units must be positive."]}
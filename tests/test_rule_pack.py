@@ -0,0 +1,38 @@
+import shutil
+from pathlib import Path
+
+from parse_rcm_documents import load_rule_pack
+
+RULES = Path(__file__).resolve().parent.parent / "rules"
+
+def mri_price(pack):
+    return pack.fees.price("Desert Care Gold", "IMG_BRAIN_MRI_WO", "2026-03-01")
+
+def set_mri_price(rules_dir, price):
+    csv = rules_dir / "fee_schedule.csv"
+    text = csv.read_text(encoding="utf-8")
+    csv.write_text(text.replace("Desert Care Gold,IMG_BRAIN_MRI_WO,2026-01-01,,450",
+                                f"Desert Care Gold,IMG_BRAIN_MRI_WO,2026-01-01,,{price}"), encoding="utf-8")
+
+def copy_rules(dest):
+    shutil.copytree(RULES, dest, ignore=shutil.ignore_patterns(".*"))
+    return dest
+
+def test_editing_the_fee_schedule_changes_digest_and_price(tmp_path):
+    rules = copy_rules(tmp_path / "rules")
+    before = load_rule_pack(str(rules / "rcm_rules.json"))  # also writes the cache
+    set_mri_price(rules, 999)
+    after = load_rule_pack(str(rules / "rcm_rules.json"))
+    assert (mri_price(before), mri_price(after)) == (450, 999)
+    assert after.digest != before.digest
+
+def test_copied_deployment_uses_its_own_fee_schedule(tmp_path):
+    original = copy_rules(tmp_path / "a" / "rules")
+    load_rule_pack(str(original / "rcm_rules.json"))
+    copy = tmp_path / "b" / "rules"
+    shutil.copytree(original, copy)  # cache included
+    set_mri_price(copy, 999)
+    pack = load_rule_pack(str(copy / "rcm_rules.json"))
+    assert mri_price(pack) == 999
+    assert pack.source == str(copy / "rcm_rules.json")
+    assert pack.dependencies == (str(copy / "fee_schedule.csv"),)